@@ -51,6 +51,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'visits.geocoding.GeocodeBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -80,6 +81,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file, not :memory:, so the threaded tests have real concurrent writers
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -129,6 +132,79 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 AUTH_USER_MODEL = 'visits.CustomUser'
 
+
+# Reverse geocoding (see visits/geocoding.py)
+# Local backends answer first; remote ones sit behind the cache tiers.
+GEOCODER_BACKENDS = [
+    'visits.geocoding.GazetteerGeocoder',    # offline, bundled visits/data/tz_gazetteer.csv
+    'visits.geocoding.NominatimGeocoder',    # optional fallback for places outside the gazetteer
+]
+GEOCODE_GAZETTEER_MAX_KM = 75                # farther than this from any place -> ask the next backend
+GEOCODE_PRECISION = 3                        # decimal places in the cache key (~110 m)
+GEOCODE_TIMEOUT = 10                         # seconds per Nominatim request
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60        # DB tier: keep entries 30 days
+GEOCODE_CACHE_MAX_ENTRIES = 50000            # DB tier: LRU cap
+GEOCODE_MEMORY_TTL = 60 * 60                 # memory tier: 1 hour
+GEOCODE_MEMORY_MAX_ENTRIES = 5000            # memory tier: LRU cap
+GEOCODE_MAX_WORKERS = 4                      # thread pool size for batch lookups
+GEOCODE_RATE_LIMIT = 1                       # Nominatim requests per second (usage policy)
+GEOCODE_RATE_BURST = 1
+GEOCODE_REQUEST_BUDGET = 5                   # max seconds of outbound geocoding per HTTP request
+GEOCODE_BREAKER_THRESHOLD = 5                # consecutive failures before the circuit opens
+GEOCODE_BREAKER_COOLDOWN = 60                # seconds before a trial call is let through
+
+# Background geocode worker (`manage.py geocode_worker`)
+GEOCODE_MAX_ATTEMPTS = 8                     # then the row is marked 'failed'
+GEOCODE_RETRY_BASE_DELAY = 30                # seconds, doubled per attempt
+GEOCODE_RETRY_MAX_DELAY = 6 * 60 * 60
+
+# `manage.py geocode_backfill` progress file (last pk done per table)
+GEOCODE_BACKFILL_CHECKPOINT = BASE_DIR / 'geocode_backfill.json'
+
+# Caches. locmem is per process; for several workers on one host use
+# 'django.core.cache.backends.filebased.FileBasedCache' with a LOCATION dir.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'visits-default',
+    }
+}
+
+# Rep dashboard payload cache (see visits/dashboard.py)
+DASHBOARD_CACHE = 'default'                  # alias in CACHES
+DASHBOARD_CACHE_TTL = 15 * 60                # seconds; signals invalidate earlier
+
+# Background PDF exports (`manage.py export_worker`, see visits/export_jobs.py)
+EXPORT_ROOT = BASE_DIR / 'exports'           # finished files
+EXPORT_TTL = 24 * 60 * 60                    # seconds a finished file is kept
+EXPORT_JOB_TIMEOUT = 15 * 60                 # a 'running' job older than this is requeued
+EXPORT_TABLE_RENDERER = 'reportlab'          # visits / follow-ups PDFs; 'pisa' = old HTML templates
+
+# Generated PDFs keyed by a fingerprint of their inputs (see visits/pdf_cache.py)
+PDF_CACHE_DIR = BASE_DIR / 'pdf_cache'
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024      # least recently used files go first
+
+# PDF rendering runs in a process pool so it can't stall web threads (see visits/render_pool.py)
+PDF_RENDER_WORKERS = 2                       # processes per web process; 0 = render inline
+PDF_RENDER_QUEUE_LIMIT = 4                   # renders waiting for a worker before 503s
+PDF_RENDER_TIMEOUT = 120                     # seconds a request waits for its PDF (504 after)
+PDF_RENDER_MAX_TASKS = 50                    # renders before a worker process is recycled
+
+# Offline batch upload of visits / follow-ups (see visits/sync.py)
+SYNC_MAX_ITEMS = 200                         # items per POST /sync/ request
+
+# Company typeahead index (see visits/customer_index.py)
+CUSTOMER_INDEX_MAX_AGE = 5 * 60              # seconds before a process reloads its copy anyway
+
+# Per-customer contact lists for the visit forms (see visits/contact_cache.py)
+CONTACT_CACHE_TTL = 60 * 60                  # seconds; signals invalidate earlier
+
+# Customer / contact delta sync for offline clients (see visits/directory_sync.py)
+DIRECTORY_SYNC_PAGE_SIZE = 1000              # most changes per GET /directory/changes/ page
+
+# Near-duplicate company names (see customer/duplicates.py)
+CUSTOMER_DUPLICATE_SIMILARITY = 0.6          # trigram Dice score that flags a new name as a likely duplicate
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,175 @@
+"""
+Duplicate company names.
+
+``names.company_key()`` reduces a name to what identifies the company:
+case, accents, punctuation, "and" and legal-form words are dropped, runs
+of initials are joined, and the spaces go:
+
+    "ABC Ltd", "A.B.C. Limited", "abc company ltd"  ->  "abc"
+    "Acme Steel & Sons (T) Ltd"                    ->  "acmesteelsons"
+
+Customer.save() stores it in the indexed ``Customer.name_key``, so the
+exact check in CustomerForm is an index lookup.
+
+Near misses ("Acme Steel" / "Acme Steels") are compared by trigram Dice
+similarity of their keys. On create, ``likely_duplicates()`` finds
+candidates in the ``customer_name_trigrams`` FTS5 table (trigram
+tokenizer, rowid = customer id; created by customer migration 0005 and
+kept current by visits/signals.py) and scores the best of them. ``find_duplicates()`` does the whole table for
+``manage.py find_duplicate_customers`` with an in-memory, prefix-filtered
+trigram index, comparing only keys that share a rare trigram, so it stays
+far from n².
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from .names import company_key
+
+
+TABLE = "customer_name_trigrams"
+CANDIDATES = 50      # best FTS matches scored on create
+MAX_POSTING = 100    # find_duplicates(): keys listed per trigram; bounds the work per key
+
+_available = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def threshold():
+    return _setting("CUSTOMER_DUPLICATE_SIMILARITY", 0.6)
+
+
+# -------------------------------
+# Keys and similarity
+# -------------------------------
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def similarity(a, b):
+    """Dice coefficient of the two keys' trigram sets, 0..1."""
+    ga, gb = trigrams(a), trigrams(b)
+    if not ga or not gb:
+        return 1.0 if a == b else 0.0
+    return 2 * len(ga & gb) / (len(ga) + len(gb))
+
+
+# -------------------------------
+# Trigram table (create-time check)
+# -------------------------------
+def available():
+    """Whether the trigram table exists on the default database (checked once per process)."""
+    global _available
+    if _available is None:
+        _available = connection.vendor == "sqlite" and TABLE in connection.introspection.table_names()
+    return _available
+
+
+def index(pk, key):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [pk])
+            cursor.execute(f"INSERT INTO {TABLE} (rowid, name_key) VALUES (%s, %s)", [pk, key])
+
+
+def remove(pk):
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [pk])
+
+
+def likely_duplicates(name, exclude_pk=None, limit=5):
+    """
+    Customers whose name is probably the same company as `name`, most
+    similar first: [(customer, similarity)]. Exact key matches included.
+    """
+    from .models import Customer
+
+    key = company_key(name)
+    grams = sorted(trigrams(key))
+    if not grams or not available():
+        exact = Customer.objects.filter(name_key=key).exclude(pk=exclude_pk)[:limit]
+        return [(customer, 1.0) for customer in exact]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rank LIMIT %s",
+            [" OR ".join(f'"{g}"' for g in grams), CANDIDATES],
+        )
+        ids = [row[0] for row in cursor.fetchall() if row[0] != exclude_pk]
+
+    scored = [(c, similarity(key, c.name_key)) for c in Customer.objects.filter(pk__in=ids)]
+    scored = [(c, score) for c, score in scored if score >= threshold()]
+    scored.sort(key=lambda pair: (-pair[1], pair[0].company_name))
+    return scored[:limit]
+
+
+# -------------------------------
+# Whole-table scan (find_duplicate_customers)
+# -------------------------------
+def _prefix_length(size, overlap_ratio):
+    """Trigrams to keep so that any key sharing >= overlap_ratio * size of them shares one of these."""
+    return max(size - math.ceil(size * overlap_ratio - 1e-9) + 1, 1)
+
+
+def find_duplicates(rows, min_similarity=None):
+    """
+    Groups of probable duplicates among `rows` ((pk, name_key) pairs), as
+    lists of pks, largest group first.
+
+    Prefix filtering (as in the AllPairs / PPJoin set-similarity joins):
+    trigrams are ordered rarest first and keys are taken shortest first.
+    Each key probes the index with its first few trigrams and adds a
+    shorter prefix to it, which is enough for any pair above the
+    threshold to meet. Common trigrams rarely make a prefix, so posting
+    lists stay short. A posting list stops growing at MAX_POSTING keys,
+    which keeps the scan O(n) candidate checks per prefix trigram; only
+    keys made entirely of very common trigrams can lose a pair to it.
+    Pairs go into a union-find.
+    """
+    min_similarity = threshold() if min_similarity is None else min_similarity
+    by_key = {}
+    for pk, key in rows:
+        by_key.setdefault(key, []).append(pk)
+    keys = sorted(by_key, key=lambda k: (len(trigrams(k)), k))  # identical keys are grouped already
+
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    grams = [trigrams(key) for key in keys]
+    frequency = Counter(g for gs in grams for g in gs)
+
+    if min_similarity <= 1:
+        jaccard = min_similarity / (2 - min_similarity)  # Dice t  <=>  Jaccard t / (2 - t)
+        probe_ratio, index_ratio = jaccard, 2 * jaccard / (1 + jaccard)
+        postings = {}
+        for i, gs in enumerate(grams):
+            ordered = sorted(gs, key=lambda g: (frequency[g], g))
+            candidates = set()
+            for g in ordered[:_prefix_length(len(gs), probe_ratio)]:
+                candidates.update(postings.get(g, ()))
+            for j in candidates:
+                other = grams[j]
+                if 2 * len(other) < min_similarity * (len(gs) + len(other)):
+                    continue  # too much shorter to reach the threshold
+                if find(i) != find(j) and 2 * len(gs & other) >= min_similarity * (len(gs) + len(other)):
+                    parent[find(j)] = find(i)
+            for g in ordered[:_prefix_length(len(gs), index_ratio)]:
+                posting = postings.setdefault(g, [])
+                if len(posting) < MAX_POSTING:
+                    posting.append(i)
+
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(find(i), []).extend(by_key[key])
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
@@ -2,6 +2,8 @@ from django import forms
 from .models import Customer, CustomerContact, DESIGNATION_CHOICES
 import re
 from django.core.exceptions import ValidationError
+from .duplicates import likely_duplicates
+from .names import company_key
 
 
 # 🔹 Tanzania phone number validator
@@ -12,6 +14,13 @@ def validate_tz_contact(value):
 
 
 class CustomerForm(forms.ModelForm):
+    # ⚠️ Shown when a new name looks like an existing customer's
+    allow_similar = forms.BooleanField(
+        required=False,
+        label="This is a different company - save anyway",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
     class Meta:
         model = Customer
         fields = ['designation', 'company_name', 'location', 'email']
@@ -28,15 +37,33 @@ class CustomerForm(forms.ModelForm):
     def clean_company_name(self):
         company_name = self.cleaned_data.get('company_name')
 
-        # Exclude current instance from uniqueness check if updating
-        qs = Customer.objects.filter(company_name__iexact=company_name)
-        if self.instance.pk:
-            qs = qs.exclude(pk=self.instance.pk)
+        # Same normalised key = same company ("ABC Ltd" / "A.B.C. Limited"); indexed lookup
+        key = company_key(company_name)
+        if self.instance.pk and key == self.instance.name_key:
+            # Edit that keeps the company's key; legacy rows already sharing it stay editable
+            return company_name
+        qs = Customer.objects.filter(name_key=key).exclude(pk=self.instance.pk)
 
-        if qs.exists():
-            raise ValidationError("This company name is already registered.")
+        existing = qs.first()
+        if existing is not None:
+            raise ValidationError(f'This company is already registered as "{existing.company_name}".')
         return company_name
 
+    def clean(self):
+        cleaned_data = super().clean()
+        self.similar_customers = []
+        company_name = cleaned_data.get('company_name')
+
+        # Only new customers are checked for near-duplicates
+        if company_name and not self.instance.pk and not cleaned_data.get('allow_similar'):
+            self.similar_customers = [c for c, _ in likely_duplicates(company_name)]
+            if self.similar_customers:
+                names = ", ".join(c.company_name for c in self.similar_customers)
+                raise ValidationError(
+                    f"Possible duplicate of: {names}. Tick the box below if this is a different company."
+                )
+        return cleaned_data
+
 
 class CustomerContactForm(forms.ModelForm):
     contact_detail = forms.CharField(
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:46
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Frozen copy of customer.names.company_key as of this migration, so later
+# changes to the key don't alter what this migration writes.
+LEGAL_WORDS = {
+    "co", "company", "corp", "corporation", "inc", "incorporated", "limited", "llc", "ltd", "plc", "t", "tz",
+}
+NON_WORD = re.compile(r"[^0-9a-z]+")
+INITIALS = re.compile(r"\b(?:[a-z0-9] )+[a-z0-9]\b")
+
+
+def company_key(name):
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode().lower()
+    text = INITIALS.sub(lambda m: m.group(0).replace(" ", ""), NON_WORD.sub(" ", text).strip())
+    words = [w for w in text.split(" ") if w and w != "and"]
+    core = list(words)
+    while core and core[-1] in LEGAL_WORDS:
+        core.pop()
+    if core and core[0] == "the":
+        core.pop(0)
+    return "".join(core or words)
+
+
+def fill_name_keys(apps, schema_editor):
+    Customer = apps.get_model("customer", "Customer")
+    customers = list(Customer.objects.only("pk", "company_name"))
+    for customer in customers:
+        customer.name_key = company_key(customer.company_name)
+    Customer.objects.bulk_update(customers, ["name_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0002_alter_customer_company_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
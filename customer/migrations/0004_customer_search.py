@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:52
+
+from django.db import migrations
+
+
+# Frozen copy of customer/search.py's table and row format as of this
+# migration, so later changes to that module don't alter what this writes.
+TABLE = "customer_search"
+COLUMNS = ("company_name", "designation", "location", "email", "contacts")
+CHUNK = 2000
+
+
+def create_customer_search(apps, schema_editor):
+    conn = schema_editor.connection
+    # Not SQLite / no FTS5: the customer list keeps its plain icontains search
+    if conn.vendor != "sqlite":
+        return
+    Customer = apps.get_model("customer", "Customer")
+    CustomerContact = apps.get_model("customer", "CustomerContact")
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                f"{', '.join(COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except Exception:  # sqlite3.OperationalError: no such module: fts5
+            return
+
+        cursor.execute(f"DELETE FROM {TABLE}")
+        last = 0
+        while True:
+            customers = list(
+                Customer.objects.filter(pk__gt=last).order_by("pk").values("id", *COLUMNS[:-1])[:CHUNK]
+            )
+            if not customers:
+                break
+            contacts = {}
+            rows = CustomerContact.objects.filter(customer_id__in=[c["id"] for c in customers])
+            for customer_id, name, detail in rows.values_list("customer_id", "contact_name", "contact_detail"):
+                contacts.setdefault(customer_id, []).append(f"{name} {detail}")
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s)",
+                [
+                    (c["id"], c["company_name"], c["designation"], c["location"], c["email"],
+                     " ".join(contacts.get(c["id"], ())))
+                    for c in customers
+                ],
+            )
+            last = customers[-1]["id"]
+
+
+def drop_customer_search(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0003_customer_name_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_customer_search, drop_customer_search),
+    ]
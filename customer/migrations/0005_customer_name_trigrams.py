@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:48
+
+from django.db import migrations
+
+
+# Frozen copy of customer/duplicates.py's trigram table as of this
+# migration, so later changes to that module don't alter what this writes.
+TABLE = "customer_name_trigrams"
+CHUNK = 5000
+
+
+def create_name_trigrams(apps, schema_editor):
+    conn = schema_editor.connection
+    # Not SQLite / no trigram tokenizer (SQLite < 3.34): new customers get the exact-key check only
+    if conn.vendor != "sqlite":
+        return
+    Customer = apps.get_model("customer", "Customer")
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(name_key, tokenize = 'trigram')")
+        except Exception:  # sqlite3.OperationalError: no such tokenizer / module
+            return
+
+        cursor.execute(f"DELETE FROM {TABLE}")
+        last = 0
+        while True:
+            rows = list(Customer.objects.filter(pk__gt=last).order_by("pk").values_list("pk", "name_key")[:CHUNK])
+            if not rows:
+                break
+            cursor.executemany(f"INSERT INTO {TABLE} (rowid, name_key) VALUES (%s, %s)", rows)
+            last = rows[-1][0]
+
+
+def drop_name_trigrams(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0004_customer_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_trigrams, drop_name_trigrams),
+    ]
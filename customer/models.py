@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+
+from .names import company_key
 
 DESIGNATION_CHOICES = [
     ('Owner', 'Owner'),
@@ -17,6 +19,17 @@ class Customer(models.Model):
     )
     location = models.CharField(max_length=200)
     email = models.EmailField(unique=True)
+    # 🔑 company_key(company_name): "A.B.C. Limited" -> "abc", for duplicate checks
+    name_key = models.CharField(max_length=200, db_index=True, editable=False, default="")
+
+    def save(self, *args, **kwargs):
+        self.name_key = company_key(self.company_name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "company_name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "name_key"}
+        # 🔒 post_save receivers (change log, search index) commit or roll back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.company_name
@@ -27,5 +40,9 @@ class CustomerContact(models.Model):
     contact_name = models.CharField(max_length=150)
     contact_detail = models.CharField(max_length=150)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():  # same as Customer.save()
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.contact_name} ({self.customer.company_name})"
@@ -0,0 +1,39 @@
+"""
+Company-name normalisation, shared by the Customer model and the search /
+duplicate modules in visits.
+
+    normalise("Mc'Kenzie & Sons")             ->  "mc kenzie sons"
+    company_key("A.B.C. Limited")             ->  "abc"
+    company_key("Acme Steel & Sons (T) Ltd")  ->  "acmesteelsons"
+"""
+import re
+import unicodedata
+
+
+LEGAL_WORDS = {
+    "co", "company", "corp", "corporation", "inc", "incorporated", "limited", "llc", "ltd", "plc", "t", "tz",
+}
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_INITIALS = re.compile(r"\b(?:[a-z0-9] )+[a-z0-9]\b")
+
+
+def normalise(name):
+    """Lower case, accents and punctuation dropped, single spaces: "Mc'Kenzie & Sons" -> "mc kenzie sons"."""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode().lower()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def company_key(name):
+    """
+    What identifies the company: normalise(), then runs of initials joined,
+    "and" and trailing legal-form words dropped (a leading "the" too), and
+    the spaces removed. Stored as the indexed ``Customer.name_key``.
+    """
+    text = _INITIALS.sub(lambda m: m.group(0).replace(" ", ""), normalise(name))
+    words = [w for w in text.split(" ") if w and w != "and"]
+    core = list(words)
+    while core and core[-1] in LEGAL_WORDS:
+        core.pop()
+    if core and core[0] == "the":
+        core.pop(0)
+    return "".join(core or words)
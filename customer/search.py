@@ -0,0 +1,146 @@
+"""
+Full-text customer search for the customer list (SQLite FTS5).
+
+One row per customer in the ``customer_search`` FTS5 table, rowid =
+customer id. Its columns are company name, designation, location, email
+and the customer's contact names and phones run together, so "acme",
+"mwanza", "asha" or "0712" all find the customer. Every word of the query
+is a prefix match ("ac ste" finds "Acme Steel") and all words must match.
+Results are ranked with bm25, with company-name hits weighted highest.
+
+The table is created by customer migration 0004 and kept in step by the
+Customer / CustomerContact signals in visits/signals.py. They re-index
+the customer inside the writing transaction. ``queryset.update()`` and
+``bulk_create()`` skip signals; run ``manage.py rebuild_customer_search``
+after using them.
+
+On a database without FTS5 (or before the migration has run), ``search()``
+returns None and the caller falls back to a plain ``icontains`` filter.
+"""
+import re
+
+from django.db import connection, transaction
+
+
+TABLE = "customer_search"
+COLUMNS = ("company_name", "designation", "location", "email", "contacts")
+WEIGHTS = (10.0, 1.0, 3.0, 3.0, 2.0)  # bm25 weight per column, in COLUMNS order
+CHUNK = 2000
+_WORD = re.compile(r"\w+")
+
+_available = None
+
+
+def available():
+    """Whether the FTS table exists on the default database (checked once per process)."""
+    global _available
+    if _available is None:
+        _available = connection.vendor == "sqlite" and TABLE in connection.introspection.table_names()
+    return _available
+
+
+# -------------------------------
+# Indexing
+# -------------------------------
+def _documents(customers, contact_model):
+    """(rowid, *COLUMNS) for `customers` (dicts from .values()), one contact query."""
+    contacts = {}
+    rows = contact_model.objects.filter(customer_id__in=[c["id"] for c in customers])
+    for customer_id, name, detail in rows.values_list("customer_id", "contact_name", "contact_detail"):
+        contacts.setdefault(customer_id, []).append(f"{name} {detail}")
+    return [
+        (c["id"], c["company_name"], c["designation"], c["location"], c["email"], " ".join(contacts.get(c["id"], ())))
+        for c in customers
+    ]
+
+
+def _write(cursor, ids, documents):
+    cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(pk,) for pk in ids])
+    cursor.executemany(
+        f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s)", documents
+    )
+
+
+def index(customer_ids):
+    """Re-index these customers from the database; ids that no longer exist are removed."""
+    from .models import Customer, CustomerContact
+
+    if not available():
+        return
+    ids = list(customer_ids)
+    customers = list(Customer.objects.filter(pk__in=ids).values("id", *COLUMNS[:-1]))
+    documents = _documents(customers, CustomerContact)
+    with connection.cursor() as cursor:
+        _write(cursor, ids, documents)
+
+
+def rebuild():
+    """Re-create every row (``manage.py rebuild_customer_search``)."""
+    from .models import Customer, CustomerContact
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        last = 0
+        while True:
+            customers = list(
+                Customer.objects.filter(pk__gt=last).order_by("pk").values("id", *COLUMNS[:-1])[:CHUNK]
+            )
+            if not customers:
+                break
+            _write(cursor, [], _documents(customers, CustomerContact))
+            last = customers[-1]["id"]
+
+
+# -------------------------------
+# Searching
+# -------------------------------
+def match_expression(query):
+    """User text -> FTS5 query: every word as a quoted prefix, all required. '' if no words."""
+    return " ".join(f'"{word}"*' for word in _WORD.findall(query.lower()))
+
+
+class SearchResults:
+    """
+    Ranked customers for one query, sliced lazily, so Paginator runs one
+    COUNT and then fetches only the page it shows.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s", [self.expression])
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        from .models import Customer
+
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        limit = -1 if stop is None else max(stop - start, 0)
+        weights = ", ".join(str(w) for w in WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY bm25({TABLE}, {weights}) "
+                f"LIMIT %s OFFSET %s",
+                [self.expression, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        customers = Customer.objects.in_bulk(ids)
+        return [customers[pk] for pk in ids if pk in customers]
+
+
+def search(query):
+    """SearchResults for `query`, or None when full-text search isn't available."""
+    if not available():
+        return None
+    expression = match_expression(query)
+    return SearchResults(expression) if expression else []
@@ -8,6 +8,7 @@ urlpatterns = [
     path("delete/<int:pk>/", views.delete_customer, name="delete_customer"),
     path('customers/<int:customer_id>/view/', views.view_customer, name='view_customer'),
     path('customer/<int:customer_id>/pdf/', views.export_customer_detail_pdf, name='customer_detail_pdf'),
+    path('customers/pdf-pack/', views.export_customer_pdf_pack, name='customer_pdf_pack'),
 ]
 
 
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect
+from django.db import transaction
 from django.forms import modelformset_factory
 from .forms import CustomerForm, CustomerContactForm
 from .models import Customer, CustomerContact
@@ -18,18 +19,19 @@ def add_customer(request):
         formset = ContactFormSet(request.POST, queryset=CustomerContact.objects.none(), prefix="contacts")
 
         if customer_form.is_valid() and formset.is_valid():
-            # Save parent first
-            customer = customer_form.save()
+            with transaction.atomic():  # customer and contacts together, or nothing
+                # Save parent first
+                customer = customer_form.save()
 
-            # Save contacts and attach the customer
-            contacts = formset.save(commit=False)
-            for c in contacts:
-                c.customer = customer
-                c.save()
+                # Save contacts and attach the customer
+                contacts = formset.save(commit=False)
+                for c in contacts:
+                    c.customer = customer
+                    c.save()
 
-            # Handle deletes (if any were added then removed)
-            for obj in formset.deleted_objects:
-                obj.delete()
+                # Handle deletes (if any were added then removed)
+                for obj in formset.deleted_objects:
+                    obj.delete()
 
             return redirect("customer_list")
 
@@ -46,27 +48,40 @@ def add_customer(request):
 
 
 from django.shortcuts import render
+from django.core.paginator import Paginator
 from django.db.models import Q
-from .models import Customer
+from . import search as customer_search
+from visits.models import CustomUser
+from .models import Customer, DESIGNATION_CHOICES
+
+CUSTOMERS_PER_PAGE = 50
+
 
 def customer_list(request):
-    query = request.GET.get("q", "")
-    customers = Customer.objects.prefetch_related("contacts").all()
+    query = request.GET.get("q", "").strip()
 
     if query:
-        customers = customers.filter(
-            Q(company_name__icontains=query) |
-            Q(designation__icontains=query)
-        )
+        # 🔍 Ranked full-text search over name, location, email and contacts
+        customers = customer_search.search(query)
+        if customers is None:  # no FTS5 on this database
+            customers = Customer.objects.filter(
+                Q(company_name__icontains=query) |
+                Q(designation__icontains=query)
+            ).order_by("company_name")
+    else:
+        customers = Customer.objects.order_by("company_name")  # unique index on company_name
 
     context = {
-        "customers": customers,
+        "customers": Paginator(customers, CUSTOMERS_PER_PAGE).get_page(request.GET.get("page")),
         "query": query,
+        "branch_choices": CustomUser.BRANCH_CHOICES,
+        "designation_choices": DESIGNATION_CHOICES,
     }
     return render(request, "manager/customer_list.html", context)
 
 
 from django.shortcuts import render, get_object_or_404, redirect
+from django.db import transaction
 from django.forms import inlineformset_factory
 from django.contrib import messages
 from .models import Customer, CustomerContact
@@ -90,8 +105,9 @@ def update_customer(request, pk):
         formset = ContactFormSet(request.POST, instance=customer)
 
         if customer_form.is_valid() and formset.is_valid():
-            customer_form.save()
-            formset.save()  # updates, deletes, and adds new
+            with transaction.atomic():
+                customer_form.save()
+                formset.save()  # updates, deletes, and adds new
             messages.success(request, "✅ Customer updated successfully!")
             return redirect("customer_list")
         else:
@@ -113,7 +129,7 @@ def delete_customer(request, pk):
     customer = get_object_or_404(Customer, pk=pk)
 
     if request.method == "POST":
-        customer.delete()
+        customer.delete()  # one transaction with its contacts and their post_delete receivers
         messages.success(request, "🗑️ Customer deleted successfully!")
         return redirect("customer_list")
 
@@ -151,44 +167,46 @@ def view_customer(request, customer_id):
 
 
 
-import io
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from xhtml2pdf import pisa
-from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.http import HttpResponse, Http404
+from visits import exports
 from .models import Customer
 
 def export_customer_detail_pdf(request, customer_id):
-    customer = get_object_or_404(Customer, pk=customer_id)
-    contacts = customer.contacts.all()
+    try:
+        return exports.serve_pdf(request, "customer_detail", {"customer_id": customer_id})
+    except Customer.DoesNotExist:
+        raise Http404("No Customer matches the given query.")
+    except (exports.RenderBusy, exports.RenderTimeout) as exc:
+        return exports.overloaded_response(exc)
+    except exports.ExportError:
+        return HttpResponse('Error generating PDF', status=500)
 
-    quoted_visits = customer.visits.filter(is_order_quoted=True)
-    quoted_visits_total = quoted_visits.aggregate(total=Sum('order_amount'))['total'] or 0
 
-    followups = customer.followups.all()
-    followup_order_total = followups.filter(is_order_quoted=True).aggregate(total=Sum('order_amount'))['total'] or 0
-    followup_payment_total = followups.filter(is_payment_collected=True).aggregate(total=Sum('payment_amount'))['total'] or 0
 
-    # Render your existing template to HTML string
-    html = render_to_string('manager/customer_detail_pdf.html', {
-        'customer': customer,
-        'contacts': contacts,
-        'quoted_visits': quoted_visits,
-        'quoted_visits_total': quoted_visits_total,
-        'followups': followups,
-        'followup_order_total': followup_order_total,
-        'followup_payment_total': followup_payment_total,
-    })
+from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
+from visits import customer_pack
+from visits.models import CustomUser
+from .models import DESIGNATION_CHOICES
 
-    result = io.BytesIO()
-    pdf_status = pisa.CreatePDF(io.BytesIO(html.encode('utf-8')), dest=result, encoding='utf-8')
 
-    if pdf_status.err:
-        return HttpResponse('Error generating PDF', status=500)
+# 📦 Detail PDFs for every customer of a branch / designation, as one ZIP
+@login_required
+def export_customer_pdf_pack(request):
+    branch = request.GET.get("branch") or ""
+    designation = request.GET.get("designation") or ""
+    if not (branch or designation):
+        return HttpResponse("Choose a branch or a designation.", status=400)
+    if branch and branch not in dict(CustomUser.BRANCH_CHOICES):
+        raise Http404("Unknown branch")
+    if designation and designation not in dict(DESIGNATION_CHOICES):
+        raise Http404("Unknown designation")
 
-    response = HttpResponse(result.getvalue(), content_type='application/pdf')
-    filename = f'{customer.company_name}_detail.pdf'
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    customers = customer_pack.pack_queryset({"branch": branch, "designation": designation})
+    suffix = "_".join(x for x in (branch, designation) if x).replace(" ", "-")
 
+    response = StreamingHttpResponse(customer_pack.stream_pack(customers), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="customer_statements_{suffix}.zip"'
+    response["X-Content-Type-Options"] = "nosniff"
+    response["Cache-Control"] = "no-store"
     return response
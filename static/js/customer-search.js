@@ -0,0 +1,58 @@
+// Company typeahead for CustomerSearchSelect (visits/forms.py).
+// The <select> starts with only the chosen company; typing in the search box
+// above it refills the options from the customer_autocomplete endpoint.
+(function () {
+  function bind(input) {
+    if (input.dataset.bound) return;
+    input.dataset.bound = "1";
+
+    const select = document.getElementById(input.dataset.customerSearch);
+    let timer = null;
+    let latest = 0;
+
+    function fill(results) {
+      select.innerHTML = "";
+      const first = document.createElement("option");
+      first.value = "";
+      first.textContent = results.length ? "Select company" : "No matching company";
+      select.appendChild(first);
+
+      results.forEach(function (c) {
+        const opt = document.createElement("option");
+        opt.value = c.id;
+        opt.textContent = c.name;
+        select.appendChild(opt);
+      });
+
+      // One match: pick it, and let the page load its contacts
+      if (results.length === 1) {
+        select.value = results[0].id;
+        select.dispatchEvent(new Event("change"));
+      }
+    }
+
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      const q = input.value.trim();
+      if (!q) return;
+
+      timer = setTimeout(function () {
+        const mine = ++latest;
+        fetch(input.dataset.url + "?q=" + encodeURIComponent(q), { headers: { "X-Requested-With": "XMLHttpRequest" } })
+          .then(r => r.ok ? r.json() : Promise.reject())
+          .then(data => { if (mine === latest) fill(data.results || []); })  // ignore out-of-order replies
+          .catch(() => {});
+      }, 200);
+    });
+  }
+
+  function bindAll() {
+    document.querySelectorAll("input[data-customer-search]").forEach(bind);
+  }
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", bindAll);
+  } else {
+    bindAll();
+  }
+})();
@@ -146,6 +146,9 @@ class FollowUpAdmin(admin.ModelAdmin):
         ('Contact Snapshot', {
             'fields': ('contact_number', 'designation', 'latitude', 'longitude')
         }),
+        ('Location', {
+            'fields': ('place_name', 'region', 'zone', 'nation', 'geocode_status', 'geocode_attempts')
+        }),
         ('Meeting Details', {
             'fields': ('meeting_purpose', 'meeting_outcome', 'item_discussed')
         }),
@@ -194,3 +197,24 @@ class FormSubmissionAdmin(admin.ModelAdmin):
     search_fields = ('user__email',)
 
 
+
+
+from .models import GeocodeCache
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('key', 'place_name', 'region', 'zone', 'created_at', 'last_used_at')
+    search_fields = ('key', 'place_name', 'region')
+    ordering = ('-last_used_at',)
+
+
+from .models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'progress', 'size', 'created_at', 'finished_at', 'expires_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('user__email', 'filename')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
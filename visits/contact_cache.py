@@ -0,0 +1,111 @@
+# visits/contact_cache.py
+"""
+Cached contact list per customer for the visit / follow-up forms.
+
+One payload per customer - its designation plus every contact's name and
+phone - so the form fills the contact dropdown and, on selection, the
+phone and designation fields from a single response.
+
+Entries live in the DASHBOARD_CACHE alias under a per-customer version.
+The version is a nanosecond timestamp set whenever the customer or one of
+its contacts changes (visits/signals.py, after commit), so it doubles as
+the response's Last-Modified and, with the customer id, its ETag. A
+conditional request that still matches is answered from the version alone,
+without touching the database.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[getattr(settings, "DASHBOARD_CACHE", "default")]
+
+
+def _ttl():
+    return getattr(settings, "CONTACT_CACHE_TTL", 60 * 60)
+
+
+def _version_key(customer_id):
+    return f"contacts:{customer_id}:version"
+
+
+# -------------------------------
+# Counters
+# -------------------------------
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _bump(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# -------------------------------
+# Versions
+# -------------------------------
+def version(customer_id):
+    """Current version (ns timestamp of the last known change) for a customer."""
+    cache = _cache()
+    key = _version_key(customer_id)
+    current = cache.get(key)
+    if current is None:
+        # Unknown (first use or evicted): start from now, so it can only move forward
+        cache.add(key, time.time_ns(), timeout=None)
+        current = cache.get(key)
+    return current
+
+
+def invalidate(customer_id):
+    cache = _cache()
+    key = _version_key(customer_id)
+    cache.set(key, max(time.time_ns(), (cache.get(key) or 0) + 1), timeout=None)
+    _bump("invalidations")
+
+
+# -------------------------------
+# Payload
+# -------------------------------
+def _compute(customer_id):
+    """Raises Customer.DoesNotExist for an unknown id."""
+    from customer.models import Customer
+
+    customer = Customer.objects.prefetch_related("contacts").get(pk=customer_id)
+    return {
+        "customer": {"id": customer.pk, "name": customer.company_name, "designation": customer.designation},
+        "contacts": [
+            {"id": c.pk, "name": c.contact_name, "contact_number": c.contact_detail}
+            for c in sorted(customer.contacts.all(), key=lambda c: c.contact_name.lower())
+        ],
+    }
+
+
+def contacts(customer_id, at_version):
+    """Payload for `customer_id` as of `at_version` (from version())."""
+    cache = _cache()
+    key = f"contacts:{customer_id}:{at_version}"
+    payload = cache.get(key)
+    if payload is not None:
+        _bump("hits")
+        return payload
+    _bump("misses")
+    payload = _compute(customer_id)
+    cache.set(key, payload, _ttl())
+    return payload
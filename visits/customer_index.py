@@ -0,0 +1,191 @@
+# visits/customer_index.py
+"""
+In-process typeahead index over customer company names.
+
+Every word of a normalised name is a key, so "steel" finds
+"Acme Steel Ltd". Keys live in one sorted list of ``(key, pk)`` tuples;
+a search is a bisect to the first key >= the query plus a walk over the
+matches, so its cost depends on the number of results, not the number of
+customers.
+
+The index is loaded on first use with one ``values_list`` query and then
+kept current by the Customer signals in visits/signals.py, which call
+``upsert()`` / ``remove()`` after commit. Other processes learn about
+changes through a version number in the default cache. A process whose
+copy is behind, or older than CUSTOMER_INDEX_MAX_AGE seconds (this also
+catches ``queryset.update()``, which sends no signals), reloads it.
+
+    search("ac")  ->  [{"id": 7, "name": "Acme Steel Ltd"}, ...]
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from customer.names import normalise
+
+
+VERSION_KEY = "customer_index:version"
+SCAN_LIMIT = 1000  # keys looked at per search, so one-letter queries stay cheap
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting("DASHBOARD_CACHE", "default")]
+
+
+def _keys(name):
+    """The name from each word onwards: "acme steel ltd", "steel ltd", "ltd"."""
+    words = normalise(name).split(" ")
+    return [" ".join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+# -------------------------------
+# Counters
+# -------------------------------
+_stats_lock = threading.Lock()
+_stats = {"searches": 0, "loads": 0, "upserts": 0, "removals": 0}
+
+
+def _bump(counter, n=1):
+    with _stats_lock:
+        _stats[counter] += n
+
+
+def index_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["customers"] = len(_index.names)
+    stats["keys"] = len(_index.keys)
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# -------------------------------
+# The index
+# -------------------------------
+class _Index:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.keys = []    # sorted [(key, pk)]
+        self.names = {}   # pk -> display name
+        self.full = {}    # pk -> normalised name
+        self.version = None
+        self.loaded_at = None
+
+    def load(self, rows, version):
+        names = dict(rows)
+        full = {pk: normalise(name) for pk, name in names.items()}
+        keys = sorted((key, pk) for pk, name in names.items() for key in _keys(name))
+        with self.lock:
+            self.keys, self.names, self.full = keys, names, full
+            self.version, self.loaded_at = version, time.monotonic()
+        _bump("loads")
+
+    def remove(self, pk):
+        with self.lock:
+            name = self.names.pop(pk, None)
+            if name is None:
+                return
+            del self.full[pk]
+            for key in _keys(name):
+                i = bisect.bisect_left(self.keys, (key, pk))
+                if i < len(self.keys) and self.keys[i] == (key, pk):
+                    del self.keys[i]
+
+    def upsert(self, pk, name):
+        with self.lock:
+            self.remove(pk)
+            self.names[pk] = name
+            self.full[pk] = normalise(name)
+            for key in _keys(name):
+                bisect.insort(self.keys, (key, pk))
+
+    def search(self, query, limit):
+        """Names starting with `query` first, then names with a later word that does; each A-Z."""
+        with self.lock:
+            start = bisect.bisect_left(self.keys, (query,))
+            whole, word = [], []
+            for key, pk in self.keys[start:start + SCAN_LIMIT]:
+                if not key.startswith(query):
+                    break
+                (whole if key == self.full[pk] else word).append(pk)
+
+            hits, seen = [], set()
+            for group in (whole, word):
+                for pk in sorted(group, key=lambda p: self.full[p]):
+                    if pk not in seen and len(hits) < limit:
+                        seen.add(pk)
+                        hits.append({"id": pk, "name": self.names[pk]})
+            return hits
+
+
+_index = _Index()
+
+
+def _current_version():
+    version = _cache().get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        _cache().add(VERSION_KEY, version, None)
+        version = _cache().get(VERSION_KEY, version)
+    return version
+
+
+def _ensure_loaded():
+    from customer.models import Customer
+
+    version = _current_version()
+    max_age = _setting("CUSTOMER_INDEX_MAX_AGE", 300)
+    stale = _index.loaded_at is None or time.monotonic() - _index.loaded_at > max_age
+    if stale or _index.version != version:
+        _index.load(Customer.objects.values_list("pk", "company_name").iterator(chunk_size=5000), version)
+
+
+def search(query, limit=20):
+    """Customers whose name, or a word in it, starts with `query`."""
+    query = normalise(query)
+    if not query:
+        return []
+    _ensure_loaded()
+    _bump("searches")
+    return _index.search(query, limit)
+
+
+# -------------------------------
+# Incremental updates (called on commit by visits/signals.py)
+# -------------------------------
+def _bump_version():
+    """Tell other processes; keep our own copy if nobody else changed anything meanwhile."""
+    cache = _cache()
+    try:
+        new = cache.incr(VERSION_KEY)
+    except ValueError:  # no version yet: nobody has loaded an index
+        return
+    with _index.lock:
+        if _index.version is not None and new == _index.version + 1:
+            _index.version = new
+
+
+def upsert(pk, name):
+    if _index.loaded_at is not None:
+        _index.upsert(pk, name)
+        _bump("upserts")
+    _bump_version()
+
+
+def remove(pk):
+    if _index.loaded_at is not None:
+        _index.remove(pk)
+        _bump("removals")
+    _bump_version()
@@ -0,0 +1,155 @@
+# visits/customer_pack.py
+"""
+Customer detail PDFs for a whole branch or designation, streamed as one ZIP.
+
+Customers are read in pk keyset batches through ``exports.customer_details()``
+(one query with the report totals annotated, plus three prefetches per
+batch). Each batch is read in full before its PDFs are rendered, so no
+database cursor stays open across renders and yields; on SQLite an open
+read cursor would block every writer until the download finished.
+Each PDF is rendered in the process pool of visits/render_pool.py, and
+finished PDFs go into the archive in completion order. Only the PDFs in
+flight are ever in memory, never the customer list or the archive.
+
+    response = StreamingHttpResponse(stream_pack(pack_queryset(request.GET)))
+"""
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.text import get_valid_filename
+
+from . import exports, render_pool
+
+
+CUSTOMER_BATCH = 50  # customers (with their visits / follow-ups) per query
+TEMPLATE = "manager/customer_detail_pdf.html"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _ZipSink:
+    """Write-only file for ZipFile; drain() hands back what was written since last time."""
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def pack_queryset(params):
+    """
+    Customers for the pack: `designation`, and/or `branch` meaning customers
+    visited or followed up by a rep of that branch.
+    """
+    from customer.models import Customer
+    from .models import FollowUp, NewVisit
+
+    customers = Customer.objects.all()
+    if params.get("designation"):
+        customers = customers.filter(designation=params["designation"])
+    if params.get("branch"):
+        branch = params["branch"]
+        customers = customers.filter(
+            Q(pk__in=NewVisit.objects.filter(added_by__branch=branch).values("company_name"))
+            | Q(pk__in=FollowUp.objects.filter(added_by__branch=branch).values("company_name"))
+        )
+    return customers
+
+
+def _batches(customers, size=None):
+    """Lists of up to `size` customers by ascending pk, each read in full with its prefetches."""
+    size = size or CUSTOMER_BATCH
+    customers = exports.customer_details(customers).order_by("pk")
+    last = 0
+    while True:
+        batch = list(customers.filter(pk__gt=last)[:size])
+        if batch:
+            yield batch
+        if len(batch) < size:
+            return
+        last = batch[-1].pk
+
+
+def _entry_name(customer, used):
+    name = get_valid_filename(f"{customer.company_name}_detail.pdf")
+    if name in used:
+        name = f"{customer.pk}_{name}"
+    used.add(name)
+    return name
+
+
+def stream_pack(customers, in_flight=None):
+    """
+    Yield the ZIP archive of every customer's detail PDF in byte chunks.
+    At most `in_flight` renders (default: one per pool worker) are queued
+    at once, leaving the rest of the pool's queue to interactive exports.
+    Customers whose PDF fails are listed in ``errors.txt`` in the archive.
+    """
+    if in_flight is None:
+        in_flight = max(1, _setting("PDF_RENDER_WORKERS", 2))
+    timeout = _setting("PDF_RENDER_TIMEOUT", 120)
+
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)  # PDFs are compressed already
+    pending = {}  # future -> entry name
+    used, failed = set(), []
+
+    def collect():
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # Nothing finished in a whole timeout: give up on what's left
+            for future, name in pending.items():
+                future.cancel()
+                failed.append(f"{name}: timed out after {timeout}s")
+            pending.clear()
+        for future in done:
+            name = pending.pop(future)
+            try:
+                data = future.result()
+            except Exception as exc:
+                failed.append(f"{name}: {type(exc).__name__}: {exc}")
+                continue
+            archive.writestr(zipfile.ZipInfo(name, time.localtime()[:6]), data)
+        return sink.drain()
+
+    for batch in _batches(customers):
+        for customer in batch:
+            if len(pending) >= in_flight:
+                yield collect()
+            name = _entry_name(customer, used)
+            try:
+                future = render_pool.submit(
+                    exports.render, "customer_detail", TEMPLATE, exports.detail_context(customer), wait=timeout
+                )
+            except render_pool.RenderBusy:
+                failed.append(f"{name}: renderer busy")
+                continue
+            pending[future] = name
+
+    while pending:
+        yield collect()
+
+    if failed:
+        archive.writestr("errors.txt", "\n".join(failed) + "\n")
+    archive.close()
+    yield sink.drain()
@@ -0,0 +1,143 @@
+# visits/dashboard.py
+"""
+Cached payload for the rep dashboard (``index``).
+
+The per-user numbers (from the daily rollups) and the shared customer count
+are cached separately in Django's cache framework, under the alias named by
+DASHBOARD_CACHE (any backend: locmem, file-based, redis...).
+
+Each entry is keyed by a version number. Signals in visits/signals.py bump
+the version of the affected user - or of the customer count - once the
+writing transaction commits, so a reader that was computing from the old
+data can only store its result under a version nobody asks for any more.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q, Sum
+
+
+USER_FIELDS = [
+    "visit_quoted_count", "visit_quoted_amount",
+    "followup_total", "followup_quoted_count", "followup_quoted_amount",
+    "paid_count", "paid_amount",
+]
+
+
+def _cache():
+    return caches[getattr(settings, "DASHBOARD_CACHE", "default")]
+
+
+def _ttl():
+    return getattr(settings, "DASHBOARD_CACHE_TTL", 15 * 60)
+
+
+# -------------------------------
+# Counters
+# -------------------------------
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _bump(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def cache_stats():
+    """Snapshot of the hit / miss counters for this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["lookups"] = lookups
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["backend"] = type(_cache()).__name__
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# -------------------------------
+# Versioned entries
+# -------------------------------
+def _version(cache, name):
+    key = f"dashboard:{name}:version"
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted counter never reuses an old version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _invalidate(name):
+    cache = _cache()
+    key = f"dashboard:{name}:version"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+    _bump("invalidations")
+
+
+def _cached(name, compute):
+    cache = _cache()
+    key = f"dashboard:{name}:{_version(cache, name)}"
+    value = cache.get(key)
+    if value is not None:
+        _bump("hits")
+        return value
+    _bump("misses")
+    value = compute()
+    cache.set(key, value, _ttl())
+    return value
+
+
+# -------------------------------
+# Payload
+# -------------------------------
+def _compute_user_stats(user_id):
+    from .models import DailySalesRollup
+
+    visit = Q(kind="visit")
+    followup = Q(kind="followup")
+    stats = DailySalesRollup.objects.filter(user_id=user_id).aggregate(
+        visit_quoted_count=Sum('quoted_count', filter=visit),
+        visit_quoted_amount=Sum('order_amount', filter=visit),
+        followup_total=Sum('visit_count', filter=followup),
+        followup_quoted_count=Sum('quoted_count', filter=followup),
+        followup_quoted_amount=Sum('order_amount', filter=followup),
+        paid_count=Sum('payment_count', filter=followup),
+        paid_amount=Sum('payment_amount', filter=followup),
+    )
+    return {k: stats[k] or 0 for k in USER_FIELDS}
+
+
+def _compute_customer_count():
+    from customer.models import Customer
+
+    return Customer.objects.count()
+
+
+def user_stats(user):
+    """Rollup totals for `user`'s own visits and follow-ups."""
+    return _cached(f"user:{user.pk}", lambda: _compute_user_stats(user.pk))
+
+
+def customer_count():
+    return _cached("customers", _compute_customer_count)
+
+
+def invalidate_user(user_id):
+    if user_id:
+        _invalidate(f"user:{user_id}")
+
+
+def invalidate_customers():
+    _invalidate("customers")
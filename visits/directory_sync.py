@@ -0,0 +1,140 @@
+# visits/directory_sync.py
+"""
+Delta sync of the customer / contact directory for offline clients.
+
+Every save or delete of a Customer or CustomerContact appends a
+DirectoryChange row (visits/signals.py, inside the writing transaction).
+Its ``seq`` is an AUTOINCREMENT key, so it only grows and is never reused;
+the last ``seq`` a client has seen is its sync token:
+
+    GET /directory/changes/?since=<token>&limit=500
+
+The answer is NDJSON, one change per line, oldest first, then a trailer:
+
+    {"seq":41,"type":"customer","id":7,"data":{"company_name":"Acme Ltd",...}}
+    {"seq":42,"type":"contact","id":19,"data":{"customer_id":7,...}}
+    {"seq":45,"type":"contact","id":12,"deleted":true}
+    {"token":"45","more":false}
+
+An object changed several times within a page appears once, with its
+current data. ``more`` means another page is waiting; ask again with the
+new token. Without a token (first sync) tombstones are left out, since the
+client has nothing to delete. Upserts of rows that have since been deleted
+are skipped too; their tombstone follows in this or a later page.
+
+Writes are serialised on SQLite (one writer, holding the lock from its
+first write to commit), so ``seq`` order is commit order and a reader
+can't see seq 12 before seq 11 exists.
+
+``queryset.update()`` and ``bulk_create()`` send no signals and so don't
+reach the feed; code that uses them on these models must call ``record()``.
+``manage.py compact_directory_changes`` drops superseded entries so a full
+sync stays one line per object.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+
+from .models import DirectoryChange
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class TokenError(ValueError):
+    """The client's sync token isn't one we handed out."""
+
+
+def _fields():
+    from customer.models import Customer, CustomerContact
+
+    # kind -> (model, fields sent in "data")
+    return {
+        "customer": (Customer, ("company_name", "designation", "location", "email")),
+        "contact": (CustomerContact, ("customer_id", "contact_name", "contact_detail")),
+    }
+
+
+def record(kind, object_ids, deleted=False):
+    """Log changes to `object_ids` of `kind` ("customer" / "contact")."""
+    DirectoryChange.objects.bulk_create(
+        [DirectoryChange(kind=kind, object_id=pk, deleted=deleted) for pk in object_ids]
+    )
+
+
+def parse_token(token):
+    """0 for no token (first sync); TokenError for anything but a non-negative integer."""
+    if token in (None, ""):
+        return 0
+    try:
+        since = int(token)
+    except (TypeError, ValueError):
+        raise TokenError("Invalid sync token.")
+    if since < 0:
+        raise TokenError("Invalid sync token.")
+    return since
+
+
+def page_size(limit=None):
+    largest = _setting("DIRECTORY_SYNC_PAGE_SIZE", 1000)
+    try:
+        return max(1, min(int(limit), largest)) if limit else largest
+    except (TypeError, ValueError):
+        return largest
+
+
+def changes(since, limit):
+    """
+    (records, token, more) for changes after `since`. `records` are dicts
+    ready to serialise; one query for the log plus one per kind with upserts.
+    """
+    entries = list(DirectoryChange.objects.filter(seq__gt=since).order_by("seq")[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+    token = entries[-1].seq if entries else since
+
+    latest = {}  # (kind, id) -> newest entry in this page
+    for entry in entries:
+        latest[(entry.kind, entry.object_id)] = entry
+
+    current = {}
+    for kind, (model, fields) in _fields().items():
+        ids = [pk for (k, pk), entry in latest.items() if k == kind and not entry.deleted]
+        if ids:
+            current[kind] = {row["id"]: row for row in model.objects.filter(pk__in=ids).values("id", *fields)}
+
+    records = []
+    for entry in sorted(latest.values(), key=lambda e: e.seq):
+        record = {"seq": entry.seq, "type": entry.kind, "id": entry.object_id}
+        if entry.deleted:
+            if not since:
+                continue
+            record["deleted"] = True
+        else:
+            data = current.get(entry.kind, {}).get(entry.object_id)
+            if data is None:
+                continue
+            del data["id"]
+            record["data"] = data
+        records.append(record)
+    return records, token, more
+
+
+def ndjson(records, token, more):
+    """The response body: one compact JSON object per line, trailer last."""
+    dumps = lambda obj: json.dumps(obj, cls=DjangoJSONEncoder, separators=(",", ":"))
+    lines = [dumps(record) for record in records]
+    lines.append(dumps({"token": str(token), "more": more}))
+    return "\n".join(lines) + "\n"
+
+
+def compact():
+    """Delete every entry with a newer one for the same object. Returns the number deleted."""
+    newer = DirectoryChange.objects.filter(
+        kind=OuterRef("kind"), object_id=OuterRef("object_id"), seq__gt=OuterRef("seq")
+    )
+    deleted, _ = DirectoryChange.objects.filter(Exists(newer)).delete()
+    return deleted
@@ -0,0 +1,69 @@
+# visits/enrichment.py
+"""
+Per-row enrichment for list / detail views.
+
+Enrichers run on the rows that are actually rendered - after pagination,
+on the materialised page - so their cost follows the page size rather than
+the size of the user's history. A view lists the enrichers it wants and
+hands them to ``paginate`` (or ``enrich`` for unpaginated detail pages):
+
+    VISIT_LIST_ENRICHERS = [LocationEnricher(), ContactSnapshotEnricher()]
+    visits = paginate(request, visits_qs, 20, VISIT_LIST_ENRICHERS)
+"""
+from django.core.paginator import Paginator
+
+from .geocoding import fill_missing_locations
+
+
+class Enricher:
+    """Mutates a list of model instances in place."""
+
+    def __call__(self, objects):
+        raise NotImplementedError
+
+
+class LocationEnricher(Enricher):
+    """
+    Display location for rows the geocode worker hasn't reached yet.
+
+    By default only the gazetteer and cache tiers are used, so a page never
+    waits on Nominatim; pass remote=True where blocking is acceptable.
+    """
+
+    def __init__(self, remote=False):
+        self.remote = remote
+
+    def __call__(self, objects):
+        fill_missing_locations(objects, remote=self.remote)
+
+
+class ContactSnapshotEnricher(Enricher):
+    """
+    Fill contact_number / designation from the selected contact when the
+    snapshot taken at submission time is empty (e.g. rows added via admin).
+    Select the queryset with ``contact_person__customer`` to keep this free.
+    """
+
+    def __call__(self, objects):
+        for obj in objects:
+            contact = obj.contact_person
+            if contact is None:
+                continue
+            if not obj.contact_number:
+                obj.contact_number = contact.contact_detail
+            if not obj.designation:
+                obj.designation = contact.customer.designation
+
+
+def enrich(objects, enrichers):
+    objects = list(objects)
+    for enricher in enrichers:
+        enricher(objects)
+    return objects
+
+
+def paginate(request, queryset, per_page, enrichers=()):
+    """Paginator.get_page() for ?page=, then run `enrichers` on that page only."""
+    page = Paginator(queryset, per_page).get_page(request.GET.get("page"))
+    page.object_list = enrich(page.object_list, enrichers)
+    return page
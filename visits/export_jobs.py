@@ -0,0 +1,121 @@
+# visits/export_jobs.py
+"""
+Background PDF exports.
+
+A POST to ``export-jobs/<kind>/`` stores an ``ExportJob``; ``manage.py
+export_worker`` claims queued jobs one at a time, renders them through
+``visits.exports.build`` and writes the PDF under EXPORT_ROOT. The browser
+polls the status endpoint and downloads the file once it is done. Files are
+deleted EXPORT_TTL seconds after they are finished.
+"""
+import os
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import exports, pdf_cache
+from .models import ExportJob
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def export_root():
+    root = Path(_setting("EXPORT_ROOT", Path(settings.BASE_DIR) / "exports"))
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def enqueue(user, kind, params):
+    return ExportJob.objects.create(user=user, kind=kind, params=params)
+
+
+def claim():
+    """Mark the oldest queued job as running and return it, or None."""
+    now = timezone.now()
+
+    # A worker that died mid-job leaves it 'running'; hand it out again
+    stale = now - timedelta(seconds=_setting("EXPORT_JOB_TIMEOUT", 15 * 60))
+    ExportJob.objects.filter(status="running", started_at__lt=stale).update(status="queued", progress=0)
+
+    for pk in ExportJob.objects.filter(status="queued").order_by("created_at").values_list("pk", flat=True)[:10]:
+        # Conditional update: only one worker wins each job
+        if ExportJob.objects.filter(pk=pk, status="queued").update(status="running", started_at=now, progress=0):
+            return ExportJob.objects.select_related("user").get(pk=pk)
+    return None
+
+
+def run(job):
+    """Render `job` and store the file. Failures are recorded on the job."""
+    def progress(percent):
+        ExportJob.objects.filter(pk=job.pk).update(progress=percent)
+
+    try:
+        # Same content-addressed cache as the direct download views
+        key, filename = exports.fingerprint(job.kind, job.user, job.params)
+        cached = pdf_cache.open_cached(key)
+        if cached is not None:
+            with cached:
+                data = cached.read()
+        else:
+            filename, data = exports.build(job.kind, job.user, job.params, progress, pooled=False)
+            pdf_cache.store(key, data)
+    except Exception as exc:
+        job.status = "failed"
+        job.error = f"{type(exc).__name__}: {exc}"
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        return job
+
+    path = export_root() / f"{job.pk}-{uuid.uuid4().hex}.pdf"
+    tmp = path.with_suffix(".part")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)  # never expose a half-written file
+
+    now = timezone.now()
+    job.status = "done"
+    job.progress = 100
+    job.file_path = str(path)
+    job.filename = filename
+    job.size = len(data)
+    job.finished_at = now
+    job.expires_at = now + timedelta(seconds=_setting("EXPORT_TTL", 24 * 60 * 60))
+    job.save(update_fields=["status", "progress", "file_path", "filename", "size", "finished_at", "expires_at"])
+    return job
+
+
+def purge_expired():
+    """Delete files past their expiry. Returns the number of jobs expired."""
+    expired = ExportJob.objects.filter(status="done", expires_at__lt=timezone.now())
+    count = 0
+    for job in expired:
+        if job.file_path:
+            Path(job.file_path).unlink(missing_ok=True)
+        job.status = "expired"
+        job.file_path = ""
+        job.save(update_fields=["status", "file_path"])
+        count += 1
+    return count
+
+
+def describe(job):
+    """Status payload for the polling endpoint."""
+    data = {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "status_url": reverse("export_job_status", args=[job.pk]),
+    }
+    if job.status == "done":
+        data["download_url"] = reverse("export_job_download", args=[job.pk])
+        data["expires_at"] = job.expires_at.isoformat()
+        data["size"] = job.size
+    if job.status == "failed":
+        data["error"] = job.error
+    return data
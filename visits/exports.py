@@ -0,0 +1,538 @@
+# visits/exports.py
+"""
+PDF exports: each export kind builds its template context from the
+requesting user and a small dict of parameters. The tabular reports
+(visits, follow-ups) are drawn with ReportLab by visits/pdf_tables.py;
+the customer detail page is rendered from HTML with xhtml2pdf.
+
+The synchronous export views and the export job worker
+(``manage.py export_worker``) both go through ``build()``, so a PDF looks
+the same whichever way it was requested. From the views the render itself
+runs in the process pool of visits/render_pool.py, so it can't stall the
+web worker's other threads; contexts are therefore fully loaded (no lazy
+querysets) before they are handed over.
+
+Raw data (CSV / NDJSON) is streamed instead: rows are read in keyset
+windows by pk, each window fetched in full before any of it is written,
+so memory stays flat however many rows are exported and no database
+cursor is held open while the client downloads (an open SQLite read
+cursor would block every writer until the download ends).
+"""
+import csv
+import hashlib
+import io
+import json
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, DecimalField, Max, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localtime
+from xhtml2pdf import pisa
+
+from . import pdf_cache, pdf_tables, render_pool, rollups
+from .geocoding import fill_missing_locations
+from .pdf_tables import Column
+from .render_pool import RenderBusy, RenderTimeout  # noqa: F401 - raised by build()
+
+
+# Bump when a report template or table layout changes, so cached PDFs
+# rendered with the old layout are no longer served.
+TEMPLATE_VERSION = 1
+
+
+class ExportError(Exception):
+    """The PDF could not be produced."""
+
+
+# -------------------------------
+# Context builders: (user, params) -> (template, context, filename)
+# -------------------------------
+def _dated_filename(name, params):
+    created_date = params.get("created_date")
+    return f'{name}{"_" + created_date if created_date else ""}.pdf'
+
+
+def visits_queryset(user, params):
+    from .models import NewVisit
+
+    visits_qs = NewVisit.objects.filter(daily_form__user=user)
+    parsed_date = parse_date(params.get("created_date") or "")
+    if parsed_date:
+        visits_qs = visits_qs.filter(created_at__date=parsed_date)
+    return visits_qs
+
+
+def followups_queryset(user, params):
+    from .models import FollowUp
+
+    followups_qs = FollowUp.objects.filter(added_by=user)
+    parsed_date = parse_date(params.get("created_date") or "")
+    if parsed_date:
+        followups_qs = followups_qs.filter(created_at__date=parsed_date)
+    return followups_qs
+
+
+def visits_context(user, params):
+    created_date = params.get("created_date")
+    parsed_date = parse_date(created_date or "")
+    visits_qs = (
+        visits_queryset(user, params)
+        .select_related("company_name", "contact_person__customer")
+        .order_by("-created_at")
+    )
+
+    # Totals for quoted orders, read from the daily rollups
+    totals = rollups.totals(user, "visit", date=parsed_date)
+
+    # Rows the geocode worker hasn't reached yet are resolved in one batch
+    visits = fill_missing_locations(list(visits_qs))
+
+    context = {
+        "visits": visits,
+        "created_date": created_date,
+        "total_order_amount": totals["order_amount"],
+        "total_quoted_count": totals["quoted_count"],
+    }
+    return "manager/visits_pdf.html", context, _dated_filename("visits", params)
+
+
+def followups_context(user, params):
+    created_date = params.get("created_date")
+    parsed_date = parse_date(created_date or "")
+    followups_qs = (
+        followups_queryset(user, params)
+        .select_related("company_name", "contact_person__customer")
+        .order_by("-created_at")
+    )
+
+    totals = rollups.totals(user, "followup", date=parsed_date)
+
+    # Rows the geocode worker hasn't reached yet are resolved in one batch
+    followups = fill_missing_locations(list(followups_qs))
+
+    context = {
+        "followups": followups,
+        "created_date": created_date,
+        "total_order_amount": totals["order_amount"],
+        "total_payment_collected": totals["payment_amount"],
+        "total_followups": totals["visit_count"],
+        "count_order_quoted": totals["quoted_count"],
+        "count_payment_collected": totals["payment_count"],
+    }
+    return "manager/followups_pdf.html", context, _dated_filename("followups", params)
+
+
+def _customer_total(model, field, **filters):
+    """SUM(`field`) over the outer customer's `model` rows, 0 when there are none."""
+    rows = (
+        model.objects.filter(company_name=OuterRef("pk"), **filters)
+        .order_by()
+        .values("company_name")
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    amount = DecimalField(max_digits=20, decimal_places=2)
+    return Coalesce(Subquery(rows, output_field=amount), Value(Decimal(0)), output_field=amount)
+
+
+def customer_details(customers):
+    """
+    `customers` with the detail report's three totals annotated (correlated
+    subqueries, so still one query for any number of customers) and its
+    contacts, quoted visits and follow-ups prefetched.
+    """
+    from .models import FollowUp, NewVisit
+
+    return customers.annotate(
+        quoted_visits_total=_customer_total(NewVisit, "order_amount", is_order_quoted=True),
+        followup_order_total=_customer_total(FollowUp, "order_amount", is_order_quoted=True),
+        followup_payment_total=_customer_total(FollowUp, "payment_amount", is_payment_collected=True),
+    ).prefetch_related(
+        "contacts",
+        Prefetch(
+            "visits", to_attr="quoted_visit_list",
+            queryset=NewVisit.objects.filter(is_order_quoted=True).select_related("contact_person"),
+        ),
+        Prefetch("followups", to_attr="followup_list", queryset=FollowUp.objects.select_related("contact_person")),
+    )
+
+
+def detail_context(customer):
+    """Template context for one customer fetched through customer_details()."""
+    # Plain lists, so rendering in the pool needs no further queries
+    return {
+        'customer': customer,
+        'contacts': list(customer.contacts.all()),
+        'quoted_visits': customer.quoted_visit_list,
+        'quoted_visits_total': customer.quoted_visits_total,
+        'followups': customer.followup_list,
+        'followup_order_total': customer.followup_order_total,
+        'followup_payment_total': customer.followup_payment_total,
+    }
+
+
+def customer_detail_context(user, params):
+    """Raises Customer.DoesNotExist for an unknown customer_id."""
+    from customer.models import Customer
+
+    customer = customer_details(Customer.objects.filter(pk=params["customer_id"])).get()
+    return 'manager/customer_detail_pdf.html', detail_context(customer), f'{customer.company_name}_detail.pdf'
+
+
+EXPORTS = {
+    "visits": visits_context,
+    "followups": followups_context,
+    "customer_detail": customer_detail_context,
+}
+
+# Request parameters each kind accepts
+PARAMS = {
+    "visits": ["created_date"],
+    "followups": ["created_date"],
+    "customer_detail": ["customer_id"],
+}
+
+
+# -------------------------------
+# Table layouts for the ReportLab renderer: context -> (title, summary, columns, rows)
+# Same columns as the HTML templates.
+# -------------------------------
+def _amount(value):
+    return f"{value or 0:,.2f}"
+
+
+def _location(obj):
+    if not (obj.latitude and obj.longitude):
+        return "Not Available"
+    detail = " ".join(x for x in (obj.region, obj.zone, obj.nation) if x)
+    return f'{obj.place_name or "Location pending"}\n{detail}'.strip()
+
+
+def _yes_no(flag):
+    return "Yes" if flag else "No"
+
+
+VISIT_PDF_COLUMNS = [
+    Column("#", 0.03),
+    Column("Production Line", 0.10),
+    Column("Client / Company", 0.12, wrap=True),
+    Column("Contact Person", 0.10, wrap=True),
+    Column("Contact Number", 0.10),
+    Column("Designation", 0.08),
+    Column("Location", 0.14, wrap=True),
+    Column("Order Quoted", 0.08),
+    Column("Order Amount", 0.10),
+    Column("Reason (if No Order)", 0.15, wrap=True),
+]
+
+FOLLOWUP_PDF_COLUMNS = [
+    Column("#", 0.03),
+    Column("Production Line", 0.09),
+    Column("Client / Company", 0.11, wrap=True),
+    Column("Contact Person", 0.09, wrap=True),
+    Column("Contact Number", 0.08),
+    Column("Designation", 0.07),
+    Column("Location", 0.13, wrap=True),
+    Column("Order Quoted", 0.06),
+    Column("Order Amount", 0.08),
+    Column("Reason (No Order)", 0.11, wrap=True),
+    Column("Payment Collected", 0.07),
+    Column("Payment Amount", 0.08),
+]
+
+
+def visits_table(context):
+    summary = []
+    if context["created_date"]:
+        summary.append(f'Filtered Date: {context["created_date"]}')
+    summary += [
+        f'Total Quoted Orders: {context["total_quoted_count"]}',
+        f'Total Amount: {_amount(context["total_order_amount"])}',
+    ]
+    rows = (
+        [
+            i, v.get_productionline_display(), v.company_name, v.contact_person,
+            v.contact_number, v.designation, _location(v), _yes_no(v.is_order_quoted),
+            _amount(v.order_amount) if v.is_order_quoted else "N/A", v.reason_no_order or "N/A",
+        ]
+        for i, v in enumerate(context["visits"], 1)
+    )
+    return "All Visits Report", summary, VISIT_PDF_COLUMNS, rows
+
+
+def followups_table(context):
+    summary = []
+    if context["created_date"]:
+        summary.append(f'Filtered Date: {context["created_date"]}')
+    summary += [
+        f'Total Follow-ups: {context["total_followups"]}',
+        f'Orders Quoted: {context["count_order_quoted"]}',
+        f'Payments Collected: {context["count_payment_collected"]}',
+        f'Total Order Amount: {_amount(context["total_order_amount"])}',
+        f'Total Payment Collected: {_amount(context["total_payment_collected"])}',
+    ]
+    rows = (
+        [
+            i, f.get_productionline_display() or "-", f.company_name or "-", f.contact_person or "-",
+            f.contact_number or "-", f.designation or "-", _location(f), _yes_no(f.is_order_quoted),
+            _amount(f.order_amount) if f.is_order_quoted else "-", f.reason_no_order or "N/A",
+            _yes_no(f.is_payment_collected), _amount(f.payment_amount) if f.is_payment_collected else "-",
+        ]
+        for i, f in enumerate(context["followups"], 1)
+    )
+    return "Follow-ups Report", summary, FOLLOWUP_PDF_COLUMNS, rows
+
+
+TABLE_LAYOUTS = {
+    "visits": visits_table,
+    "followups": followups_table,
+}
+
+
+# -------------------------------
+# Rendering
+# -------------------------------
+def render_pdf(template, context):
+    html = render_to_string(template, context)
+    result = io.BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=result, encoding="utf-8")
+    if pisa_status.err:
+        raise ExportError(f"xhtml2pdf reported {pisa_status.err} error(s) rendering {template}")
+    return result.getvalue()
+
+
+def render(kind, template, context):
+    """Tabular kinds go to ReportLab unless EXPORT_TABLE_RENDERER = 'pisa'."""
+    renderer = getattr(settings, "EXPORT_TABLE_RENDERER", "reportlab")
+    if kind in TABLE_LAYOUTS and renderer == "reportlab":
+        return pdf_tables.render(*TABLE_LAYOUTS[kind](context))
+    return render_pdf(template, context)
+
+
+def build(kind, user, params, progress=None, pooled=True):
+    """
+    Produce one export. Returns (filename, pdf_bytes).
+    `progress`, if given, is called with a percentage as work completes.
+    With `pooled` the render runs in the PDF process pool and may raise
+    RenderBusy / RenderTimeout; the export worker, already a process of
+    its own, renders inline.
+    """
+    template, context, filename = EXPORTS[kind](user, params)
+    if progress:
+        progress(30)
+    if pooled:
+        try:
+            data = render_pool.call(render, kind, template, context)
+        except BrokenProcessPool as exc:
+            raise ExportError("PDF render worker died") from exc
+    else:
+        data = render(kind, template, context)
+    if progress:
+        progress(90)
+    return filename, data
+
+
+# -------------------------------
+# Cached PDFs: fingerprint -> ETag + disk cache (visits/pdf_cache.py)
+# -------------------------------
+def _activity_state(qs):
+    state = qs.aggregate(last=Max("updated_at"), rows=Count("id"))
+    return [state["last"], state["rows"]]
+
+
+def fingerprint(kind, user, params):
+    """
+    Hash of everything the PDF is made from: kind, layout version, renderer,
+    filters and the newest ``updated_at`` + row count of the data behind it.
+    Returns (key, download filename); one or two aggregate queries.
+    """
+    from customer.models import Customer
+
+    params = {k: params[k] for k in PARAMS[kind] if params.get(k) not in (None, "")}
+    parts = [kind, TEMPLATE_VERSION, getattr(settings, "EXPORT_TABLE_RENDERER", "reportlab"), params]
+
+    if kind == "visits":
+        parts += [user.pk] + _activity_state(visits_queryset(user, params))
+        filename = _dated_filename("visits", params)
+    elif kind == "followups":
+        parts += [user.pk] + _activity_state(followups_queryset(user, params))
+        filename = _dated_filename("followups", params)
+    else:
+        # Same PDF for every user; customer and contacts have no updated_at,
+        # so their displayed fields go into the hash directly
+        customer = Customer.objects.get(pk=params["customer_id"])
+        parts += [customer.company_name, customer.designation, customer.email, customer.location]
+        parts += [list(customer.contacts.order_by("pk").values_list("pk", "contact_name", "contact_detail"))]
+        parts += _activity_state(customer.visits.all()) + _activity_state(customer.followups.all())
+        filename = f"{customer.company_name}_detail.pdf"
+
+    key = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return key, filename
+
+
+def serve_pdf(request, kind, params):
+    """
+    Respond with the export, from the PDF cache when its fingerprint is
+    unchanged, or 304 when the browser already has this exact version.
+    """
+    key, filename = fingerprint(kind, request.user, params)
+    etag = f'"{key}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cached = pdf_cache.open_cached(key)
+        if cached is None:
+            _, data = build(kind, request.user, params)
+            pdf_cache.store(key, data)
+            response = HttpResponse(data, content_type="application/pdf")
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        else:
+            response = FileResponse(cached, as_attachment=True, filename=filename, content_type="application/pdf")
+
+    response["ETag"] = etag
+    response["X-Content-Type-Options"] = "nosniff"
+    response["Cache-Control"] = "private, no-cache"  # keep it, but revalidate every time
+    return response
+
+
+def overloaded_response(exc):
+    """503 (try again shortly) when the render pool is full, 504 when it timed out."""
+    if isinstance(exc, RenderBusy):
+        response = HttpResponse("The PDF renderer is busy, please try again shortly.", status=503)
+        response["Retry-After"] = "10"
+        return response
+    return HttpResponse("The PDF took too long to generate. Try a narrower date range.", status=504)
+
+
+# -------------------------------
+# Tabular exports (CSV / NDJSON)
+# -------------------------------
+def _related(fk, attr):
+    def get(obj):
+        target = getattr(obj, fk)
+        return getattr(target, attr) if target is not None else None
+    return get
+
+
+def _field(name):
+    return lambda obj: getattr(obj, name)
+
+
+VISIT_COLUMNS = [
+    ("id", _field("pk")),
+    ("created_at", lambda obj: localtime(obj.created_at).isoformat()),
+    ("rep", _related("added_by", "email")),
+    ("rep_zone", _related("added_by", "zone")),
+    ("rep_branch", _related("added_by", "branch")),
+    ("production_line", lambda obj: obj.get_productionline_display()),
+    ("company", _related("company_name", "company_name")),
+    ("contact_person", _related("contact_person", "contact_name")),
+    ("contact_number", _field("contact_number")),
+    ("designation", _field("designation")),
+    ("latitude", _field("latitude")),
+    ("longitude", _field("longitude")),
+    ("place_name", _field("place_name")),
+    ("region", _field("region")),
+    ("meeting_purpose", _field("meeting_purpose")),
+    ("meeting_outcome", _field("meeting_outcome")),
+    ("item_discussed", _field("item_discussed")),
+    ("order_quoted", _field("is_order_quoted")),
+    ("order_amount", _field("order_amount")),
+    ("reason_no_order", _field("reason_no_order")),
+]
+
+FOLLOWUP_COLUMNS = VISIT_COLUMNS + [
+    ("payment_collected", _field("is_payment_collected")),
+    ("payment_amount", _field("payment_amount")),
+    ("reason_no_payment", _field("reason_no_payment")),
+]
+
+STREAM_BATCH_ROWS = 500  # rows joined into one chunk of the response
+
+
+def tabular_queryset(model, scope, params):
+    """
+    `model` rows inside `scope` (a Q on the row), filtered by the request
+    parameters: created_date, date_from / date_to (inclusive), zone, branch.
+    """
+    qs = model.objects.filter(scope)
+
+    created_date = parse_date(params.get("created_date") or "")
+    if created_date:
+        qs = qs.filter(created_at__date=created_date)
+    date_from = parse_date(params.get("date_from") or "")
+    if date_from:
+        qs = qs.filter(created_at__date__gte=date_from)
+    date_to = parse_date(params.get("date_to") or "")
+    if date_to:
+        qs = qs.filter(created_at__date__lte=date_to)
+
+    if params.get("zone"):
+        qs = qs.filter(added_by__zone=params["zone"])
+    if params.get("branch"):
+        qs = qs.filter(added_by__branch=params["branch"])
+
+    # Newest first by pk, the key the stream's windows walk
+    return qs.select_related("added_by", "company_name", "contact_person").order_by("-pk")
+
+
+class _Echo:
+    """csv.writer target that hands each line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= STREAM_BATCH_ROWS:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def _windows(queryset, chunk_size):
+    """Rows of `queryset` by descending pk, one fully read window of `chunk_size` per query."""
+    queryset = queryset.order_by("-pk")
+    last = None
+    while True:
+        window = list((queryset if last is None else queryset.filter(pk__lt=last))[:chunk_size])
+        yield from window
+        if len(window) < chunk_size:
+            return
+        last = window[-1].pk
+
+
+def stream_csv(queryset, columns, chunk_size=2000):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield "\ufeff" + writer.writerow([name for name, _ in columns])  # BOM so Excel reads UTF-8
+        for obj in _windows(queryset, chunk_size):
+            yield writer.writerow([get(obj) for _, get in columns])
+
+    return _batched(lines())
+
+
+def stream_ndjson(queryset, columns, chunk_size=2000):
+    def lines():
+        for obj in _windows(queryset, chunk_size):
+            yield json.dumps({name: get(obj) for name, get in columns}, cls=DjangoJSONEncoder) + "\n"
+
+    return _batched(lines())
+
+
+STREAM_FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+}
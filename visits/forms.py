@@ -2,9 +2,46 @@
 from decimal import Decimal, ROUND_HALF_UP
 from django import forms
 from django.core.exceptions import ValidationError
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import NewVisit, Customer, CustomerContact
 
 
+# Filled in by the geocode worker, never by the user
+LOCATION_FIELDS = [
+    'place_name', 'region', 'zone', 'nation',
+    'geocode_status', 'geocode_attempts', 'geocode_next_attempt_at',
+]
+
+
+class CustomerSearchSelect(forms.Select):
+    """
+    Company picker that doesn't ship every customer to the phone: the
+    <select> holds only the current choice, and the search box rendered
+    above it refills it from the customer_autocomplete endpoint.
+    """
+
+    def optgroups(self, name, value, attrs=None):
+        chosen = [v for v in value if str(v).isdigit()]
+        choices = [("", "Type to search companies")]
+        choices += [(c.pk, str(c)) for c in Customer.objects.filter(pk__in=chosen)]
+        original, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = original
+
+    def render(self, name, value, attrs=None, renderer=None):
+        select = super().render(name, value, attrs, renderer)
+        select_id = (attrs or {}).get("id") or self.attrs.get("id") or f"id_{name}"
+        return format_html(
+            '<input type="search" class="form-control mb-1" placeholder="Search company…" autocomplete="off" '
+            'data-customer-search="{}" data-url="{}">{}<script src="{}" defer></script>',
+            select_id, reverse("customer_autocomplete"), select, static("js/customer-search.js"),
+        )
+
+
 class NewVisitForm(forms.ModelForm):
     # ✅ Add read-only fields for template
     contact_number = forms.CharField(
@@ -26,10 +63,10 @@ class NewVisitForm(forms.ModelForm):
 
     class Meta:
         model = NewVisit
-        exclude = ['added_by', 'created_at', 'updated_at']
+        exclude = ['added_by', 'created_at', 'updated_at'] + LOCATION_FIELDS
         widgets = {
             'productionline': forms.Select(attrs={'class': 'form-select'}),
-            'company_name': forms.Select(attrs={'class': 'form-select', 'id': 'id_company_name'}),
+            'company_name': CustomerSearchSelect(attrs={'class': 'form-select', 'id': 'id_company_name'}),
             'contact_person': forms.Select(attrs={'class': 'form-select', 'id': 'id_contact_person'}),
             'meeting_purpose': forms.TextInput(attrs={'class': 'form-control'}),
             'meeting_outcome': forms.TextInput(attrs={'class': 'form-control'}),
@@ -44,8 +81,8 @@ class NewVisitForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Always show companies
-        self.fields['company_name'].queryset = Customer.objects.all().order_by('company_name')
+        # Any company validates; the widget only renders the chosen one (typeahead)
+        self.fields['company_name'].queryset = Customer.objects.all()
 
         # Default: no contacts
         self.fields['contact_person'].queryset = CustomerContact.objects.none()
@@ -62,9 +99,10 @@ class NewVisitForm(forms.ModelForm):
             company_id = self.instance.company_name_id
 
         if company_id:
+            # customer joined in: the view copies its designation onto the row
             self.fields['contact_person'].queryset = CustomerContact.objects.filter(
                 customer_id=company_id
-            ).order_by('contact_name')
+            ).select_related('customer').order_by('contact_name')
             self.fields['contact_person'].empty_label = "Select contact"
 
     def clean(self):
@@ -129,10 +167,10 @@ class FollowUpForm(forms.ModelForm):
 
     class Meta:
         model = FollowUp
-        exclude = ['added_by', 'created_at', 'updated_at']
+        exclude = ['added_by', 'created_at', 'updated_at'] + LOCATION_FIELDS
         widgets = {
             'productionline': forms.Select(attrs={'class': 'form-select'}),
-            'company_name': forms.Select(attrs={'class': 'form-select', 'id': 'id_company_name'}),
+            'company_name': CustomerSearchSelect(attrs={'class': 'form-select', 'id': 'id_company_name'}),
             'contact_person': forms.Select(attrs={'class': 'form-select', 'id': 'id_contact_person'}),
             'meeting_purpose': forms.TextInput(attrs={'class': 'form-control'}),
             'meeting_outcome': forms.TextInput(attrs={'class': 'form-control'}),
@@ -156,8 +194,8 @@ class FollowUpForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Always show companies
-        self.fields['company_name'].queryset = Customer.objects.all().order_by('company_name')
+        # Any company validates; the widget only renders the chosen one (typeahead)
+        self.fields['company_name'].queryset = Customer.objects.all()
 
         # Default: no contacts
         self.fields['contact_person'].queryset = CustomerContact.objects.none()
@@ -174,9 +212,10 @@ class FollowUpForm(forms.ModelForm):
             company_id = self.instance.company_name_id
 
         if company_id:
+            # customer joined in: the view copies its designation onto the row
             self.fields['contact_person'].queryset = CustomerContact.objects.filter(
                 customer_id=company_id
-            ).order_by('contact_name')
+            ).select_related('customer').order_by('contact_name')
             self.fields['contact_person'].empty_label = "Select contact"
 
     def clean(self):
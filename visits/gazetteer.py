@@ -0,0 +1,108 @@
+# visits/gazetteer.py
+"""
+Offline nearest-place lookup over the bundled Tanzania gazetteer.
+
+Places are bucketed into a fixed lat/lon grid. Points are stored sorted by
+cell in flat ``array`` columns, and each cell maps to a (start, stop) slice,
+so the whole index is a handful of arrays plus one small dict. A query scans
+rings of cells outwards from the query cell and stops as soon as no unseen
+ring can hold anything closer than the best match so far.
+"""
+import csv
+import math
+from array import array
+from pathlib import Path
+
+
+DEFAULT_PATH = Path(__file__).resolve().parent / "data" / "tz_gazetteer.csv"
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class GridIndex:
+    def __init__(self, rows, cell_size=0.5):
+        """rows: iterable of (lat, lon, payload)."""
+        self.cell_size = cell_size
+
+        rows = sorted(rows, key=lambda r: self._cell(r[0], r[1]))
+        self.lats = array("d", (r[0] for r in rows))
+        self.lons = array("d", (r[1] for r in rows))
+        self.payloads = [r[2] for r in rows]
+
+        self.cells = {}
+        for i in range(len(rows)):
+            cell = self._cell(self.lats[i], self.lons[i])
+            start, _ = self.cells.get(cell, (i, i))
+            self.cells[cell] = (start, i + 1)
+
+        xs = [c[0] for c in self.cells] or [0]
+        ys = [c[1] for c in self.cells] or [0]
+        self._bounds = (min(xs), max(xs), min(ys), max(ys))
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+
+    def nearest(self, lat, lon, max_km=None):
+        """Return (payload, distance_km) of the closest place, or None."""
+        cx, cy = self._cell(lat, lon)
+        lats, lons = self.lats, self.lons
+        cos_lat = math.cos(math.radians(lat))
+        rad = math.radians
+
+        best_i = -1
+        best_d2 = math.inf  # squared equirectangular distance, in radians
+
+        # Each extra ring of cells is at least this much farther away
+        ring_width = rad(self.cell_size) * min(cos_lat, 1.0)
+
+        x0, x1, y0, y1 = self._bounds
+        last_ring = max(abs(cx - x0), abs(cx - x1), abs(cy - y0), abs(cy - y1))
+
+        for ring in range(last_ring + 1):
+            if best_i >= 0 and ((ring - 1) * ring_width) ** 2 > best_d2:
+                break
+            for cell in self._ring(cx, cy, ring):
+                span = self.cells.get(cell)
+                if span is None:
+                    continue
+                for i in range(span[0], span[1]):
+                    x = rad(lons[i] - lon) * cos_lat
+                    y = rad(lats[i] - lat)
+                    d2 = x * x + y * y
+                    if d2 < best_d2:
+                        best_d2, best_i = d2, i
+
+        if best_i < 0:
+            return None
+        dist = EARTH_RADIUS_KM * math.sqrt(best_d2)
+        if max_km is not None and dist > max_km:
+            return None
+        return self.payloads[best_i], dist
+
+    @staticmethod
+    def _ring(cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+
+def load(path=DEFAULT_PATH, cell_size=0.5):
+    """Build a GridIndex from a name,lat,lon,region,district CSV file."""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as fh:
+        for rec in csv.DictReader(fh):
+            rows.append((
+                float(rec["lat"]),
+                float(rec["lon"]),
+                (rec["name"], rec["region"], rec["district"]),
+            ))
+    return GridIndex(rows, cell_size=cell_size)
@@ -0,0 +1,772 @@
+# visits/geocoding.py
+"""
+Reverse geocoding for visit / follow-up coordinates.
+
+Single coordinates go through ``lookup(lat, lon)``, lists of them through
+``geocode_many()`` (PDF exports, list pages via ``fill_missing_locations``);
+stored rows are filled in by ``process_pending()`` from the geocode worker.
+Backends are listed in ``GEOCODER_BACKENDS``: local ones (the offline gazetteer) answer
+first, then two cache tiers sit in front of the remote ones (Nominatim):
+
+1. an in-process LRU (fast, per worker, lost on restart)
+2. the ``GeocodeCache`` table (shared by every worker, survives restarts)
+
+Coordinates are rounded to ``GEOCODE_PRECISION`` decimal places before they
+are used as a cache key, so visits made a few metres apart share one entry.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import requests
+import requests.adapters
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+USER_AGENT = "my_visits_app_ando_2025"
+
+UNKNOWN = {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
+
+LOCATION_FIELDS = ["place_name", "region", "zone", "nation"]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class GeocodeError(Exception):
+    """Raised when the upstream geocoder could not answer."""
+
+
+class CircuitOpen(GeocodeError):
+    """The backend's circuit breaker is open; the call was not attempted."""
+
+
+class BudgetExhausted(GeocodeError):
+    """The current request's geocoding time budget has run out."""
+
+
+# -------------------------------
+# Cache key
+# -------------------------------
+def make_key(lat, lon):
+    """Round coordinates to GEOCODE_PRECISION places -> "lat,lon" key."""
+    places = _setting("GEOCODE_PRECISION", 3)
+    quantum = Decimal(1).scaleb(-places)
+    lat = Decimal(str(lat)).quantize(quantum, rounding=ROUND_HALF_UP)
+    lon = Decimal(str(lon)).quantize(quantum, rounding=ROUND_HALF_UP)
+    return f"{lat},{lon}"
+
+
+# -------------------------------
+# Counters
+# -------------------------------
+_stats_lock = threading.Lock()
+_stats = {
+    "local_hits": 0, "memory_hits": 0, "db_hits": 0, "misses": 0, "errors": 0, "evictions": 0,
+    # outbound (remote backend) calls
+    "outbound_calls": 0, "outbound_failures": 0, "outbound_seconds": 0.0,
+    "circuit_rejections": 0, "budget_exhausted": 0,
+}
+
+
+def _bump(counter, n=1):
+    with _stats_lock:
+        _stats[counter] += n
+
+
+def cache_stats():
+    """Snapshot of the hit / miss counters for this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    hits = stats["local_hits"] + stats["memory_hits"] + stats["db_hits"]
+    lookups = hits + stats["misses"]
+    stats["lookups"] = lookups
+    stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+    stats["memory_size"] = len(_memory)
+    stats["outbound_seconds"] = round(stats["outbound_seconds"], 3)
+    stats["circuits"] = {
+        type(b).__name__: b.breaker.state for b in (_backends or []) if b.breaker is not None
+    }
+    return stats
+
+
+def _record_outbound(started, failed=False):
+    with _stats_lock:
+        _stats["outbound_calls"] += 1
+        _stats["outbound_seconds"] += time.monotonic() - started
+        if failed:
+            _stats["outbound_failures"] += 1
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# -------------------------------
+# Per-request time budget
+# -------------------------------
+_budget = threading.local()
+
+
+class time_budget:
+    """
+    Cap the total time spent in outbound geocoding calls inside the block.
+
+        with time_budget(3):
+            fill_missing_locations(rows)
+
+    Nested budgets can only shorten the deadline, never extend it.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __enter__(self):
+        self._previous = getattr(_budget, "deadline", None)
+        deadline = time.monotonic() + self.seconds
+        if self._previous is not None:
+            deadline = min(deadline, self._previous)
+        _budget.deadline = deadline
+        return self
+
+    def __exit__(self, *exc):
+        _budget.deadline = self._previous
+        return False
+
+
+def current_deadline():
+    """time.monotonic() deadline of the active budget, or None."""
+    return getattr(_budget, "deadline", None)
+
+
+def _remaining(deadline):
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class GeocodeBudgetMiddleware:
+    """Give every HTTP request GEOCODE_REQUEST_BUDGET seconds of outbound geocoding."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with time_budget(_setting("GEOCODE_REQUEST_BUDGET", 5)):
+            return self.get_response(request)
+
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+class CircuitBreaker:
+    """
+    Trips to 'open' after `threshold` consecutive failures; while open, calls
+    are refused for `cooldown` seconds. After that one trial call is let
+    through ('half-open'): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial slot without judging the backend."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+# -------------------------------
+# Tier 1: in-process LRU
+# -------------------------------
+class MemoryCache:
+    """Small thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = MemoryCache(
+    max_entries=_setting("GEOCODE_MEMORY_MAX_ENTRIES", 5000),
+    ttl=_setting("GEOCODE_MEMORY_TTL", 60 * 60),
+)
+
+
+# -------------------------------
+# Tier 2: database table
+# -------------------------------
+def _db_get(key):
+    from .models import GeocodeCache
+
+    row = GeocodeCache.objects.filter(key=key).first()
+    if row is None:
+        return None
+
+    now = timezone.now()
+    if row.created_at < now - timedelta(seconds=_setting("GEOCODE_CACHE_TTL", 30 * 24 * 60 * 60)):
+        row.delete()
+        return None
+
+    # Only touch last_used_at once in a while so reads don't turn into writes
+    if row.last_used_at < now - timedelta(hours=1):
+        GeocodeCache.objects.filter(pk=row.pk).update(last_used_at=now)
+
+    return row.as_location()
+
+
+_inserts_since_evict = 0
+_evict_lock = threading.Lock()
+
+
+def _db_set(key, loc):
+    global _inserts_since_evict
+    from .models import GeocodeCache
+
+    now = timezone.now()
+    GeocodeCache.objects.update_or_create(
+        key=key,
+        defaults={
+            "place_name": loc["place_name"],
+            "region": loc["region"],
+            "zone": loc["zone"],
+            "nation": loc["nation"],
+            "created_at": now,
+            "last_used_at": now,
+        },
+    )
+
+    # Request threads and worker threads share the counter
+    with _evict_lock:
+        _inserts_since_evict += 1
+        due = _inserts_since_evict >= _setting("GEOCODE_EVICT_EVERY", 100)
+        if due:
+            _inserts_since_evict = 0
+    if due:
+        evict()
+
+
+def evict():
+    """Drop expired rows, then least-recently-used rows above the size cap."""
+    from .models import GeocodeCache
+
+    ttl = _setting("GEOCODE_CACHE_TTL", 30 * 24 * 60 * 60)
+    removed, _ = GeocodeCache.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=ttl)
+    ).delete()
+
+    max_entries = _setting("GEOCODE_CACHE_MAX_ENTRIES", 50000)
+    overflow = GeocodeCache.objects.count() - max_entries
+    if overflow > 0:
+        stale = GeocodeCache.objects.order_by("last_used_at").values_list("pk", flat=True)[:overflow]
+        n, _ = GeocodeCache.objects.filter(pk__in=list(stale)).delete()
+        removed += n
+
+    if removed:
+        _bump("evictions", removed)
+    return removed
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class BaseGeocoder:
+    """
+    A geocoder backend. ``reverse`` returns a location dict, None when the
+    backend has no answer for these coordinates, or raises GeocodeError.
+    Remote backends should give up after `timeout` seconds when it is set.
+    """
+    # Local backends answer in-process; their results are not worth caching.
+    local = False
+
+    def __init__(self):
+        self.breaker = None
+        if not self.local:
+            self.breaker = CircuitBreaker(
+                threshold=_setting("GEOCODE_BREAKER_THRESHOLD", 5),
+                cooldown=_setting("GEOCODE_BREAKER_COOLDOWN", 60),
+            )
+
+    def reverse(self, lat, lon, timeout=None):
+        raise NotImplementedError
+
+
+class GazetteerGeocoder(BaseGeocoder):
+    """Nearest place in the bundled gazetteer (visits/data/tz_gazetteer.csv)."""
+    local = True
+
+    def __init__(self):
+        from . import gazetteer
+
+        super().__init__()
+        self.index = gazetteer.load(_setting("GEOCODE_GAZETTEER_PATH", gazetteer.DEFAULT_PATH))
+        self.max_km = _setting("GEOCODE_GAZETTEER_MAX_KM", 75)
+
+    def reverse(self, lat, lon, timeout=None):
+        hit = self.index.nearest(float(lat), float(lon), max_km=self.max_km)
+        if hit is None:
+            return None
+        (name, region, district), _ = hit
+        return {
+            "place_name": f"{name}, {district}, {region}, Tanzania",
+            "region": region,
+            "zone": district,
+            "nation": "Tanzania",
+        }
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Block until a token is available, then take it. Returns False without
+        waiting if no token will be free within `timeout` seconds.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if timeout is not None:
+                if wait > timeout:
+                    return False
+                timeout -= wait
+            time.sleep(wait)
+
+
+class NominatimGeocoder(BaseGeocoder):
+    """
+    OpenStreetMap Nominatim reverse geocoding over HTTP.
+
+    One keep-alive ``requests.Session`` is shared by every thread using this
+    backend, and all calls go through a token bucket so batch lookups stay
+    within GEOCODE_RATE_LIMIT requests per second.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.url = _setting("GEOCODE_NOMINATIM_URL", NOMINATIM_URL)
+        self.timeout = _setting("GEOCODE_TIMEOUT", 10)
+        self.bucket = TokenBucket(
+            rate=_setting("GEOCODE_RATE_LIMIT", 1),
+            capacity=_setting("GEOCODE_RATE_BURST", 1),
+        )
+
+        pool_size = _setting("GEOCODE_MAX_WORKERS", 4)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def reverse(self, lat, lon, timeout=None):
+        params = {"lat": lat, "lon": lon, "format": "json", "zoom": 10, "addressdetails": 1}
+        started = time.monotonic()
+        if not self.bucket.acquire(timeout=timeout):
+            raise BudgetExhausted("rate limit wait would exceed the time budget")
+        if timeout is not None:
+            timeout -= time.monotonic() - started
+            if timeout <= 0:
+                raise BudgetExhausted("time budget spent waiting for the rate limiter")
+        try:
+            response = self.session.get(
+                self.url, params=params, timeout=min(self.timeout, timeout or self.timeout)
+            )
+        except requests.RequestException as e:
+            raise GeocodeError(str(e)) from e
+
+        if response.status_code != 200:
+            raise GeocodeError(f"Nominatim returned HTTP {response.status_code}")
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise GeocodeError("Nominatim returned invalid JSON") from e
+
+        if "address" not in data:
+            return dict(UNKNOWN)
+
+        addr = data["address"]
+        return {
+            "place_name": data.get("display_name", "Unknown"),
+            "region": addr.get("state", ""),
+            "zone": addr.get("county", ""),
+            "nation": addr.get("country", ""),
+        }
+
+
+DEFAULT_BACKENDS = [
+    "visits.geocoding.GazetteerGeocoder",
+    "visits.geocoding.NominatimGeocoder",
+]
+
+_backends = None
+_backends_lock = threading.Lock()
+
+
+def get_backends():
+    """Instantiate GEOCODER_BACKENDS once per process, in order."""
+    global _backends
+    if _backends is None:
+        with _backends_lock:
+            if _backends is None:
+                _backends = [
+                    import_string(path)() for path in _setting("GEOCODER_BACKENDS", DEFAULT_BACKENDS)
+                ]
+    return _backends
+
+
+def reset_backends():
+    global _backends
+    with _backends_lock:
+        _backends = None
+
+
+def reverse_geocode(lat, lon, deadline=None):
+    """
+    Ask the remote backends in order; the first answer wins.
+
+    Backends whose circuit is open are skipped, and nothing is attempted once
+    `deadline` (a time.monotonic() value, default: the current request's
+    budget) has passed. Raises GeocodeError if no remote backend answered.
+    """
+    if deadline is None:
+        deadline = current_deadline()
+
+    remote = [b for b in get_backends() if not b.local]
+    error = None
+    for backend in remote:
+        remaining = _remaining(deadline)
+        if remaining is not None and remaining <= 0:
+            _bump("budget_exhausted")
+            raise BudgetExhausted("geocoding time budget exhausted")
+
+        if not backend.breaker.allow():
+            _bump("circuit_rejections")
+            error = CircuitOpen(f"{type(backend).__name__} circuit is open")
+            continue
+
+        started = time.monotonic()
+        try:
+            loc = backend.reverse(lat, lon, timeout=remaining)
+        except BudgetExhausted as e:
+            # Never reached the upstream, so it says nothing about its health
+            backend.breaker.release()
+            _bump("budget_exhausted")
+            error = e
+            continue
+        except GeocodeError as e:
+            backend.breaker.record_failure()
+            _record_outbound(started, failed=True)
+            error = e
+            continue
+
+        backend.breaker.record_success()
+        _record_outbound(started)
+        if loc is not None:
+            return loc
+    if error is not None:
+        raise error
+    return dict(UNKNOWN)
+
+
+# -------------------------------
+# Public API
+# -------------------------------
+def lookup(lat, lon):
+    """
+    Reverse geocode through local backends, then the cache tiers, then the
+    remote backends. Raises GeocodeError if the coordinates were never seen
+    before and every remote backend failed (failures are not cached).
+    """
+    for backend in get_backends():
+        if backend.local:
+            loc = backend.reverse(lat, lon)
+            if loc is not None:
+                _bump("local_hits")
+                return loc
+
+    key = make_key(lat, lon)
+
+    loc = _memory.get(key)
+    if loc is not None:
+        _bump("memory_hits")
+        return dict(loc)
+
+    loc = _db_get(key)
+    if loc is not None:
+        _bump("db_hits")
+        _memory.set(key, loc)
+        return dict(loc)
+
+    if not any(not b.local for b in get_backends()):
+        return dict(UNKNOWN)
+
+    _bump("misses")
+    try:
+        loc = reverse_geocode(lat, lon)
+    except GeocodeError:
+        _bump("errors")
+        raise
+
+    _db_set(key, loc)
+    _memory.set(key, loc)
+    return dict(loc)
+
+
+def geocode_many(coords, remote=True):
+    """
+    Reverse geocode a list of (lat, lon) pairs in one go.
+
+    Duplicates (after rounding to the cache key) are looked up once. Local
+    backends and both cache tiers are consulted first; whatever is left is
+    resolved on a bounded thread pool (GEOCODE_MAX_WORKERS), rate limited by
+    the remote backends themselves. With remote=False nothing leaves the
+    process. Returns a list aligned with `coords`; entries are None where the
+    coordinates were missing or could not be resolved.
+    """
+    from .models import GeocodeCache
+
+    results = {}
+    pending = {}  # key -> (lat, lon) still to resolve
+    keys = []
+    local = [b for b in get_backends() if b.local]
+
+    for lat, lon in coords:
+        if not lat or not lon:
+            keys.append(None)
+            continue
+        key = make_key(lat, lon)
+        keys.append(key)
+        if key in results or key in pending:
+            continue
+
+        for backend in local:
+            loc = backend.reverse(lat, lon)
+            if loc is not None:
+                _bump("local_hits")
+                results[key] = loc
+                break
+        else:
+            loc = _memory.get(key)
+            if loc is not None:
+                _bump("memory_hits")
+                results[key] = loc
+            else:
+                pending[key] = (lat, lon)
+
+    # One query for everything the memory tier didn't have
+    if pending:
+        cutoff = timezone.now() - timedelta(seconds=_setting("GEOCODE_CACHE_TTL", 30 * 24 * 60 * 60))
+        for row in GeocodeCache.objects.filter(key__in=list(pending), created_at__gte=cutoff):
+            loc = row.as_location()
+            _bump("db_hits")
+            _memory.set(row.key, loc)
+            results[row.key] = loc
+            del pending[row.key]
+
+    if pending and remote and any(not b.local for b in get_backends()):
+        _bump("misses", len(pending))
+        workers = max(1, min(_setting("GEOCODE_MAX_WORKERS", 4), len(pending)))
+        # The budget is thread-local, so hand the deadline to the workers
+        deadline = current_deadline()
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            pool.submit(reverse_geocode, lat, lon, deadline): key for key, (lat, lon) in pending.items()
+        }
+        try:
+            for future in as_completed(futures, timeout=_remaining(deadline)):
+                key = futures[future]
+                try:
+                    loc = future.result()
+                except GeocodeError:
+                    _bump("errors")
+                    continue
+                results[key] = loc
+        except FuturesTimeout:
+            _bump("budget_exhausted")
+        finally:
+            # Out of budget: drop queued lookups, don't wait for in-flight ones
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        # DB writes stay on the calling thread
+        for key in pending:
+            if key in results:
+                _db_set(key, results[key])
+                _memory.set(key, results[key])
+
+    return [dict(results[k]) if k in results else None for k in keys]
+
+
+def fill_missing_locations(objs, remote=True):
+    """
+    Give rows whose stored location is still empty a display location,
+    resolving them together with geocode_many(). Nothing is saved - the
+    geocode worker remains responsible for the stored columns. Rows that
+    can't be resolved right now (upstream down, circuit open, out of budget)
+    keep place_name=None and render as "Location pending".
+    """
+    missing = [o for o in objs if not o.place_name and o.latitude and o.longitude]
+    if not missing:
+        return objs
+    locs = geocode_many([(o.latitude, o.longitude) for o in missing], remote=remote)
+    for obj, loc in zip(missing, locs):
+        if loc is None:
+            continue
+        for field in LOCATION_FIELDS:
+            setattr(obj, field, loc[field])
+    return objs
+
+
+# -------------------------------
+# Write-time queue (drained by `manage.py geocode_worker`)
+# -------------------------------
+
+def mark_pending(obj):
+    """Queue a visit / follow-up for the geocode worker. Call before save()."""
+    if obj.latitude and obj.longitude:
+        obj.geocode_status = "pending"
+        obj.geocode_attempts = 0
+        obj.geocode_next_attempt_at = None
+    return obj
+
+
+def store_location(obj, loc):
+    """Copy a location dict onto the stored columns of obj (no save)."""
+    for field in LOCATION_FIELDS:
+        setattr(obj, field, loc[field])
+    obj.geocode_status = "done"
+    obj.geocode_next_attempt_at = None
+    return obj
+
+
+def retry_delay(attempts):
+    """Exponential backoff with a little jitter, capped at GEOCODE_RETRY_MAX_DELAY."""
+    base = _setting("GEOCODE_RETRY_BASE_DELAY", 30)
+    cap = _setting("GEOCODE_RETRY_MAX_DELAY", 6 * 60 * 60)
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def process_pending(model, limit=50):
+    """
+    Geocode up to `limit` due rows of `model`. Returns (done, retried, failed).
+
+    Failures are retried with backoff until GEOCODE_MAX_ATTEMPTS, after which
+    the row is marked 'failed' and left alone.
+    """
+    now = timezone.now()
+    rows = list(
+        model.objects.filter(geocode_status="pending")
+        .filter(Q(geocode_next_attempt_at__isnull=True) | Q(geocode_next_attempt_at__lte=now))
+        .order_by("pk")[:limit]
+    )
+
+    max_attempts = _setting("GEOCODE_MAX_ATTEMPTS", 8)
+    done = retried = failed = 0
+    for obj in rows:
+        update_fields = ["geocode_status", "geocode_attempts", "geocode_next_attempt_at", "updated_at"]
+        try:
+            store_location(obj, lookup(obj.latitude, obj.longitude))
+            update_fields += LOCATION_FIELDS
+            done += 1
+        except GeocodeError:
+            obj.geocode_attempts += 1
+            if obj.geocode_attempts >= max_attempts:
+                obj.geocode_status = "failed"
+                obj.geocode_next_attempt_at = None
+                failed += 1
+            else:
+                obj.geocode_next_attempt_at = timezone.now() + timedelta(
+                    seconds=retry_delay(obj.geocode_attempts)
+                )
+                retried += 1
+        obj.save(update_fields=update_fields)
+
+    return done, retried, failed
@@ -0,0 +1,96 @@
+# visits/ingest.py
+"""
+Saving submitted visits and follow-ups.
+
+``new_visit`` and ``new_followup`` go through ``save_submission()``,
+which does the same thing for both models:
+
+- finds the rep's daily sheet for the day (DailyVisitForm / DailyFollowUp)
+  with one SELECT, outside the write transaction; a missing sheet is
+  created together with its submission row,
+- copies the contact's number and the customer's designation from the
+  contact the form already loaded (the form's contact queryset has
+  ``select_related("customer")``, so no refetch),
+- queues the row for the geocode worker and saves it.
+
+All writes (sheet, submission, row, rollup deltas from the signals) run
+in one transaction, so a submission takes the SQLite write lock once and
+commits once. With the sheet already there a submission costs a fixed
+number of queries; see IngestTests.
+
+The batch sync API (visits/sync.py) uses the same pieces for many rows:
+``existing_sheets()`` before its transaction, ``create_sheet()`` and
+``prepare()`` for the rest.
+"""
+from django.db import IntegrityError, transaction
+from django.utils.timezone import localdate
+
+from .geocoding import mark_pending
+from .models import DailyFollowUp, DailyVisitForm, FollowUpSubmission, FormSubmission
+
+
+# model -> (daily sheet model, FK to the sheet on both the row and the submission, submission model)
+SHEETS = {
+    "NewVisit": (DailyVisitForm, "daily_form", FormSubmission),
+    "FollowUp": (DailyFollowUp, "daily_followup", FollowUpSubmission),
+}
+
+
+def _create_sheet(sheet_model, link, submission_model, user, date):
+    """Sheet plus its submission row, or the sheet a concurrent request just made."""
+    try:
+        with transaction.atomic():
+            sheet = sheet_model.objects.create(user=user, date=date)
+            submission_model.objects.create(user=user, **{link: sheet})
+    except IntegrityError:
+        # Same user submitted twice at once; the other request won
+        sheet = sheet_model.objects.get(user=user, date=date)
+    return sheet
+
+
+def existing_sheets(model, user, dates):
+    """
+    {date: sheet} of the rep's DailyVisitForm / DailyFollowUp sheets for rows
+    of `model` on `dates`, one SELECT. Call it before the write transaction.
+    """
+    sheet_model = SHEETS[model.__name__][0]
+    return {sheet.date: sheet for sheet in sheet_model.objects.filter(user=user, date__in=set(dates))}
+
+
+def create_sheet(model, user, date):
+    """New sheet (with its submission row) for rows of `model`; call inside the write transaction."""
+    sheet_model, sheet_field, submission_model = SHEETS[model.__name__]
+    return _create_sheet(sheet_model, sheet_field, submission_model, user, date)
+
+
+def prepare(obj, user):
+    """Fill in what the rep doesn't type: owner, contact details, geocode queue. No queries."""
+    obj.added_by = user
+
+    # ✅ Auto-fill contact number + designation from the selected contact
+    contact = obj.contact_person
+    if contact is not None:
+        obj.contact_number = contact.contact_detail       # phone
+        obj.designation = contact.customer.designation    # designation from Customer
+
+    # 📍 Location is filled in later by `manage.py geocode_worker`
+    mark_pending(obj)
+    return obj
+
+
+def save_submission(obj, user, date=None):
+    """
+    Save an unsaved NewVisit / FollowUp (e.g. ``form.save(commit=False)``)
+    for `user` on `date` (default today). Returns the saved object.
+    """
+    sheet_model, sheet_field, submission_model = SHEETS[type(obj).__name__]
+    date = date or localdate()
+    prepare(obj, user)
+
+    sheet = sheet_model.objects.filter(user=user, date=date).first()
+    with transaction.atomic():
+        if sheet is None:
+            sheet = _create_sheet(sheet_model, sheet_field, submission_model, user, date)
+        setattr(obj, sheet_field, sheet)
+        obj.save()
+    return obj
@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from visits.geocoding import GazetteerGeocoder, NominatimGeocoder, GeocodeError
+
+
+# Rough bounding box of mainland Tanzania + Zanzibar
+LAT_RANGE = (-11.7, -1.0)
+LON_RANGE = (29.4, 40.4)
+
+
+class Command(BaseCommand):
+    help = "Compare the offline gazetteer geocoder with Nominatim on random Tanzanian coordinates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=2025)
+        parser.add_argument(
+            "--nominatim-sample",
+            type=int,
+            default=0,
+            help="Also time this many live Nominatim calls and extrapolate to --count (network!).",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        count = options["count"]
+        coords = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(count)]
+
+        t0 = time.perf_counter()
+        gazetteer = GazetteerGeocoder()
+        load_s = time.perf_counter() - t0
+
+        answered = 0
+        t0 = time.perf_counter()
+        for lat, lon in coords:
+            if gazetteer.reverse(lat, lon) is not None:
+                answered += 1
+        gaz_s = time.perf_counter() - t0
+
+        self.stdout.write(f"gazetteer: {len(gazetteer.index)} places, loaded in {load_s * 1000:.1f} ms")
+        self.stdout.write(
+            f"gazetteer: {count} lookups in {gaz_s:.3f} s "
+            f"({gaz_s / count * 1e6:.1f} us/lookup, {answered} within range)"
+        )
+
+        sample = min(options["nominatim_sample"], count)
+        if not sample:
+            self.stdout.write("nominatim: skipped (pass --nominatim-sample N to time live calls)")
+            return
+
+        nominatim = NominatimGeocoder()
+        errors = 0
+        t0 = time.perf_counter()
+        for lat, lon in coords[:sample]:
+            try:
+                nominatim.reverse(lat, lon)
+            except GeocodeError:
+                errors += 1
+        nom_s = time.perf_counter() - t0
+        per_call = nom_s / sample
+
+        self.stdout.write(
+            f"nominatim: {sample} lookups in {nom_s:.3f} s "
+            f"({per_call * 1e3:.1f} ms/lookup, {errors} errors)"
+        )
+        self.stdout.write(
+            f"nominatim: ~{per_call * count / 3600:.1f} h extrapolated for {count} lookups "
+            f"(gazetteer is ~{per_call / (gaz_s / count):,.0f}x faster)"
+        )
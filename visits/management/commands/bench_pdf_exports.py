@@ -0,0 +1,89 @@
+import multiprocessing
+import random
+import resource
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from customer.models import Customer, CustomerContact
+from visits import exports
+from visits.models import NewVisit
+
+
+PLACES = ["Kariakoo", "Mikocheni", "Arusha", "Moshi", "Mwanza", "Dodoma", "Mbeya", "Tabora"]
+
+
+def fake_visits(count, seed):
+    """Unsaved NewVisit rows with related objects attached - no DB needed."""
+    rng = random.Random(seed)
+    lines = [c[0] for c in NewVisit.PRODUCTION_LINE_CHOICES]
+    visits = []
+    for i in range(count):
+        customer = Customer(company_name=f"Company {i % 900}", designation="Owner")
+        contact = CustomerContact(customer=customer, contact_name=f"Contact {i % 700}", contact_detail="0712345678")
+        quoted = rng.random() < 0.4
+        visits.append(NewVisit(
+            company_name=customer, contact_person=contact, productionline=rng.choice(lines),
+            contact_number="0712345678", designation="Owner",
+            latitude=Decimal("-6.8161"), longitude=Decimal("39.2804"),
+            place_name=rng.choice(PLACES), region="Dar es Salaam", nation="Tanzania",
+            is_order_quoted=quoted, order_amount=Decimal(rng.randint(100, 90000)) if quoted else None,
+            reason_no_order=None if quoted else "Client still comparing prices with other suppliers",
+            meeting_purpose="Intro", meeting_outcome="Good", item_discussed="Sheets",
+        ))
+    return visits
+
+
+def _run(renderer, count, seed, queue):
+    # Runs in a child process so each measurement gets its own peak RSS
+    visits = fake_visits(count, seed)
+    context = {
+        "visits": visits,
+        "created_date": None,
+        "total_order_amount": sum((v.order_amount or 0 for v in visits), Decimal(0)),
+        "total_quoted_count": sum(v.is_order_quoted for v in visits),
+    }
+    started = time.perf_counter()
+    if renderer == "reportlab":
+        data = exports.pdf_tables.render(*exports.visits_table(context))
+    else:
+        data = exports.render_pdf("manager/visits_pdf.html", context)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, len(data), peak))
+
+
+class Command(BaseCommand):
+    help = "Time the ReportLab and xhtml2pdf renderers on the visits report at several sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+        parser.add_argument("--renderers", nargs="+", choices=["reportlab", "pisa"], default=["reportlab", "pisa"])
+        parser.add_argument(
+            "--pisa-max-rows", type=int, default=1000,
+            help="Skip xhtml2pdf above this many rows; at 10k rows it runs for well over ten minutes.",
+        )
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context("fork")
+        self.stdout.write(f"{'renderer':<10} {'rows':>7} {'seconds':>9} {'rows/s':>8} {'PDF MB':>8} {'peak RSS MB':>12}")
+
+        for count in options["rows"]:
+            for renderer in options["renderers"]:
+                if renderer == "pisa" and count > options["pisa_max_rows"]:
+                    self.stdout.write(f"{renderer:<10} {count:>7} {'skipped':>9}")
+                    continue
+
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_run, args=(renderer, count, options["seed"], queue))
+                proc.start()
+                elapsed, size, peak = queue.get()
+                proc.join()
+
+                # ru_maxrss is in KiB on Linux
+                self.stdout.write(
+                    f"{renderer:<10} {count:>7} {elapsed:>9.2f} {count / elapsed:>8.0f} "
+                    f"{size / 1e6:>8.2f} {peak / 1024:>12.0f}"
+                )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from visits import directory_sync
+
+
+class Command(BaseCommand):
+    help = "Drop directory change-log entries superseded by a newer change to the same customer / contact."
+
+    def handle(self, *args, **options):
+        deleted = directory_sync.compact()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} superseded change-log entries."))
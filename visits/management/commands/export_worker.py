@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from visits import export_jobs
+
+
+class Command(BaseCommand):
+    help = "Render PDF export jobs queued from the export pages, and delete expired files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue, then exit.")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            purged = export_jobs.purge_expired()
+            if purged:
+                self.stdout.write(f"Deleted {purged} expired export(s)")
+
+            job = export_jobs.claim()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+
+            started = time.monotonic()
+            export_jobs.run(job)
+            self.stdout.write(
+                f"{job.kind} #{job.pk} for {job.user}: {job.status} in {time.monotonic() - started:.1f}s"
+                + (f" - {job.error}" if job.error else "")
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from customer import duplicates as customer_duplicates
+from customer.models import Customer
+
+
+class Command(BaseCommand):
+    help = "List groups of customers whose company names are probably the same company."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--similarity", type=float, default=None,
+            help="Trigram similarity (0-1) at which two names count as the same "
+                 "(default: CUSTOMER_DUPLICATE_SIMILARITY).",
+        )
+        parser.add_argument(
+            "--exact-only", action="store_true",
+            help="Only group customers whose normalised names are identical.",
+        )
+
+    def handle(self, *args, **options):
+        rows = Customer.objects.values_list("pk", "name_key", "company_name").iterator(chunk_size=5000)
+        names, keys = {}, []
+        for pk, key, name in rows:
+            names[pk] = name
+            keys.append((pk, key))
+
+        similarity = 1.01 if options["exact_only"] else options["similarity"]  # > 1: identical keys only
+        groups = customer_duplicates.find_duplicates(keys, similarity)
+        for group in groups:
+            self.stdout.write(" | ".join(f"#{pk} {names[pk]}" for pk in group))
+        self.stdout.write(self.style.SUCCESS(f"{len(groups)} groups of likely duplicates in {len(names)} customers."))
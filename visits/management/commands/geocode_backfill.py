@@ -0,0 +1,110 @@
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from visits.geocoding import LOCATION_FIELDS, geocode_many, store_location
+from visits.models import NewVisit, FollowUp
+
+
+MODELS = {"visits": NewVisit, "followups": FollowUp}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in stored locations for existing visits and follow-ups. "
+        "Progress is checkpointed, so the command can be stopped and resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", choices=sorted(MODELS), help="Backfill just one table.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per lookup + write batch.")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Rows fetched per DB round trip.")
+        parser.add_argument(
+            "--pause", type=float, default=0.2,
+            help="Seconds to sleep between batches, leaving SQLite free for live writes.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=getattr(
+                settings, "GEOCODE_BACKFILL_CHECKPOINT", Path(settings.BASE_DIR) / "geocode_backfill.json"
+            ),
+        )
+        parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        path = Path(options["checkpoint"])
+        checkpoint = {}
+        if path.exists() and not options["reset"]:
+            checkpoint = json.loads(path.read_text())
+            self.stdout.write(f"Resuming from {path}: {checkpoint}")
+
+        names = [options["only"]] if options["only"] else list(MODELS)
+        for name in names:
+            self.backfill(name, MODELS[name], checkpoint, path, options)
+
+    def backfill(self, name, model, checkpoint, path, options):
+        last_pk = checkpoint.get(name, 0)
+        batch_size = options["batch_size"]
+        started = time.monotonic()
+        seen = geocoded = queued = 0
+
+        base = (
+            model.objects.filter(place_name__isnull=True, latitude__isnull=False, longitude__isnull=False)
+            .only("pk", "latitude", "longitude", "geocode_status")
+            .order_by("pk")
+        )
+
+        while True:
+            # Keyset windows: each read finishes before we write, so no SQLite
+            # read cursor is held open across our (or anyone else's) writes.
+            rows = list(base.filter(pk__gt=last_pk)[:batch_size].iterator(chunk_size=options["chunk_size"]))
+            if not rows:
+                break
+
+            # geocode_many() collapses repeated coordinates to one lookup
+            locs = geocode_many([(r.latitude, r.longitude) for r in rows])
+
+            now = timezone.now()
+            done, retry = [], []
+            for row, loc in zip(rows, locs):
+                row.updated_at = now
+                if loc is None:
+                    # Leave it to `geocode_worker`, which retries with backoff
+                    row.geocode_status = "pending"
+                    retry.append(row)
+                else:
+                    store_location(row, loc)
+                    done.append(row)
+
+            with transaction.atomic():
+                model.objects.bulk_update(
+                    done, LOCATION_FIELDS + ["geocode_status", "geocode_next_attempt_at", "updated_at"],
+                    batch_size=options["chunk_size"],
+                )
+                model.objects.bulk_update(retry, ["geocode_status", "updated_at"], batch_size=options["chunk_size"])
+
+            last_pk = rows[-1].pk
+            checkpoint[name] = last_pk
+            path.write_text(json.dumps(checkpoint))
+
+            seen += len(rows)
+            geocoded += len(done)
+            queued += len(retry)
+            rate = seen / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(
+                f"{name}: {seen} rows ({geocoded} geocoded, {queued} queued for retry), "
+                f"up to pk {last_pk}, {rate:.0f} rows/s"
+            )
+
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{name}: done - {seen} rows in {elapsed:.1f}s ({seen / max(elapsed, 1e-9):.0f} rows/s)"
+        ))
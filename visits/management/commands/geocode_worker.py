@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from visits.geocoding import process_pending
+from visits.models import NewVisit, FollowUp
+
+
+class Command(BaseCommand):
+    help = "Reverse geocode visits and follow-ups queued by new_visit / new_followup."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain what is due now, then exit.")
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--sleep", type=float, default=5.0, help="Seconds to wait when the queue is empty.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        while True:
+            worked = 0
+            for model in (NewVisit, FollowUp):
+                done, retried, failed = process_pending(model, limit=batch_size)
+                worked += done + retried + failed
+                if done or retried or failed:
+                    self.stdout.write(
+                        f"{model.__name__}: {done} geocoded, {retried} to retry, {failed} failed"
+                    )
+
+            if options["once"] and not worked:
+                return
+            if not worked:
+                time.sleep(options["sleep"])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from customer import search as customer_search
+from customer.models import Customer
+
+
+class Command(BaseCommand):
+    help = "Re-create the full-text customer search index from Customer / CustomerContact."
+
+    def handle(self, *args, **options):
+        if not customer_search.available():
+            raise CommandError("The customer_search FTS5 table doesn't exist; run `manage.py migrate` on SQLite.")
+        customer_search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Customer.objects.count()} customers."))
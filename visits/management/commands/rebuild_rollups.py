@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from visits import rollups
+from visits.models import NewVisit, FollowUp, DailySalesRollup, PeriodSalesRollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily and weekly/monthly sales rollups from NewVisit / FollowUp and verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify-only", action="store_true",
+            help="Only compare the stored rollups with the raw data; change nothing.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify_only"]:
+            count = rollups.rebuild(NewVisit, FollowUp, DailySalesRollup, PeriodSalesRollup)
+            self.stdout.write(f"Rebuilt {count} daily rollup rows.")
+
+        expected = rollups.compute(NewVisit, FollowUp)
+        problems = rollups.diff(expected, rollups.stored(DailySalesRollup))
+        problems += rollups.diff(rollups.compute_periods(expected), rollups.stored_periods(PeriodSalesRollup))
+        for key, expected, actual in problems[:20]:
+            self.stderr.write(f"{key}: expected {expected}, stored {actual}")
+        if problems:
+            raise CommandError(f"{len(problems)} rollup rows disagree with the raw data.")
+        self.stdout.write(self.style.SUCCESS("Rollups match the raw data."))
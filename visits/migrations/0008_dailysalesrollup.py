@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+# Frozen copy of rollups.compute() / rebuild() as of this migration, so later
+# changes to visits/rollups.py don't alter what this migration writes.
+MEASURES = ["visit_count", "quoted_count", "order_amount", "payment_count", "payment_amount"]
+
+
+def build_rollups(apps, schema_editor):
+    DailySalesRollup = apps.get_model("visits", "DailySalesRollup")
+
+    rows = {}
+    for model_name, kind in (("NewVisit", "visit"), ("FollowUp", "followup")):
+        aggregates = {
+            "visit_count": Count("id"),
+            "quoted_count": Count("id", filter=Q(is_order_quoted=True)),
+            "order_amount": Sum("order_amount", filter=Q(is_order_quoted=True)),
+        }
+        if kind == "followup":
+            aggregates["payment_count"] = Count("id", filter=Q(is_payment_collected=True))
+            aggregates["payment_amount"] = Sum("payment_amount", filter=Q(is_payment_collected=True))
+
+        grouped = (
+            apps.get_model("visits", model_name).objects.filter(added_by__isnull=False)
+            .annotate(day=TruncDate("created_at"))
+            .values("added_by_id", "day", "productionline")
+            .annotate(**aggregates)
+            .order_by()
+        )
+        for g in grouped:
+            key = (g["added_by_id"], g["day"], g["productionline"] or "", kind)
+            row = rows.setdefault(key, {f: 0 for f in MEASURES})
+            for f in MEASURES:
+                row[f] += g.get(f) or 0
+
+    DailySalesRollup.objects.all().delete()
+    DailySalesRollup.objects.bulk_create(
+        [
+            DailySalesRollup(user_id=u, date=d, productionline=p, kind=k, **measures)
+            for (u, d, p, k), measures in rows.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visits', '0007_stored_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('productionline', models.CharField(blank=True, default='', max_length=30)),
+                ('kind', models.CharField(choices=[('visit', 'New Visit'), ('followup', 'Follow Up')], max_length=10)),
+                ('visit_count', models.IntegerField(default=0)),
+                ('quoted_count', models.IntegerField(default=0)),
+                ('order_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('payment_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind', 'date'], name='visits_dail_user_id_f7fe3f_idx')],
+                'unique_together': {('user', 'date', 'productionline', 'kind')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
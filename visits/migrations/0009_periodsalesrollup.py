@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:50
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of rollups.compute_periods() as of this migration: the daily
+# rows written by 0008 folded into week / month rows.
+MEASURES = ["visit_count", "quoted_count", "order_amount", "payment_count", "payment_amount"]
+
+
+def period_start(day, period):
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def build_rollups(apps, schema_editor):
+    DailySalesRollup = apps.get_model("visits", "DailySalesRollup")
+    PeriodSalesRollup = apps.get_model("visits", "PeriodSalesRollup")
+
+    rows = {}
+    for daily in DailySalesRollup.objects.values("user_id", "date", "productionline", "kind", *MEASURES):
+        for period in ("week", "month"):
+            key = (daily["user_id"], period, period_start(daily["date"], period), daily["productionline"], daily["kind"])
+            row = rows.setdefault(key, {f: 0 for f in MEASURES})
+            for f in MEASURES:
+                row[f] += daily[f]
+
+    PeriodSalesRollup.objects.all().delete()
+    PeriodSalesRollup.objects.bulk_create(
+        [
+            PeriodSalesRollup(user_id=u, period=per, start=st, productionline=p, kind=k, **measures)
+            for (u, per, st, p, k), measures in rows.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visits', '0008_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('productionline', models.CharField(blank=True, default='', max_length=30)),
+                ('kind', models.CharField(choices=[('visit', 'New Visit'), ('followup', 'Follow Up')], max_length=10)),
+                ('visit_count', models.IntegerField(default=0)),
+                ('quoted_count', models.IntegerField(default=0)),
+                ('order_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('payment_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'start'], name='visits_peri_period_81d5b8_idx')],
+                'unique_together': {('user', 'period', 'start', 'productionline', 'kind')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
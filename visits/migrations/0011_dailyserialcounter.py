@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visits', '0010_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySerialCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('visit', 'Daily Visit Form'), ('followup', 'Daily Follow Up')], max_length=10)),
+                ('date', models.DateField()),
+                ('last', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'date')},
+            },
+        ),
+    ]
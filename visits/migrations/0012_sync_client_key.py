@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0002_alter_customer_company_name_and_more'),
+        ('visits', '0011_dailyserialcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followup',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='newvisit',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='followup',
+            constraint=models.UniqueConstraint(fields=('added_by', 'client_key'), name='followup_unique_client_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='newvisit',
+            constraint=models.UniqueConstraint(fields=('added_by', 'client_key'), name='newvisit_unique_client_key'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:36
+
+from django.db import migrations, models
+
+
+def log_existing_directory(apps, schema_editor):
+    # Existing customers / contacts start the feed, so a first sync gets them all
+    DirectoryChange = apps.get_model("visits", "DirectoryChange")
+    for kind, model in (("customer", "Customer"), ("contact", "CustomerContact")):
+        ids = apps.get_model("customer", model).objects.order_by("pk").values_list("pk", flat=True)
+        DirectoryChange.objects.bulk_create(
+            (DirectoryChange(kind=kind, object_id=pk) for pk in ids.iterator(chunk_size=5000)),
+            batch_size=5000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0002_alter_customer_company_name_and_more'),
+        ('visits', '0012_sync_client_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('customer', 'Customer'), ('contact', 'Customer Contact')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='visits_dire_kind_2e4207_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_directory, migrations.RunPython.noop),
+    ]
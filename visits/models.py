@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.conf import settings
@@ -103,6 +103,48 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return self.first_name
 
 
+# -------------------
+# Daily Serial Counter (next serial_number per day, see visits/serials.py)
+# -------------------
+class DailySerialCounter(models.Model):
+    SCOPE_CHOICES = [
+        ('visit', 'Daily Visit Form'),
+        ('followup', 'Daily Follow Up'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    date = models.DateField()
+    last = models.PositiveIntegerField(default=0)  # last number handed out that day
+
+    class Meta:
+        unique_together = ('scope', 'date')
+
+    def __str__(self):
+        return f"{self.scope} {self.date}: {self.last}"
+
+
+# -------------------
+# Directory Change Log (customer / contact sync feed, see visits/directory_sync.py)
+# -------------------
+class DirectoryChange(models.Model):
+    KIND_CHOICES = [
+        ('customer', 'Customer'),
+        ('contact', 'Customer Contact'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)  # sync token; AUTOINCREMENT, never reused
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'object_id'])]
+
+    def __str__(self):
+        return f"#{self.seq} {self.kind} {self.object_id}{' deleted' if self.deleted else ''}"
+
+
 # -------------------
 # Daily Visit Form (UNIQUE - keep only this one)
 # -------------------
@@ -129,20 +171,54 @@ class DailyVisitForm(models.Model):
         unique_together = ('user', 'date')   # 👈 only one per user per day
 
     def save(self, *args, **kwargs):
+        from .serials import next_serial
+
         if not self.pk:
-            today = self.date
-            count_today = DailyVisitForm.objects.filter(date=today).count() + 1
-            self.serial_number = int(today.strftime("%Y%m%d")) * 1000 + count_today
+            with transaction.atomic():  # counter row stays locked until the form is in
+                self.serial_number = next_serial("visit", self.date, DailyVisitForm)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Daily Form {self.serial_number} - {self.user.email} - {self.date}"
 
 
+# -------------------
+# Stored location (shared by NewVisit and FollowUp)
+# -------------------
+class StoredLocation(models.Model):
+    """
+    Reverse-geocoded place for a visit's latitude/longitude.
+
+    Filled in after save by ``manage.py geocode_worker`` so read views never
+    call Nominatim. ``geocode_status`` doubles as the worker's queue.
+    """
+    GEOCODE_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    place_name = models.TextField(null=True, blank=True)
+    region = models.CharField(max_length=255, null=True, blank=True)
+    zone = models.CharField(max_length=255, null=True, blank=True)
+    nation = models.CharField(max_length=255, null=True, blank=True)
+
+    geocode_status = models.CharField(
+        max_length=10, choices=GEOCODE_STATUS_CHOICES, null=True, blank=True, db_index=True
+    )
+    geocode_attempts = models.PositiveSmallIntegerField(default=0)
+    geocode_next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
 # -------------------
 # New Visit
 # -------------------
-class NewVisit(models.Model):
+class NewVisit(StoredLocation):
     
     PRODUCTION_LINE_CHOICES = [
         ("RESIN_ROOFING_SHEETS", "RESIN ROOFING SHEETS"),
@@ -188,6 +264,14 @@ class NewVisit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Idempotency key from the offline sync API (visits/sync.py); null for form posts
+    client_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['added_by', 'client_key'], name='newvisit_unique_client_key'),
+        ]
+
     def __str__(self):
             company = self.company_name.company_name if self.company_name else "No Company"
             contact = self.contact_person.contact_name if self.contact_person else "No Contact"
@@ -247,10 +331,13 @@ class DailyFollowUp(models.Model):
         unique_together = ('user', 'date')
 
     def save(self, *args, **kwargs):
+        from .serials import next_serial
+
         if not self.pk:
-            today = self.date
-            count_today = DailyFollowUp.objects.filter(date=today).count() + 1
-            self.serial_number = int(today.strftime("%Y%m%d")) * 1000 + count_today
+            with transaction.atomic():
+                self.serial_number = next_serial("followup", self.date, DailyFollowUp)
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -260,7 +347,7 @@ class DailyFollowUp(models.Model):
 # -------------------
 # Follow Up (same as NewVisit + payment fields)
 # -------------------
-class FollowUp(models.Model):
+class FollowUp(StoredLocation):
     PRODUCTION_LINE_CHOICES = [
         ('RESIN_ROOFING_SHEETS', 'RESIN ROOFING SHEETS'),
         ('ROOF_PAINT', 'ROOF PAINT'),
@@ -328,6 +415,14 @@ class FollowUp(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Idempotency key from the offline sync API (visits/sync.py); null for form posts
+    client_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['added_by', 'client_key'], name='followup_unique_client_key'),
+        ]
+
     def __str__(self):
         return f"FollowUp - {self.company_name} - {self.designation}"
 
@@ -361,3 +456,140 @@ class FollowUpSubmission(models.Model):
 
 
 
+
+
+# -------------------
+# Reverse Geocode Cache (shared by every worker)
+# -------------------
+class GeocodeCache(models.Model):
+    # Rounded "lat,lon" - see visits.geocoding.make_key
+    key = models.CharField(max_length=40, unique=True)
+
+    place_name = models.TextField()
+    region = models.CharField(max_length=255, blank=True)
+    zone = models.CharField(max_length=255, blank=True)
+    nation = models.CharField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)                  # TTL
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)  # LRU
+
+    def as_location(self):
+        return {
+            "place_name": self.place_name,
+            "region": self.region,
+            "zone": self.zone,
+            "nation": self.nation,
+        }
+
+    def __str__(self):
+        return f"{self.key} -> {self.place_name}"
+
+
+# -------------------
+# Daily Sales Rollup (kept in step by visits/signals.py)
+# -------------------
+class DailySalesRollup(models.Model):
+    KIND_CHOICES = [
+        ('visit', 'New Visit'),
+        ('followup', 'Follow Up'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="sales_rollups"
+    )
+    date = models.DateField()
+    productionline = models.CharField(max_length=30, blank=True, default="")  # "" = not set
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+
+    visit_count = models.IntegerField(default=0)
+    quoted_count = models.IntegerField(default=0)
+    order_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    payment_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('user', 'date', 'productionline', 'kind')
+        indexes = [models.Index(fields=['user', 'kind', 'date'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.user_id} {self.date} {self.productionline or '-'}"
+
+
+# -------------------
+# Weekly / Monthly Sales Rollup (team dashboard cube)
+# -------------------
+class PeriodSalesRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="period_rollups"
+    )
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    start = models.DateField()  # Monday of the week / 1st of the month
+    productionline = models.CharField(max_length=30, blank=True, default="")
+    kind = models.CharField(max_length=10, choices=DailySalesRollup.KIND_CHOICES)
+
+    visit_count = models.IntegerField(default=0)
+    quoted_count = models.IntegerField(default=0)
+    order_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    payment_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('user', 'period', 'start', 'productionline', 'kind')
+        indexes = [models.Index(fields=['period', 'start'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.user_id} {self.period} {self.start} {self.productionline or '-'}"
+
+
+# -------------------
+# Export Job (rendered by `manage.py export_worker`)
+# -------------------
+class ExportJob(models.Model):
+    KIND_CHOICES = [
+        ('visits', 'Visits PDF'),
+        ('followups', 'Follow-Ups PDF'),
+        ('customer_detail', 'Customer Detail PDF'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    error = models.TextField(blank=True)
+
+    file_path = models.CharField(max_length=500, blank=True)
+    filename = models.CharField(max_length=255, blank=True)  # download name
+    size = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,124 @@
+# visits/pdf_cache.py
+"""
+Content-addressed disk cache for generated PDFs.
+
+A file is stored as ``<key>.pdf`` under PDF_CACHE_DIR, where the key is a
+fingerprint of everything that goes into the report (see
+``visits.exports.fingerprint``). A changed input means a new key, so
+entries never need invalidating; they just age out. When the directory
+grows past PDF_CACHE_MAX_BYTES the least recently used files are deleted.
+Hits bump the file's mtime, which is what "recently used" means here.
+"""
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _root():
+    root = Path(_setting("PDF_CACHE_DIR", Path(settings.BASE_DIR) / "pdf_cache"))
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def _path(key):
+    return _root() / f"{key}.pdf"
+
+
+# -------------------------------
+# Counters
+# -------------------------------
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _bump(counter, n=1):
+    with _stats_lock:
+        _stats[counter] += n
+
+
+def cache_stats():
+    """Snapshot of the hit / miss counters for this process, plus disk usage."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    files = list(_root().glob("*.pdf"))
+    stats["files"] = len(files)
+    stats["bytes"] = sum(f.stat().st_size for f in files if f.exists())
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# -------------------------------
+# Get / put / evict
+# -------------------------------
+def open_cached(key):
+    """
+    Open the cached PDF for `key` for reading, or return None.
+    Returning an open file (not a path) means a concurrent eviction can't
+    pull the file out from under the response.
+    """
+    path = _path(key)
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        _bump("misses")
+        return None
+    try:
+        os.utime(path)  # LRU: mark as just used
+    except FileNotFoundError:
+        pass
+    _bump("hits")
+    return fh
+
+
+def store(key, data):
+    """Write `data` under `key`, then trim the cache to its size limit."""
+    path = _path(key)
+    tmp = path.with_name(f".{key}.{uuid.uuid4().hex}.part")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)  # readers see the whole file or none of it
+    _bump("stores")
+    evict(keep=path)
+    return path
+
+
+def evict(keep=None, max_bytes=None):
+    """Delete least recently used files until the cache fits. Returns the count."""
+    if max_bytes is None:
+        max_bytes = _setting("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+
+    entries = []
+    for path in _root().glob("*.pdf"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+
+    if removed:
+        _bump("evictions", removed)
+    return removed
@@ -0,0 +1,105 @@
+# visits/pdf_tables.py
+"""
+Tabular PDF reports drawn directly with ReportLab platypus.
+
+xhtml2pdf parses the whole HTML report and lays it out as one giant table,
+so its time and memory grow much faster than the row count. Here rows are
+cut into page-sized ``Table`` chunks, each with its own header row, so the
+layout engine only ever measures and splits a page's worth of cells.
+
+Only columns marked ``wrap`` get Paragraphs; everything else is drawn as
+plain strings, which is several times cheaper.
+
+    pdf = render("All Visits Report", ["Total: 3"], VISIT_COLUMNS, rows)
+"""
+import io
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+
+ROWS_PER_TABLE = 30  # a little under one landscape A4 page of single-line rows
+
+PAGE = landscape(A4)
+MARGIN = 8 * mm
+
+TITLE_STYLE = ParagraphStyle("title", fontName="Helvetica-Bold", fontSize=11, leading=14, spaceAfter=4)
+META_STYLE = ParagraphStyle("meta", fontName="Helvetica", fontSize=8.5, leading=11)
+CELL_STYLE = ParagraphStyle("cell", fontName="Helvetica", fontSize=8, leading=9.5)
+
+TABLE_STYLE = TableStyle([
+    ("FONT", (0, 0), (-1, -1), "Helvetica", 8),
+    ("FONT", (0, 0), (-1, 0), "Helvetica-Bold", 8.5),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f1f3f5")),
+    ("GRID", (0, 0), (-1, -1), 0.6, colors.HexColor("#444444")),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ("LEFTPADDING", (0, 0), (-1, -1), 3),
+    ("RIGHTPADDING", (0, 0), (-1, -1), 3),
+    ("TOPPADDING", (0, 0), (-1, -1), 2),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+])
+
+
+class Column:
+    def __init__(self, header, width, wrap=False):
+        self.header = header
+        self.width = width  # fraction of the printable width
+        self.wrap = wrap    # long text: wrap in a Paragraph
+
+
+def _cell(value, column):
+    text = "" if value is None else str(value)
+    if column.wrap and text:
+        # Paragraph markup: escape, keep explicit line breaks
+        return Paragraph(escape(text).replace("\n", "<br/>"), CELL_STYLE)
+    return text
+
+
+def _page_number(canvas, doc):
+    canvas.saveState()
+    canvas.setFont("Helvetica", 7)
+    canvas.drawRightString(PAGE[0] - MARGIN, MARGIN / 2, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def _chunks(rows, columns, size):
+    chunk = []
+    for row in rows:
+        chunk.append([_cell(value, col) for value, col in zip(row, columns)])
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render(title, summary, columns, rows, rows_per_table=ROWS_PER_TABLE):
+    """
+    Build the report and return the PDF bytes.
+    `summary` is a list of lines under the title; `rows` any iterable of
+    value lists in column order.
+    """
+    usable = PAGE[0] - 2 * MARGIN
+    widths = [usable * col.width for col in columns]
+    header = [col.header for col in columns]
+
+    story = [Paragraph(escape(title), TITLE_STYLE)]
+    story += [Paragraph(escape(line), META_STYLE) for line in summary]
+    story.append(Spacer(1, 4 * mm))
+
+    for chunk in _chunks(rows, columns, rows_per_table):
+        table = Table([header] + chunk, colWidths=widths, repeatRows=1)
+        table.setStyle(TABLE_STYLE)
+        story.append(table)
+
+    out = io.BytesIO()
+    doc = SimpleDocTemplate(
+        out, pagesize=PAGE, title=title,
+        leftMargin=MARGIN, rightMargin=MARGIN, topMargin=MARGIN, bottomMargin=MARGIN,
+    )
+    doc.build(story, onFirstPage=_page_number, onLaterPages=_page_number)
+    return out.getvalue()
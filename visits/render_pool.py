@@ -0,0 +1,190 @@
+# visits/render_pool.py
+"""
+Bounded process pool for CPU-bound PDF rendering.
+
+xhtml2pdf and ReportLab are pure Python and hold the GIL for the whole
+render, so a report drawn inside a threaded web worker stalls every other
+request that worker is serving. ``call()`` runs the render in a separate
+process instead; the request thread just waits on the result.
+
+The pool is created lazily, once per web process, with the "spawn" start
+method so children never inherit the parent's database connections or
+threads. Workers only render: everything the template needs is loaded
+before the call and pickled across, so children never touch the DB.
+
+Limits (settings):
+    PDF_RENDER_WORKERS      processes in the pool; 0 renders inline
+    PDF_RENDER_QUEUE_LIMIT  renders allowed to wait for a free worker
+    PDF_RENDER_TIMEOUT      seconds a request waits before giving up
+    PDF_RENDER_MAX_TASKS    renders before a worker is replaced (caps leaks)
+
+Past WORKERS + QUEUE_LIMIT in flight, ``submit()`` / ``call()`` raise
+``RenderBusy`` rather than queueing without bound.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RenderBusy(Exception):
+    """Every worker is busy and the wait queue is full."""
+
+
+class RenderTimeout(Exception):
+    """The render took longer than PDF_RENDER_TIMEOUT."""
+
+
+def _init_worker():
+    # Spawned children start from a bare interpreter
+    import django
+
+    django.setup()
+
+
+# -------------------------------
+# Pool lifecycle
+# -------------------------------
+_lock = threading.Lock()
+_pool = None
+_slots = None  # semaphore: running + queued renders
+
+
+def _get_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            workers = _setting("PDF_RENDER_WORKERS", 2)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                max_tasks_per_child=_setting("PDF_RENDER_MAX_TASKS", 50) or None,
+            )
+            _slots = threading.BoundedSemaphore(workers + _setting("PDF_RENDER_QUEUE_LIMIT", 4))
+        return _pool, _slots
+
+
+def shutdown(wait=True):
+    """Stop the pool; the next call() starts a fresh one (settings re-read)."""
+    global _pool, _slots
+    with _lock:
+        pool, _pool, _slots = _pool, None, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown, wait=False)
+
+
+# -------------------------------
+# Counters
+# -------------------------------
+_stats_lock = threading.Lock()
+_stats = {"submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "failures": 0, "inline": 0}
+
+
+def _bump(counter, n=1):
+    with _stats_lock:
+        _stats[counter] += n
+
+
+def pool_stats():
+    """Counters for this process plus the pool's configured limits."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["workers"] = _setting("PDF_RENDER_WORKERS", 2)
+    stats["queue_limit"] = _setting("PDF_RENDER_QUEUE_LIMIT", 4)
+    stats["timeout"] = _setting("PDF_RENDER_TIMEOUT", 120)
+    stats["started"] = _pool is not None
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+# -------------------------------
+# Submit
+# -------------------------------
+def _finished(slots, future):
+    slots.release()
+    if not future.cancelled():
+        _bump("failures" if future.exception() else "completed")
+
+
+def submit(fn, *args, wait=0):
+    """
+    Start ``fn(*args)`` in the pool and return its Future. `fn` and the
+    arguments must be picklable (a module-level function, plain data or
+    model instances with their relations already loaded).
+
+    Waits up to `wait` seconds for room in the queue, then raises
+    RenderBusy. With PDF_RENDER_WORKERS = 0 the call runs inline and an
+    already finished Future is returned.
+    """
+    if not _setting("PDF_RENDER_WORKERS", 2):
+        _bump("inline")
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=wait):
+        _bump("rejected")
+        raise RenderBusy("PDF renderer is at capacity")
+
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        shutdown(wait=False)
+        _bump("failures")
+        raise
+    # The slot is held until the render really finishes, not just until
+    # the caller stops waiting, so abandoned renders still count.
+    future.add_done_callback(lambda f: _finished(slots, f))
+    _bump("submitted")
+    return future
+
+
+def result(future, timeout=None):
+    """
+    Wait for a Future from submit(). Raises RenderTimeout after `timeout`
+    (default PDF_RENDER_TIMEOUT) seconds; exceptions from the function
+    propagate unchanged.
+    """
+    if timeout is None:
+        timeout = _setting("PDF_RENDER_TIMEOUT", 120)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()  # only succeeds if it never started
+        _bump("timeouts")
+        raise RenderTimeout(f"PDF render did not finish within {timeout}s")
+    except BrokenProcessPool:
+        # A worker died (OOM kill, segfault): start over on the next call
+        shutdown(wait=False)
+        raise
+
+
+def call(fn, *args, timeout=None):
+    """
+    Run ``fn(*args)`` in the pool and return its result. Raises RenderBusy
+    at once when the queue is full and RenderTimeout when no result
+    arrives in time.
+    """
+    return result(submit(fn, *args), timeout)
@@ -0,0 +1,289 @@
+# visits/rollups.py
+"""
+Daily sales rollups: one ``DailySalesRollup`` row per
+(user, date, productionline, kind) holding the visit count, quoted count,
+quoted order amount, payment count and collected payment amount.
+
+Each change is also folded into ``PeriodSalesRollup`` rows per week and per
+month; that table is the cube behind the zone / branch team dashboard.
+
+Rows are adjusted by deltas from the save/delete signals in visits/signals.py,
+so dashboards and list totals sum a handful of rollup rows instead of
+scanning every visit. ``manage.py rebuild_rollups`` recomputes both tables
+from scratch and verifies them.
+
+Only visits with an ``added_by`` user are counted.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate
+
+
+AMOUNT_FIELDS = ["order_amount", "payment_amount"]
+COUNT_FIELDS = ["visit_count", "quoted_count", "payment_count"]
+MEASURES = COUNT_FIELDS + AMOUNT_FIELDS
+
+PERIODS = ["week", "month"]
+
+# Fields of NewVisit / FollowUp that feed a rollup row
+SOURCE_FIELDS = {
+    "added_by", "added_by_id", "created_at", "productionline",
+    "is_order_quoted", "order_amount", "is_payment_collected", "payment_amount",
+}
+
+
+def kind_of(model):
+    return "followup" if model.__name__ == "FollowUp" else "visit"
+
+
+def contribution(obj):
+    """(key, measures) this visit / follow-up adds to the rollup, or None."""
+    if not obj.added_by_id or not obj.created_at:
+        return None
+
+    quoted = bool(obj.is_order_quoted)
+    paid = bool(getattr(obj, "is_payment_collected", False))
+    key = {
+        "user_id": obj.added_by_id,
+        "date": localdate(obj.created_at),
+        "productionline": obj.productionline or "",
+        "kind": kind_of(type(obj)),
+    }
+    measures = {
+        "visit_count": 1,
+        "quoted_count": int(quoted),
+        "order_amount": Decimal(obj.order_amount or 0) if quoted else Decimal(0),
+        "payment_count": int(paid),
+        "payment_amount": Decimal(getattr(obj, "payment_amount", None) or 0) if paid else Decimal(0),
+    }
+    return key, measures
+
+
+def period_start(day, period):
+    """Monday of the week / first of the month containing `day`."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _add(model, key, measures, sign):
+    deltas = {f: F(f) + sign * v for f, v in measures.items() if v}
+
+    if model.objects.filter(**key).update(**deltas):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **{f: sign * v for f, v in measures.items()})
+    except IntegrityError:
+        # Someone created the row between our UPDATE and INSERT
+        model.objects.filter(**key).update(**deltas)
+
+
+def apply(change, sign=1):
+    """Add (sign=1) or remove (sign=-1) a contribution. Call inside a transaction."""
+    from .models import DailySalesRollup, PeriodSalesRollup
+
+    if change is None:
+        return
+    key, measures = change
+    _add(DailySalesRollup, key, measures, sign)
+
+    day = key["date"]
+    common = {k: v for k, v in key.items() if k != "date"}
+    for period in PERIODS:
+        period_key = dict(common, period=period, start=period_start(day, period))
+        _add(PeriodSalesRollup, period_key, measures, sign)
+
+
+def apply_many(objs, sign=1):
+    """
+    apply() for rows saved without signals (bulk_create). Contributions
+    sharing a rollup key are summed first, so it's one write per key.
+    """
+    merged = {}
+    for obj in objs:
+        change = contribution(obj)
+        if change is None:
+            continue
+        key, measures = change
+        slot = tuple(sorted(key.items()))
+        if slot in merged:
+            for f in MEASURES:
+                merged[slot][1][f] += measures[f]
+        else:
+            merged[slot] = (key, dict(measures))
+    for change in merged.values():
+        apply(change, sign)
+
+
+def totals(user, kind, date=None):
+    """Summed measures for one user and kind, optionally for a single day."""
+    from .models import DailySalesRollup
+
+    qs = DailySalesRollup.objects.filter(user=user, kind=kind)
+    if date:
+        qs = qs.filter(date=date)
+    result = qs.aggregate(**{f: Sum(f) for f in MEASURES})
+    return {f: result[f] or 0 for f in MEASURES}
+
+
+# -------------------------------
+# Rebuild / verify
+# -------------------------------
+def compute(visit_model, followup_model):
+    """
+    Recompute every rollup row from the raw facts.
+    Returns {(user_id, date, productionline, kind): {measure: value}}.
+    Model classes are parameters so migrations can pass historical models.
+    """
+    rows = {}
+    for model, kind in ((visit_model, "visit"), (followup_model, "followup")):
+        aggregates = {
+            "visit_count": Count("id"),
+            "quoted_count": Count("id", filter=Q(is_order_quoted=True)),
+            "order_amount": Sum("order_amount", filter=Q(is_order_quoted=True)),
+        }
+        if kind == "followup":
+            aggregates["payment_count"] = Count("id", filter=Q(is_payment_collected=True))
+            aggregates["payment_amount"] = Sum("payment_amount", filter=Q(is_payment_collected=True))
+
+        grouped = (
+            model.objects.filter(added_by__isnull=False)
+            .annotate(day=TruncDate("created_at"))
+            .values("added_by_id", "day", "productionline")
+            .annotate(**aggregates)
+            .order_by()
+        )
+        for g in grouped:
+            key = (g["added_by_id"], g["day"], g["productionline"] or "", kind)
+            row = rows.setdefault(key, {f: 0 for f in MEASURES})
+            for f in MEASURES:
+                row[f] += g.get(f) or 0
+    return rows
+
+
+def compute_periods(daily_rows):
+    """
+    Fold compute() output into week / month rows.
+    Returns {(user_id, period, start, productionline, kind): {measure: value}}.
+    """
+    rows = {}
+    for (user_id, day, productionline, kind), measures in daily_rows.items():
+        for period in PERIODS:
+            key = (user_id, period, period_start(day, period), productionline, kind)
+            row = rows.setdefault(key, {f: 0 for f in MEASURES})
+            for f in MEASURES:
+                row[f] += measures[f]
+    return rows
+
+
+def stored(rollup_model):
+    """Current rollup table in the same shape as compute(), zero rows dropped."""
+    return _stored(rollup_model, ["user_id", "date", "productionline", "kind"])
+
+
+def stored_periods(period_model):
+    """Current period table in the same shape as compute_periods()."""
+    return _stored(period_model, ["user_id", "period", "start", "productionline", "kind"])
+
+
+def _stored(model, key_fields):
+    rows = {}
+    for r in model.objects.values(*key_fields, *MEASURES):
+        measures = {f: r[f] for f in MEASURES}
+        if any(measures.values()):
+            rows[tuple(r[k] for k in key_fields)] = measures
+    return rows
+
+
+def diff(expected, actual):
+    """List of (key, expected, actual) where the two tables disagree."""
+    problems = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        e = expected.get(key, {f: 0 for f in MEASURES})
+        a = actual.get(key, {f: 0 for f in MEASURES})
+        if any(Decimal(e[f]) != Decimal(a[f]) for f in MEASURES):
+            problems.append((key, e, a))
+    return problems
+
+
+def rebuild(visit_model, followup_model, rollup_model, period_model=None):
+    """Replace the rollup table(s) with freshly computed rows. Returns the daily row count."""
+    rows = compute(visit_model, followup_model)
+    with transaction.atomic():
+        rollup_model.objects.all().delete()
+        rollup_model.objects.bulk_create(
+            [
+                rollup_model(user_id=u, date=d, productionline=p, kind=k, **measures)
+                for (u, d, p, k), measures in rows.items()
+            ],
+            batch_size=500,
+        )
+        if period_model is not None:
+            period_model.objects.all().delete()
+            period_model.objects.bulk_create(
+                [
+                    period_model(user_id=u, period=per, start=st, productionline=p, kind=k, **measures)
+                    for (u, per, st, p, k), measures in compute_periods(rows).items()
+                ],
+                batch_size=500,
+            )
+    return len(rows)
+
+
+# -------------------------------
+# Team dashboard cube queries
+# -------------------------------
+# Both kinds summed together, with visits and follow-ups counted apart
+TEAM_MEASURES = {
+    "new_visits": Sum("visit_count", filter=Q(kind="visit")),
+    "followups": Sum("visit_count", filter=Q(kind="followup")),
+    "quoted": Sum("quoted_count"),
+    "quoted_amount": Sum("order_amount"),
+    "payments": Sum("payment_count"),
+    "collected": Sum("payment_amount"),
+}
+
+
+def recent_starts(period, count, today=None):
+    """Start dates of the last `count` weeks / months, oldest first."""
+    start = period_start(today or localdate(), period)
+    starts = [start]
+    for _ in range(count - 1):
+        start = period_start(start - timedelta(days=1), period)
+        starts.append(start)
+    return starts[::-1]
+
+
+def _team_rows(qs, group_by):
+    rows = qs.values(*group_by).annotate(**TEAM_MEASURES).order_by(*group_by)
+    return [{k: (v or 0) if k in TEAM_MEASURES else v for k, v in row.items()} for row in rows]
+
+
+def team_series(scope, period, starts):
+    """One row per period start in `starts` (zero-filled) for users matching `scope`."""
+    from .models import PeriodSalesRollup
+
+    qs = PeriodSalesRollup.objects.filter(scope, period=period, start__gte=starts[0])
+    found = {row["start"]: row for row in _team_rows(qs, ["start"])}
+    empty = {k: 0 for k in TEAM_MEASURES}
+    return [found.get(s, dict(empty, start=s)) for s in starts]
+
+
+def team_breakdown(scope, period, since, group_by):
+    """Totals since `since` for users matching `scope`, grouped by `group_by` fields."""
+    from .models import PeriodSalesRollup
+
+    qs = PeriodSalesRollup.objects.filter(scope, period=period, start__gte=since)
+    return _team_rows(qs, group_by)
+
+
+def rep_days(user_id, since):
+    """Daily totals for one rep from the daily rollups, oldest first."""
+    from .models import DailySalesRollup
+
+    return _team_rows(DailySalesRollup.objects.filter(user_id=user_id, date__gte=since), ["date"])
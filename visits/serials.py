@@ -0,0 +1,54 @@
+# visits/serials.py
+"""
+Daily serial numbers for DailyVisitForm and DailyFollowUp:
+``YYYYMMDD * 1000 + n``, where n counts that day's forms from 1.
+
+n comes from a ``DailySerialCounter`` row per (scope, date), bumped with
+an UPDATE ... SET last = last + 1. The UPDATE locks the row (on SQLite it
+takes the database's writer lock, held to commit), so concurrent
+submissions queue up behind each other instead of both reading the same
+count and colliding on the unique serial_number. It costs one UPDATE and
+one indexed read, not a count of the day's rows.
+
+On SQLite the transaction must not read before this UPDATE: a deferred
+transaction that has read holds a read lock, and upgrading it while
+another writer is active fails at once with "database is locked" rather
+than waiting out the busy timeout. Look things up before opening the
+transaction, as visits/ingest.py does with the daily sheet.
+
+Call inside the transaction that saves the form, so a failed save also
+gives the number back.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+
+def day_base(day):
+    return int(day.strftime("%Y%m%d")) * 1000
+
+
+def _used_today(model, day):
+    """Highest n already taken by `model` on `day` (rows from before the counter existed)."""
+    base = day_base(day)
+    top = model.objects.filter(serial_number__gt=base, serial_number__lt=base + 1000).aggregate(
+        top=Max("serial_number")
+    )["top"]
+    return top - base if top else 0
+
+
+def next_serial(scope, day, model):
+    """Allocate the next serial_number for `scope` ('visit' / 'followup') on `day`."""
+    from .models import DailySerialCounter
+
+    counter = DailySerialCounter.objects.filter(scope=scope, date=day)
+    with transaction.atomic():
+        if not counter.update(last=F("last") + 1):
+            # First form of the day: seed from any rows saved before the counter
+            try:
+                with transaction.atomic():
+                    DailySerialCounter.objects.create(scope=scope, date=day, last=_used_today(model, day) + 1)
+            except IntegrityError:
+                # Someone created the row between our UPDATE and INSERT
+                counter.update(last=F("last") + 1)
+        last = counter.values_list("last", flat=True).get()
+    return day_base(day) + last
@@ -0,0 +1,181 @@
+# visits/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from customer import duplicates as customer_duplicates, search as customer_search
+from customer.models import Customer, CustomerContact
+
+from . import contact_cache, customer_index, dashboard, directory_sync, rollups
+from .models import NewVisit, FollowUp
+
+
+# -------------------------------
+# Daily sales rollups
+# -------------------------------
+def _touches_rollup(update_fields):
+    return update_fields is None or bool(rollups.SOURCE_FIELDS & set(update_fields))
+
+
+@receiver(pre_save, sender=NewVisit)
+@receiver(pre_save, sender=FollowUp)
+def remember_old_contribution(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._rollup_old = None
+    if raw or not instance.pk or not _touches_rollup(update_fields):
+        return
+    old = sender.objects.filter(pk=instance.pk).first()
+    if old is not None:
+        instance._rollup_old = rollups.contribution(old)
+
+
+@receiver(post_save, sender=NewVisit)
+@receiver(post_save, sender=FollowUp)
+def update_rollup_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_rollup(update_fields):
+        return
+    old = getattr(instance, "_rollup_old", None)
+    new = rollups.contribution(instance)
+    if old == new:
+        return
+    with transaction.atomic():
+        rollups.apply(old, -1)
+        rollups.apply(new, +1)
+
+
+@receiver(post_delete, sender=NewVisit)
+@receiver(post_delete, sender=FollowUp)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    with transaction.atomic():
+        rollups.apply(rollups.contribution(instance), -1)
+
+
+# -------------------------------
+# Dashboard cache
+# -------------------------------
+# Runs after the rollup receivers above; versions are bumped on commit so a
+# concurrent reader can't re-cache numbers from before the write.
+@receiver(post_save, sender=NewVisit)
+@receiver(post_save, sender=FollowUp)
+def invalidate_dashboard_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_rollup(update_fields):
+        return
+    users = {instance.added_by_id}
+    old = getattr(instance, "_rollup_old", None)
+    if old is not None:
+        users.add(old[0]["user_id"])  # added_by may have changed
+    transaction.on_commit(lambda: [dashboard.invalidate_user(u) for u in users])
+
+
+@receiver(post_delete, sender=NewVisit)
+@receiver(post_delete, sender=FollowUp)
+def invalidate_dashboard_on_delete(sender, instance, **kwargs):
+    user_id = instance.added_by_id
+    transaction.on_commit(lambda: dashboard.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_dashboard_on_customer_create(sender, created, raw=False, **kwargs):
+    # Only the customer count is shown, so plain edits don't matter
+    if created and not raw:
+        transaction.on_commit(dashboard.invalidate_customers)
+
+
+@receiver(post_delete, sender=Customer)
+def invalidate_dashboard_on_customer_delete(sender, **kwargs):
+    transaction.on_commit(dashboard.invalidate_customers)
+
+
+# -------------------------------
+# Customer typeahead index
+# -------------------------------
+@receiver(post_save, sender=Customer)
+def update_customer_index_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    pk, name = instance.pk, instance.company_name
+    transaction.on_commit(lambda: customer_index.upsert(pk, name))
+
+
+@receiver(post_delete, sender=Customer)
+def update_customer_index_on_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: customer_index.remove(pk))
+
+
+# -------------------------------
+# Contact lookup cache (per customer)
+# -------------------------------
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_contacts_on_customer_change(sender, instance, raw=False, **kwargs):
+    # The payload carries the customer's name and designation too
+    if raw:
+        return
+    customer_id = instance.pk
+    transaction.on_commit(lambda: contact_cache.invalidate(customer_id))
+
+
+@receiver(post_save, sender=CustomerContact)
+@receiver(post_delete, sender=CustomerContact)
+def invalidate_contacts_on_contact_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    customer_id = instance.customer_id
+    transaction.on_commit(lambda: contact_cache.invalidate(customer_id))
+
+
+# -------------------------------
+# Directory change log (offline sync feed)
+# -------------------------------
+# Written in the same transaction as the change itself (Customer.save() and
+# CustomerContact.save() are atomic, and so is Model.delete()), so the feed
+# never shows a change that was rolled back or misses one that was committed.
+@receiver(post_save, sender=Customer)
+def log_customer_save(sender, instance, **kwargs):
+    directory_sync.record("customer", [instance.pk])
+
+
+@receiver(post_delete, sender=Customer)
+def log_customer_delete(sender, instance, **kwargs):
+    directory_sync.record("customer", [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=CustomerContact)
+def log_contact_save(sender, instance, **kwargs):
+    directory_sync.record("contact", [instance.pk])
+
+
+@receiver(post_delete, sender=CustomerContact)
+def log_contact_delete(sender, instance, **kwargs):
+    directory_sync.record("contact", [instance.pk], deleted=True)
+
+
+# -------------------------------
+# Full-text customer search (customer list)
+# -------------------------------
+# Re-indexed in the writing transaction, as with the change log above; a
+# deleted customer is removed because it no longer loads.
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def reindex_customer(sender, instance, **kwargs):
+    customer_search.index([instance.pk])
+
+
+@receiver(post_save, sender=CustomerContact)
+@receiver(post_delete, sender=CustomerContact)
+def reindex_contact_customer(sender, instance, **kwargs):
+    customer_search.index([instance.customer_id])
+
+
+# -------------------------------
+# Company-name trigrams (duplicate check on create)
+# -------------------------------
+@receiver(post_save, sender=Customer)
+def index_customer_name(sender, instance, **kwargs):
+    customer_duplicates.index(instance.pk, instance.name_key)
+
+
+@receiver(post_delete, sender=Customer)
+def unindex_customer_name(sender, instance, **kwargs):
+    customer_duplicates.remove(instance.pk)
+
@@ -0,0 +1,181 @@
+# visits/sync.py
+"""
+Batch upload of visits and follow-ups captured offline.
+
+    POST /sync/
+    {"items": [{"key": "5f0c...", "kind": "visit", "date": "2026-10-17", "fields": {...}}, ...]}
+
+`fields` are exactly what the HTML form posts; each item is validated
+with NewVisitForm / FollowUpForm and answered on its own:
+
+    {"results": [{"key": "5f0c...", "status": "created", "id": 812}, ...]}
+
+status is "created", "duplicate" (this rep already uploaded that key; the
+existing id is returned, so a batch can be re-sent after a dropped
+connection) or "invalid" (with form-style "errors"). `date` picks the
+daily sheet the row belongs to and defaults to today. A row for an earlier
+day is also dated that day: created_at keeps the upload's local time of
+day, so rollups, date filters and exports put it on the day it happened.
+
+Valid rows are inserted with one bulk_create per kind in one transaction.
+bulk_create sends no signals, so the rollup deltas and the dashboard
+invalidation that visits/signals.py would do are applied here.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+
+from . import dashboard, ingest, rollups
+from .forms import FollowUpForm, NewVisitForm
+from .models import FollowUp, NewVisit
+
+
+KINDS = {
+    "visit": (NewVisit, NewVisitForm, "daily_form"),
+    "followup": (FollowUp, FollowUpForm, "daily_followup"),
+}
+MAX_KEY_LENGTH = 64  # NewVisit.client_key / FollowUp.client_key
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class SyncError(Exception):
+    """The batch itself is malformed; nothing was saved."""
+
+
+def _invalid(key, errors):
+    return {"key": key, "status": "invalid", "errors": errors}
+
+
+def _parse(item, today):
+    """(kind, key, date, fields, errors) for one item's envelope."""
+    if not isinstance(item, dict):
+        return None, None, None, None, {"__all__": ["Each item must be an object."]}
+
+    errors = {}
+    key = item.get("key")
+    if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+        errors["key"] = [f"A non-empty key of at most {MAX_KEY_LENGTH} characters is required."]
+    kind = item.get("kind")
+    if kind not in KINDS:
+        errors["kind"] = [f"Must be one of: {', '.join(KINDS)}."]
+    fields = item.get("fields")
+    if not isinstance(fields, dict):
+        errors["fields"] = ["Must be an object."]
+
+    day = today
+    if item.get("date"):
+        try:
+            day = parse_date(str(item["date"]))
+        except ValueError:
+            day = None
+        if day is None or day > today:
+            errors["date"] = ["Must be a YYYY-MM-DD date, not in the future."]
+    return kind, key if isinstance(key, str) else None, day, fields, errors
+
+
+def _backdate(model, rows, today):
+    """
+    bulk_create stamps created_at with now; move rows for an earlier day's
+    sheet onto that day at the same local time. One UPDATE per day.
+    """
+    by_day = {}
+    for _, day, obj in rows:
+        if day != today:
+            by_day.setdefault(day, []).append(obj)
+    now = timezone.localtime()
+    for day, objs in by_day.items():
+        stamp = timezone.make_aware(datetime.combine(day, now.time()))
+        model.objects.filter(pk__in=[obj.pk for obj in objs]).update(created_at=stamp)
+        for obj in objs:
+            obj.created_at = stamp
+
+
+def sync(user, items, _retry=True):
+    """Save a batch for `user`. Returns one result dict per item, in order."""
+    if not isinstance(items, list):
+        raise SyncError("'items' must be a list.")
+    max_items = _setting("SYNC_MAX_ITEMS", 200)
+    if len(items) > max_items:
+        raise SyncError(f"At most {max_items} items per batch.")
+
+    today = localdate()
+    results = [None] * len(items)
+    parsed = []
+    for i, item in enumerate(items):
+        kind, key, day, fields, errors = _parse(item, today)
+        if errors:
+            results[i] = _invalid(key, errors)
+        else:
+            parsed.append((i, kind, key, day, fields))
+
+    # Keys this rep already uploaded: one query per kind
+    known = {}
+    for kind, (model, _, _) in KINDS.items():
+        keys = [key for _, k, key, _, _ in parsed if k == kind]
+        known[kind] = dict(
+            model.objects.filter(added_by=user, client_key__in=keys).values_list("client_key", "pk")
+        ) if keys else {}
+
+    pending = {kind: [] for kind in KINDS}  # kind -> [(index, date, unsaved row)]
+    seen = set()
+    for i, kind, key, day, fields in parsed:
+        if key in known[kind]:
+            results[i] = {"key": key, "status": "duplicate", "id": known[kind][key]}
+            continue
+        if (kind, key) in seen:
+            results[i] = _invalid(key, {"key": ["Repeated within this batch."]})
+            continue
+        seen.add((kind, key))
+
+        form = KINDS[kind][1](data=fields)
+        if not form.is_valid():
+            results[i] = _invalid(key, form.errors.get_json_data())
+            continue
+        obj = ingest.prepare(form.save(commit=False), user)
+        obj.client_key = key
+        pending[kind].append((i, day, obj))
+
+    # Existing sheets are looked up before the transaction, so its first
+    # statement is a write (see visits/serials.py)
+    sheets = {
+        kind: ingest.existing_sheets(KINDS[kind][0], user, [day for _, day, _ in rows])
+        for kind, rows in pending.items() if rows
+    }
+
+    try:
+        with transaction.atomic():
+            for kind, rows in pending.items():
+                if not rows:
+                    continue
+                model, _, sheet_field = KINDS[kind]
+                for _, day, obj in rows:
+                    if day not in sheets[kind]:
+                        sheets[kind][day] = ingest.create_sheet(model, user, day)
+                    setattr(obj, sheet_field, sheets[kind][day])
+
+                objs = [obj for _, _, obj in rows]
+                model.objects.bulk_create(objs)
+                _backdate(model, rows, today)
+                rollups.apply_many(objs)  # no post_save signals from bulk_create
+
+            if any(pending.values()):
+                user_id = user.pk
+                transaction.on_commit(lambda: dashboard.invalidate_user(user_id))
+    except IntegrityError:
+        if not _retry:
+            raise
+        # The same batch is being uploaded concurrently; rerun so its rows
+        # come back as duplicates
+        return sync(user, items, _retry=False)
+
+    for rows in pending.values():
+        for i, _, obj in rows:
+            results[i] = {"key": obj.client_key, "status": "created", "id": obj.pk}
+    return results
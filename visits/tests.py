@@ -1,3 +1,1460 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from customer import duplicates as customer_duplicates, search as customer_search
+from customer.models import Customer, CustomerContact
+from customer.names import company_key
+from visits import (
+    contact_cache, customer_index, customer_pack, dashboard, directory_sync, export_jobs, enrichment, exports,
+    gazetteer, geocoding, ingest, pdf_cache, pdf_tables, render_pool, rollups, sync,
+)
+from visits.models import (
+    CustomUser, DailyVisitForm, DailyFollowUp, DailySalesRollup, PeriodSalesRollup, NewVisit, FollowUp, ExportJob,
+    DirectoryChange, GeocodeCache, FormSubmission,
+)
+
+
+# -------------------------------
+# Stub Nominatim
+# -------------------------------
+class StubNominatimHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        lat, lon = query["lat"][0], query["lon"][0]
+        self.server.calls.append((lat, lon))
+        self.server.clients.add(self.client_address)
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.fail:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps({
+            "display_name": f"Stub {lat},{lon}",
+            "address": {"state": "Stub Region", "county": "Stub District", "country": "Tanzania"},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (time budget tests)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubNominatimTestCase(TestCase):
+    """Geocoding goes to a local stub Nominatim only; caches and breakers start empty."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubNominatimHandler)
+        cls.server.calls = []
+        cls.server.clients = set()
+        cls.server.delay = 0
+        cls.server.fail = False
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/reverse"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.calls.clear()
+        self.server.clients.clear()
+        self.server.delay = 0
+        self.server.fail = False
+        geocoding._memory.clear()
+        geocoding.reset_stats()
+        self.settings_override = override_settings(
+            GEOCODER_BACKENDS=["visits.geocoding.NominatimGeocoder"],
+            GEOCODE_NOMINATIM_URL=self.url,
+            GEOCODE_RATE_LIMIT=1000,
+            GEOCODE_RATE_BURST=10,
+            GEOCODE_MAX_WORKERS=3,
+        )
+        self.settings_override.enable()
+        geocoding.reset_backends()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        geocoding.reset_backends()
+
+
+class BatchGeocodingTests(StubNominatimTestCase):
+    def test_duplicates_are_resolved_once(self):
+        coords = [("-6.8161", "39.2804"), ("-6.81612", "39.28041"), ("-3.3869", "36.6830")] * 10
+        coords.append((None, None))
+
+        results = geocoding.geocode_many(coords)
+
+        self.assertEqual(len(results), len(coords))
+        self.assertEqual(len(self.server.calls), 2)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0]["region"], "Stub Region")
+        self.assertIsNone(results[-1])
+        # Shared keep-alive session: never more connections than workers
+        self.assertLessEqual(len(self.server.clients), 3)
+
+    def test_second_batch_is_served_from_cache(self):
+        coords = [(f"-6.{i:03d}", "39.280") for i in range(20)]
+        geocoding.geocode_many(coords)
+        self.assertEqual(len(self.server.calls), 20)
+
+        geocoding._memory.clear()
+        geocoding.geocode_many(coords)
+
+        self.assertEqual(len(self.server.calls), 20)
+        self.assertEqual(geocoding.cache_stats()["db_hits"], 20)
+
+    def test_rate_limit_is_respected(self):
+        with override_settings(GEOCODE_RATE_LIMIT=20, GEOCODE_RATE_BURST=1):
+            geocoding.reset_backends()
+            bucket = geocoding.get_backends()[0].bucket
+            coords = [(f"-5.{i:03d}", "39.100") for i in range(6)]
+
+            start = bucket._updated
+            geocoding.geocode_many(coords)
+
+            # 6 requests at 20/s with a burst of 1 need at least 5 refills
+            self.assertGreaterEqual(bucket._updated - start, 5 / 20 - 0.01)
+
+    @override_settings(GEOCODE_BREAKER_THRESHOLD=3, GEOCODE_BREAKER_COOLDOWN=60)
+    def test_circuit_opens_after_consecutive_failures(self):
+        geocoding.reset_backends()
+        self.server.fail = True
+
+        for i in range(3):
+            with self.assertRaises(geocoding.GeocodeError):
+                geocoding.lookup(f"-4.{i:03d}", "39.1")
+        self.assertEqual(len(self.server.calls), 3)
+
+        # Open: further misses don't reach the upstream at all
+        results = geocoding.geocode_many([(f"-4.{i:03d}", "39.2") for i in range(10)])
+        self.assertEqual(results, [None] * 10)
+        self.assertEqual(len(self.server.calls), 3)
+
+        stats = geocoding.cache_stats()
+        self.assertEqual(stats["circuits"]["NominatimGeocoder"], "open")
+        self.assertEqual(stats["circuit_rejections"], 10)
+        self.assertEqual(stats["outbound_failures"], 3)
+
+    def test_lookup_counts_each_tier(self):
+        geocoding.lookup("-6.1", "39.1")                      # miss -> upstream, both tiers filled
+        geocoding.lookup("-6.1", "39.1")                      # memory
+        geocoding._memory.clear()
+        geocoding.lookup("-6.1", "39.1")                      # database
+        geocoding.geocode_many([("-6.1", "39.1"), ("-6.2", "39.1")])  # memory + miss
+
+        stats = geocoding.cache_stats()
+        self.assertEqual(
+            (stats["misses"], stats["memory_hits"], stats["db_hits"], stats["lookups"]), (2, 2, 1, 5)
+        )
+        self.assertEqual(stats["hit_ratio"], 0.6)
+        self.assertEqual(len(self.server.calls), 2)
+
+    @override_settings(GEOCODE_EVICT_EVERY=5, GEOCODE_CACHE_MAX_ENTRIES=3)
+    def test_database_tier_is_evicted_every_n_inserts(self):
+        geocoding._inserts_since_evict = 0
+        # 12 misses: the 5th and 10th inserts each evict down to the 3 most recently used rows
+        geocoding.geocode_many([(f"-8.{i:03d}", "39.1") for i in range(12)])
+        self.assertEqual(GeocodeCache.objects.count(), 3 + 2)
+        self.assertEqual(geocoding.cache_stats()["evictions"], 2 + 5)
+
+    def test_time_budget_caps_a_slow_batch(self):
+        self.server.delay = 0.2
+        coords = [(f"-7.{i:03d}", "39.100") for i in range(30)]
+
+        started = time.monotonic()
+        with geocoding.time_budget(0.5):
+            results = geocoding.geocode_many(coords)
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertIn(None, results)
+        self.assertGreater(geocoding.cache_stats()["budget_exhausted"], 0)
+
+
+class GeocodeWorkerTests(StubNominatimTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.customer = Customer.objects.create(
+            designation="Owner", company_name="Acme", location="Dar", email="acme@example.com"
+        )
+        self.contact = CustomerContact.objects.create(customer=self.customer, contact_name="Asha", contact_detail="0712")
+        self.sheet = DailyVisitForm.objects.create(user=self.user)
+
+    def visit(self, lat=Decimal("-6.8161"), lon=Decimal("39.2804")):
+        obj = NewVisit(
+            daily_form=self.sheet, company_name=self.customer, contact_person=self.contact, added_by=self.user,
+            latitude=lat, longitude=lon, meeting_purpose="Intro", meeting_outcome="Good", item_discussed="Sheets",
+        )
+        geocoding.mark_pending(obj)
+        obj.save()
+        return obj
+
+    def test_only_rows_with_coordinates_are_queued(self):
+        self.assertEqual(self.visit().geocode_status, "pending")
+        self.assertIsNone(self.visit(lat=None, lon=None).geocode_status)
+
+    def test_worker_stores_locations_of_pending_rows(self):
+        queued, skipped = self.visit(), self.visit(lat=None, lon=None)
+        out = io.StringIO()
+        call_command("geocode_worker", "--once", stdout=out)
+        self.assertIn("NewVisit: 1 geocoded, 0 to retry, 0 failed", out.getvalue())
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.geocode_status, queued.region, queued.nation), ("done", "Stub Region", "Tanzania"))
+        self.assertIsNone(queued.geocode_next_attempt_at)
+        skipped.refresh_from_db()
+        self.assertIsNone(skipped.place_name)
+        self.assertEqual(len(self.server.calls), 1)
+
+    @override_settings(GEOCODE_MAX_ATTEMPTS=3, GEOCODE_RETRY_BASE_DELAY=30, GEOCODE_RETRY_MAX_DELAY=600)
+    def test_failures_back_off_until_the_row_is_marked_failed(self):
+        self.server.fail = True
+        obj = self.visit()
+
+        for attempt, delay in ((1, 30), (2, 60)):
+            before = timezone.now()
+            self.assertEqual(geocoding.process_pending(NewVisit), (0, 1, 0))
+            obj.refresh_from_db()
+            self.assertEqual((obj.geocode_status, obj.geocode_attempts), ("pending", attempt))
+            wait = (obj.geocode_next_attempt_at - before).total_seconds()
+            self.assertTrue(delay <= wait <= delay * 1.1 + 1, wait)
+
+            # Not due yet: left alone
+            self.assertEqual(geocoding.process_pending(NewVisit), (0, 0, 0))
+            NewVisit.objects.filter(pk=obj.pk).update(geocode_next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(geocoding.process_pending(NewVisit), (0, 0, 1))
+        obj.refresh_from_db()
+        self.assertEqual((obj.geocode_status, obj.geocode_attempts, obj.geocode_next_attempt_at), ("failed", 3, None))
+        self.assertEqual(geocoding.process_pending(NewVisit), (0, 0, 0))
+        self.assertEqual(len(self.server.calls), 3)
+
+    @override_settings(GEOCODE_RETRY_BASE_DELAY=30, GEOCODE_RETRY_MAX_DELAY=600)
+    def test_retry_delay_is_capped(self):
+        self.assertLessEqual(geocoding.retry_delay(20), 600 * 1.1)
+        self.assertGreaterEqual(geocoding.retry_delay(20), 600)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * gazetteer.EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GazetteerTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        # Places spread over a few cells, including negative lat/lon cells
+        self.places = [(rng.uniform(-2.0, 1.0), rng.uniform(-1.0, 2.0), f"p{i}") for i in range(300)]
+        self.index = gazetteer.GridIndex(self.places, cell_size=0.5)
+
+    def brute_force(self, lat, lon):
+        return min(haversine_km(lat, lon, plat, plon) for plat, plon, _ in self.places)
+
+    def test_matches_brute_force_haversine(self):
+        rng = random.Random(11)
+        # Inside the grid, on its edge cells and well outside it
+        queries = [(rng.uniform(-3.5, 2.5), rng.uniform(-2.5, 3.5)) for _ in range(200)]
+        queries += [(-2.0, -1.0), (1.0, 2.0), (-2.0, 2.0), (1.0, -1.0), (-9.0, 8.0)]
+        coords = {payload: (plat, plon) for plat, plon, payload in self.places}
+        for lat, lon in queries:
+            payload, dist = self.index.nearest(lat, lon)
+            best = self.brute_force(lat, lon)
+            found = haversine_km(lat, lon, *coords[payload])
+            # Equirectangular distances: same place up to sub-0.5% ties
+            self.assertLessEqual(found, best * 1.005 + 1e-6, (lat, lon))
+            self.assertAlmostEqual(dist, found, delta=found * 0.01 + 1e-6)
+
+    def test_max_km_cutoff(self):
+        index = gazetteer.GridIndex([(-6.8, 39.28, "Dar"), (-3.37, 36.68, "Arusha")])
+        payload, dist = index.nearest(-6.81, 39.29, max_km=5)
+        self.assertEqual(payload, "Dar")
+        self.assertAlmostEqual(dist, haversine_km(-6.81, 39.29, -6.8, 39.28), delta=0.05)
+        self.assertIsNone(index.nearest(-6.0, 39.28, max_km=50))  # ~89 km from Dar
+        self.assertEqual(index.nearest(-6.0, 39.28, max_km=100)[0], "Dar")
+        self.assertIsNone(gazetteer.GridIndex([]).nearest(-6.0, 39.0))
+
+
+@override_settings(GEOCODER_BACKENDS=["visits.geocoding.GazetteerGeocoder"])
+class GeocodeBackfillTests(TestCase):
+    def setUp(self):
+        geocoding.reset_backends()
+        self.addCleanup(geocoding.reset_backends)
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        make_activity(self.user, 5)  # Dar es Salaam coordinates, no stored location
+        self.pks = list(NewVisit.objects.order_by("pk").values_list("pk", flat=True))
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.checkpoint = os.path.join(tmp, "checkpoint.json")
+
+    def backfill(self, *args):
+        out = io.StringIO()
+        call_command(
+            "geocode_backfill", "--only", "visits", "--batch-size", "2", "--pause", "0",
+            "--checkpoint", self.checkpoint, *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def located(self):
+        return list(NewVisit.objects.filter(place_name__isnull=False).order_by("pk").values_list("pk", flat=True))
+
+    def test_walks_keyset_windows_and_checkpoints(self):
+        out = self.backfill()
+        self.assertEqual(out.count("visits: "), 4)  # windows of 2, 2, 1 + the summary
+        self.assertIn(f"up to pk {self.pks[-1]}", out)
+        self.assertEqual(self.located(), self.pks)
+        self.assertEqual(NewVisit.objects.filter(geocode_status="done").count(), 5)
+        with open(self.checkpoint) as fh:
+            self.assertEqual(json.load(fh), {"visits": self.pks[-1]})
+        self.assertFalse(FollowUp.objects.filter(place_name__isnull=False).exists())  # --only visits
+
+    def test_resumes_after_the_checkpoint_unless_reset(self):
+        with open(self.checkpoint, "w") as fh:
+            json.dump({"visits": self.pks[2]}, fh)
+
+        self.assertIn("Resuming from", self.backfill())
+        self.assertEqual(self.located(), self.pks[3:])
+
+        NewVisit.objects.update(place_name=None)
+        self.assertNotIn("Resuming from", self.backfill("--reset"))
+        self.assertEqual(self.located(), self.pks)
+
+
+class MemoryCacheTests(TestCase):
+    def test_least_recently_used_entry_is_dropped(self):
+        cache = geocoding.MemoryCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "b" is now the oldest
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c"), len(cache)), (1, None, 3, 2))
+
+    def test_entries_expire_after_ttl(self):
+        cache = geocoding.MemoryCache(max_entries=10, ttl=0.05)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    @override_settings(GEOCODE_CACHE_TTL=60, GEOCODE_CACHE_MAX_ENTRIES=2)
+    def test_database_tier_drops_expired_then_least_recently_used(self):
+        now = timezone.now()
+        GeocodeCache.objects.create(key="old", place_name="x", created_at=now - timedelta(seconds=120))
+        for i, key in enumerate(["lru", "mid", "new"]):
+            GeocodeCache.objects.create(key=key, place_name="x", last_used_at=now - timedelta(minutes=10 - i))
+
+        geocoding.reset_stats()
+        self.assertEqual(geocoding.evict(), 2)
+        self.assertEqual(sorted(GeocodeCache.objects.values_list("key", flat=True)), ["mid", "new"])
+        self.assertEqual(geocoding.cache_stats()["evictions"], 2)
+
+
+# -------------------------------
+# Dashboard
+# -------------------------------
+def make_activity(user, n):
+    """n customers, each with one quoted visit and one paid follow-up by `user`."""
+    daily_form = DailyVisitForm.objects.create(user=user)
+    daily_followup = DailyFollowUp.objects.create(user=user)
+    for i in range(n):
+        customer = Customer.objects.create(
+            designation="Owner", company_name=f"Company {user.pk}-{i}",
+            location="Dar es Salaam", email=f"c{user.pk}-{i}@example.com",
+        )
+        contact = CustomerContact.objects.create(
+            customer=customer, contact_name=f"Contact {i}", contact_detail="0712345678"
+        )
+        common = dict(
+            company_name=customer, contact_person=contact, added_by=user,
+            latitude=Decimal("-6.8161"), longitude=Decimal("39.2804"),
+            meeting_purpose="Intro", meeting_outcome="Good", item_discussed="Sheets",
+            is_order_quoted=True, order_amount=Decimal("100.00"),
+        )
+        NewVisit.objects.create(daily_form=daily_form, **common)
+        FollowUp.objects.create(
+            daily_followup=daily_followup, is_payment_collected=True,
+            payment_amount=Decimal("40.00"), **common
+        )
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        dashboard.reset_stats()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+
+    def get_dashboard(self):
+        return self.client.get(reverse("index"))
+
+    def add_activity(self, user, n):
+        # Cache invalidation runs on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            make_activity(user, n)
+
+    def test_query_count_does_not_grow_with_data(self):
+        # session + user, then one rollup query and one Customer count
+        with self.assertNumQueries(4):
+            self.get_dashboard()
+
+        self.add_activity(self.user, 25)
+        with self.assertNumQueries(4):
+            response = self.get_dashboard()
+
+        self.assertEqual(response.context["total_order_quoted_new_visits"], 25)
+        self.assertEqual(response.context["total_order_amount_new_visits"], Decimal("2500.00"))
+        self.assertEqual(response.context["total_followups"], 25)
+        self.assertEqual(response.context["total_payment_collected"], Decimal("1000.00"))
+
+    def test_only_counts_own_activity(self):
+        other = CustomUser.objects.create_user(email="other@example.com", password="x")
+        self.add_activity(other, 3)
+        self.add_activity(self.user, 2)
+
+        response = self.get_dashboard()
+
+        self.assertEqual(response.context["total_order_quoted_new_visits"], 2)
+        self.assertEqual(response.context["total_order_quoted_followups"], 2)
+        self.assertEqual(response.context["total_new_visits"], 5)  # all customers
+
+    def test_repeat_loads_are_served_from_cache(self):
+        self.get_dashboard()
+        with self.assertNumQueries(2):  # session + user only
+            self.get_dashboard()
+        self.assertEqual(dashboard.cache_stats()["hit_ratio"], 0.5)
+
+    def test_invalidated_only_for_the_affected_user(self):
+        other = CustomUser.objects.create_user(email="other@example.com", password="x")
+        self.add_activity(self.user, 1)
+        self.get_dashboard()
+
+        # Someone else's follow-up: our numbers stay cached, but the new
+        # customer it created refreshes the shared count
+        self.add_activity(other, 1)
+        with self.assertNumQueries(3):
+            response = self.get_dashboard()
+        self.assertEqual(response.context["total_new_visits"], 2)
+
+        followup = FollowUp.objects.get(added_by=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            followup.payment_amount = Decimal("55.00")
+            followup.save()
+        with self.assertNumQueries(3):
+            response = self.get_dashboard()
+        self.assertEqual(response.context["total_payment_collected"], Decimal("55.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            followup.delete()
+        response = self.get_dashboard()
+        self.assertEqual(response.context["total_followups"], 0)
+
+
+# -------------------------------
+# Rollups
+# -------------------------------
+class EnrichmentTests(TestCase):
+    def test_enrichers_run_on_the_requested_page_only(self):
+        user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        make_activity(user, 5)
+        calls = []
+
+        class Recorder(enrichment.Enricher):
+            def __call__(self, objects):
+                calls.append([obj.pk for obj in objects])
+
+        queryset = NewVisit.objects.order_by("pk")
+        request = RequestFactory().get("/", {"page": 2})
+        with self.assertNumQueries(2):  # COUNT + the page itself
+            page = enrichment.paginate(request, queryset, 2, [Recorder(), Recorder()])
+
+        expected = list(queryset.values_list("pk", flat=True)[2:4])
+        self.assertEqual(page.paginator.num_pages, 3)
+        self.assertEqual([obj.pk for obj in page], expected)
+        self.assertEqual(calls, [expected, expected])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+
+    def assertRollupsMatch(self):
+        expected = rollups.compute(NewVisit, FollowUp)
+        self.assertEqual(rollups.diff(expected, rollups.stored(DailySalesRollup)), [])
+        self.assertEqual(
+            rollups.diff(rollups.compute_periods(expected), rollups.stored_periods(PeriodSalesRollup)), []
+        )
+
+    def test_signals_keep_rollups_in_step(self):
+        make_activity(self.user, 3)
+        self.assertRollupsMatch()
+        self.assertEqual(rollups.totals(self.user, "followup")["payment_amount"], Decimal("120.00"))
+
+        visit = NewVisit.objects.first()
+        visit.is_order_quoted = False
+        visit.productionline = "UPVC"
+        visit.save()
+        self.assertRollupsMatch()
+
+        followup = FollowUp.objects.first()
+        followup.payment_amount = Decimal("75.00")
+        followup.save()
+        FollowUp.objects.last().delete()
+        self.assertRollupsMatch()
+
+        totals = rollups.totals(self.user, "visit")
+        self.assertEqual((totals["visit_count"], totals["quoted_count"]), (3, 2))
+
+    def test_rebuild_repairs_drift(self):
+        make_activity(self.user, 2)
+        NewVisit.objects.update(order_amount=Decimal("5.00"))  # bypasses signals
+        self.assertNotEqual(rollups.diff(rollups.compute(NewVisit, FollowUp), rollups.stored(DailySalesRollup)), [])
+
+        rollups.rebuild(NewVisit, FollowUp, DailySalesRollup, PeriodSalesRollup)
+        self.assertRollupsMatch()
+
+
+# -------------------------------
+# Team dashboard
+# -------------------------------
+class TeamDashboardTests(TestCase):
+    def setUp(self):
+        self.head = CustomUser.objects.create_user(email="head@example.com", password="x", position="Head of Sales")
+        self.coast_a = CustomUser.objects.create_user(
+            email="a@example.com", password="x", zone="Coast Zone", branch="Chanika", position="Mobile Sales Officer"
+        )
+        self.coast_b = CustomUser.objects.create_user(
+            email="b@example.com", password="x", zone="Coast Zone", branch="Mikocheni"
+        )
+        self.lake = CustomUser.objects.create_user(email="c@example.com", password="x", zone="Lake Zone", branch="Mwanza")
+        make_activity(self.coast_a, 2)
+        make_activity(self.coast_b, 1)
+        make_activity(self.lake, 4)
+
+    def get(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse("team_dashboard"), params)
+
+    def by_label(self, response):
+        return {row["label"]: row for row in response.context["rows"]}
+
+    def test_drill_down_zone_branch_rep_day(self):
+        rows = self.by_label(self.get(self.head))
+        self.assertEqual(rows["Coast Zone"]["new_visits"], 3)
+        self.assertEqual(rows["Lake Zone"]["collected"], Decimal("160.00"))
+
+        rows = self.by_label(self.get(self.head, zone="Coast Zone"))
+        self.assertEqual(set(rows), {"Chanika", "Mikocheni"})
+
+        rows = self.by_label(self.get(self.head, zone="Coast Zone", branch="Chanika"))
+        self.assertEqual(rows["a@example.com"]["followups"], 2)
+
+        response = self.get(self.head, zone="Coast Zone", branch="Chanika", rep=self.coast_a.pk, period="week")
+        self.assertEqual([row["new_visits"] for row in response.context["rows"]], [2])
+
+        # A rep outside the selected branch is not reachable by editing the URL
+        response = self.get(self.head, zone="Coast Zone", branch="Chanika", rep=self.lake.pk)
+        self.assertEqual(response.status_code, 404)
+
+    def test_zonal_executive_is_locked_to_their_zone(self):
+        zse = CustomUser.objects.create_user(
+            email="zse@example.com", password="x", zone="Lake Zone", position="Zonal Sales Executive"
+        )
+        rows = self.by_label(self.get(zse, zone="Coast Zone"))
+        self.assertEqual(set(rows), {"Mwanza"})
+
+    def test_reps_are_forbidden(self):
+        self.assertEqual(self.get(self.coast_a).status_code, 403)
+
+    def test_query_count_does_not_grow_with_data(self):
+        self.client.force_login(self.head)
+        url = reverse("team_dashboard")
+        # session + user, breakdown, production lines, series
+        with self.assertNumQueries(5):
+            self.client.get(url)
+        make_activity(CustomUser.objects.create_user(email="d@example.com", password="x", zone="Lake Zone"), 20)
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+
+# -------------------------------
+# Background PDF export jobs
+# -------------------------------
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.export_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            EXPORT_ROOT=self.export_root, PDF_CACHE_DIR=os.path.join(self.export_root, "cache")
+        )
+        self.settings_override.enable()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        make_activity(self.user, 3)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.export_root, ignore_errors=True)
+
+    def test_queue_render_poll_download(self):
+        response = self.client.post(reverse("create_export_job", args=["followups"]))
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()["status_url"]
+        self.assertEqual(self.client.get(status_url).json()["status"], "queued")
+
+        call_command("export_worker", once=True, stdout=io.StringIO())
+
+        job = self.client.get(status_url).json()
+        self.assertEqual((job["status"], job["progress"]), ("done", 100))
+        response = self.client.get(job["download_url"])
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+        # Other users can't see the job
+        other = CustomUser.objects.create_user(email="other@example.com", password="x")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(job["download_url"]).status_code, 404)
+
+    def test_bad_customer_id_is_rejected_before_queueing(self):
+        url = reverse("create_export_job", args=["customer_detail"])
+        for value in ("abc", "-1", "1.5", ""):
+            self.assertEqual(self.client.post(url, {"customer_id": value}).status_code, 400)
+        self.assertEqual(self.client.post(url, {"customer_id": "999999"}).status_code, 404)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_expired_files_are_deleted(self):
+        job = export_jobs.enqueue(self.user, "visits", {})
+        export_jobs.run(export_jobs.claim())
+        job.refresh_from_db()
+        path = job.file_path
+
+        ExportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(export_jobs.purge_expired(), 1)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.client.get(reverse("export_job_download", args=[job.pk])).status_code, 410)
+
+    def test_tabular_reports_are_drawn_with_reportlab(self):
+        template, context, _ = exports.visits_context(self.user, {})
+        pdf = exports.render("visits", template, context)
+        self.assertIn(b"ReportLab", pdf)
+
+        # Rows are split over several page-sized tables, header repeated
+        title, summary, columns, rows = exports.visits_table(context)
+        pdf = pdf_tables.render(title, summary, columns, list(rows) * 40)
+        self.assertGreater(pdf.count(b"/Type /Page\n"), 2)
+
+    def test_production_lines_are_shown_by_label(self):
+        FollowUp.objects.update(productionline="ROOF_PAINT")
+        NewVisit.objects.update(productionline="ROOF_PAINT")
+        for table, context in (
+            (exports.visits_table, exports.visits_context(self.user, {})[1]),
+            (exports.followups_table, exports.followups_context(self.user, {})[1]),
+        ):
+            _, _, _, rows = table(context)
+            self.assertEqual({row[1] for row in rows}, {"ROOF PAINT"})
+
+    def test_failed_render_is_reported(self):
+        job = export_jobs.enqueue(self.user, "customer_detail", {"customer_id": 0})
+        export_jobs.run(export_jobs.claim())
+        payload = self.client.get(reverse("export_job_status", args=[job.pk])).json()
+        self.assertEqual(payload["status"], "failed")
+        self.assertIn("DoesNotExist", payload["error"])
+
+
+# -------------------------------
+# Streaming CSV / NDJSON exports
+# -------------------------------
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.coast = CustomUser.objects.create_user(email="a@example.com", password="x", zone="Coast Zone")
+        self.lake = CustomUser.objects.create_user(email="b@example.com", password="x", zone="Lake Zone")
+        make_activity(self.coast, 3)
+        make_activity(self.lake, 2)
+
+    def fetch(self, user, name, fmt, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse(name, args=[fmt]), params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8-sig")
+
+    def test_rep_gets_only_own_rows_as_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.fetch(self.coast, "export_visits_data", "csv"))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({r["rep"] for r in rows}, {"a@example.com"})
+        self.assertEqual(rows[0]["order_amount"], "100.00")
+
+    def test_manager_filters_by_zone_and_date_range_as_ndjson(self):
+        head = CustomUser.objects.create_user(email="head@example.com", password="x", position="Head of Sales")
+        today = timezone.localdate().isoformat()
+
+        body = self.fetch(head, "export_followups_data", "ndjson", zone="Lake Zone", date_from=today, date_to=today)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({r["rep_zone"] for r in rows}, {"Lake Zone"})
+        self.assertEqual(rows[0]["payment_amount"], "40.00")
+
+        body = self.fetch(head, "export_followups_data", "ndjson", date_to="2000-01-01")
+        self.assertEqual(body, "")
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.coast)
+        url = reverse("export_visits_data", args=["csv"])
+        # session + user, then one query for the single window
+        with self.assertNumQueries(3):
+            b"".join(self.client.get(url).streaming_content)
+
+    def test_rows_are_read_in_keyset_windows(self):
+        queryset = exports.tabular_queryset(FollowUp, Q(), {})
+        expected = list(queryset.values_list("pk", flat=True))
+        stream = exports.stream_ndjson(queryset, exports.FOLLOWUP_COLUMNS, chunk_size=2)
+        with self.assertNumQueries(3):  # windows of 2, 2 and 1, each read in full
+            rows = [json.loads(line) for line in "".join(stream).splitlines()]
+        self.assertEqual([r["id"] for r in rows], expected)
+        self.assertEqual(expected, sorted(expected, reverse=True))
+
+
+# -------------------------------
+# Generated PDF cache
+# -------------------------------
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        pdf_cache.reset_stats()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        make_activity(self.user, 2)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_unchanged_export_is_served_from_cache_or_304(self):
+        url = reverse("export_visits_pdf")
+        first = self.client.get(url)
+        etag = first["ETag"]
+        self.assertTrue(first.content.startswith(b"%PDF"))
+
+        second = self.client.get(url)
+        self.assertEqual(second["ETag"], etag)
+        self.assertEqual(b"".join(second.streaming_content), first.content)
+        self.assertEqual(pdf_cache.cache_stats()["hits"], 1)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Any change to the rows behind the report means a new fingerprint
+        visit = NewVisit.objects.first()
+        visit.reason_no_order = "Changed"
+        visit.save()
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third["ETag"], etag)
+
+    def test_filters_and_users_get_separate_entries(self):
+        key, _ = exports.fingerprint("visits", self.user, {})
+        dated, filename = exports.fingerprint("visits", self.user, {"created_date": "2020-01-01"})
+        other = CustomUser.objects.create_user(email="other@example.com", password="x")
+        self.assertEqual(len({key, dated, exports.fingerprint("visits", other, {})[0]}), 3)
+        self.assertEqual(filename, "visits_2020-01-01.pdf")
+
+    @override_settings(PDF_CACHE_MAX_BYTES=250)
+    def test_least_recently_used_files_are_evicted(self):
+        pdf_cache.store("a", b"x" * 100)
+        pdf_cache.store("b", b"x" * 100)
+        # Touch "a" so "b" is the least recently used
+        past = time.time() - 60
+        os.utime(os.path.join(self.cache_dir, "b.pdf"), (past, past))
+        pdf_cache.open_cached("a").close()
+
+        pdf_cache.store("c", b"x" * 100)
+
+        self.assertIsNotNone(pdf_cache.open_cached("a"))
+        self.assertIsNone(pdf_cache.open_cached("b"))
+        self.assertEqual(pdf_cache.cache_stats()["evictions"], 1)
+
+
+class RenderPoolTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PDF_CACHE_DIR=self.cache_dir, PDF_RENDER_WORKERS=1, PDF_RENDER_QUEUE_LIMIT=0,
+        )
+        self.settings_override.enable()
+        render_pool.shutdown()
+        render_pool.reset_stats()
+
+    def tearDown(self):
+        render_pool.shutdown()
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_customer_detail_renders_in_worker_process(self):
+        user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        make_activity(user, 1)
+        self.client.force_login(user)
+        customer = Customer.objects.get()
+
+        response = self.client.get(reverse("customer_detail_pdf", args=[customer.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b"%PDF"))
+        self.assertEqual(render_pool.pool_stats()["completed"], 1)
+
+    def test_full_queue_is_rejected_and_slow_render_times_out(self):
+        with self.assertRaises(render_pool.RenderTimeout):
+            render_pool.call(time.sleep, 1.5, timeout=0.1)
+        # The abandoned render still occupies the only worker
+        with self.assertRaises(render_pool.RenderBusy):
+            render_pool.call(time.sleep, 0)
+
+        response = exports.overloaded_response(render_pool.RenderBusy())
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+
+        time.sleep(2)
+        self.assertIsNone(render_pool.call(time.sleep, 0))
+        stats = render_pool.pool_stats()
+        self.assertEqual((stats["timeouts"], stats["rejected"]), (1, 1))
+
+    @override_settings(PDF_RENDER_WORKERS=0)
+    def test_zero_workers_renders_inline(self):
+        self.assertEqual(render_pool.call(len, "abc"), 3)
+        self.assertEqual(render_pool.pool_stats()["inline"], 1)
+
+
+@override_settings(PDF_RENDER_WORKERS=1)
+class CustomerPackTests(TestCase):
+    def setUp(self):
+        render_pool.shutdown()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x", branch="Mwanza")
+        make_activity(self.user, 3)
+        other = CustomUser.objects.create_user(email="other@example.com", password="x", branch="Geita")
+        make_activity(other, 1)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        render_pool.shutdown()
+
+    def test_details_for_many_customers_take_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(4):  # customers + totals, then contacts, visits, follow-ups
+            customers = list(exports.customer_details(Customer.objects.all()))
+        self.assertEqual(len(customers), 4)
+        context = exports.detail_context(customers[0])
+        self.assertEqual(context["quoted_visits_total"], Decimal("100.00"))
+        self.assertEqual(context["followup_payment_total"], Decimal("40.00"))
+        self.assertEqual(len(context["followups"]), 1)
+
+    def test_pack_reads_customers_in_keyset_batches(self):
+        with self.assertNumQueries(8):  # two batches of four queries, each read in full
+            batches = list(customer_pack._batches(Customer.objects.all(), size=3))
+        self.assertEqual([len(b) for b in batches], [3, 1])
+        pks = [c.pk for b in batches for c in b]
+        self.assertEqual(pks, sorted(Customer.objects.values_list("pk", flat=True)))
+        self.assertEqual(batches[0][0].followup_list[0].payment_amount, Decimal("40.00"))
+
+    def test_branch_pack_streams_one_pdf_per_customer(self):
+        response = self.client.get(reverse("customer_pdf_pack"), {"branch": "Mwanza"})
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        names = sorted(archive.namelist())
+        self.assertEqual(names, [f"Company_{self.user.pk}-{i}_detail.pdf" for i in range(3)])
+        self.assertTrue(all(archive.read(n).startswith(b"%PDF") for n in names))
+
+    def test_pack_needs_a_filter(self):
+        self.assertEqual(self.client.get(reverse("customer_pdf_pack")).status_code, 400)
+        self.assertEqual(self.client.get(reverse("customer_pdf_pack"), {"branch": "Nowhere"}).status_code, 404)
+
+
+def run_concurrently(users, submit):
+    """Call submit(user) for every user at once, one thread and connection each. Returns the exceptions."""
+    errors = []
+    start = threading.Barrier(len(users))
+
+    def run(user):
+        try:
+            start.wait()
+            submit(user)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+# Needs the file-backed test database (DATABASES TEST NAME in core/settings.py):
+# shared-cache :memory: raises "table is locked" instead of waiting for the writer.
+class SerialNumberTests(TransactionTestCase):
+    def setUp(self):
+        self.users = [CustomUser.objects.create_user(email=f"rep{i}@example.com") for i in range(12)]
+        self.today = timezone.localdate()
+
+    def assertConsecutiveSerials(self, *sheets):
+        base = int(self.today.strftime("%Y%m%d")) * 1000
+        expected = [base + n for n in range(1, len(self.users) + 1)]
+        for rows in sheets:
+            rows = getattr(rows, "objects", rows)  # a sheet model or a queryset of sheets
+            serials = sorted(rows.values_list("serial_number", flat=True))
+            self.assertEqual(serials, expected)
+
+    def test_concurrent_daily_forms_get_distinct_consecutive_serials(self):
+        def submit(user):
+            DailyVisitForm.objects.create(user=user, date=self.today)
+            DailyFollowUp.objects.create(user=user, date=self.today)
+
+        self.assertEqual(run_concurrently(self.users, submit), [])
+        self.assertConsecutiveSerials(DailyVisitForm, DailyFollowUp)
+
+    def test_concurrent_first_submissions_of_the_day(self):
+        customer = Customer.objects.create(
+            designation="Owner", company_name="Acme", location="Dar es Salaam", email="acme@example.com"
+        )
+        contact = CustomerContact.objects.create(customer=customer, contact_name="Asha", contact_detail="0712345678")
+
+        def submit(user):
+            visit = NewVisit(
+                company_name=customer, contact_person=CustomerContact.objects.select_related("customer").get(pk=contact.pk),
+                meeting_purpose="Intro", meeting_outcome="Good", item_discussed="Sheets",
+                latitude=Decimal("-6.8161"), longitude=Decimal("39.2804"),
+            )
+            ingest.save_submission(visit, user)
+
+        self.assertEqual(run_concurrently(self.users, submit), [])
+        self.assertEqual(NewVisit.objects.count(), len(self.users))
+        self.assertEqual(FormSubmission.objects.count(), len(self.users))
+        self.assertConsecutiveSerials(DailyVisitForm)
+
+    def test_concurrent_sync_batches(self):
+        customer = Customer.objects.create(
+            designation="Owner", company_name="Acme", location="Dar es Salaam", email="acme@example.com"
+        )
+        contact = CustomerContact.objects.create(customer=customer, contact_name="Asha", contact_detail="0712345678")
+        yesterday = self.today - timedelta(days=1)
+        fields = {
+            "company_name": customer.pk, "contact_person": contact.pk,
+            "meeting_purpose": "Intro", "meeting_outcome": "Good", "item_discussed": "Sheets",
+            "is_order_quoted": True, "order_amount": "300", "latitude": -6.8161, "longitude": 39.2804,
+        }
+        results = {}
+
+        def submit(user):
+            results[user.pk] = sync.sync(user, [
+                {"key": "today", "kind": "visit", "fields": fields},
+                {"key": "late", "kind": "visit", "date": yesterday.isoformat(), "fields": fields},
+            ])
+
+        self.assertEqual(run_concurrently(self.users, submit), [])
+        self.assertEqual(
+            {r["status"] for batch in results.values() for r in batch}, {"created"}
+        )
+        self.assertEqual(NewVisit.objects.count(), 2 * len(self.users))
+        self.assertConsecutiveSerials(DailyVisitForm.objects.filter(date=self.today))
+        self.assertEqual(
+            rollups.diff(rollups.compute(NewVisit, FollowUp), rollups.stored(DailySalesRollup)), []
+        )
+
+    def test_counter_continues_after_existing_forms(self):
+        today = self.today
+        base = int(today.strftime("%Y%m%d")) * 1000
+        old = CustomUser.objects.create_user(email="old@example.com", password="x")
+        # A form saved before the counter existed
+        DailyVisitForm.objects.bulk_create([DailyVisitForm(user=old, date=today, serial_number=base + 5)])
+
+        new = CustomUser.objects.create_user(email="new@example.com", password="x")
+        self.assertEqual(DailyVisitForm.objects.create(user=new, date=today).serial_number, base + 6)
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(
+            designation="Engineer", company_name="Acme", location="Dar es Salaam", email="acme@example.com"
+        )
+        self.contact = CustomerContact.objects.create(
+            customer=self.customer, contact_name="Asha", contact_detail="0712345678"
+        )
+
+    def post(self, name):
+        return self.client.post(reverse(name), {
+            "company_name": self.customer.pk, "contact_person": self.contact.pk,
+            "meeting_purpose": "Intro", "meeting_outcome": "Good", "item_discussed": "Sheets",
+            "is_order_quoted": "True", "order_amount": "250",
+            "is_payment_collected": "False", "reason_no_payment": "Next week",
+            "latitude": "-6.8161", "longitude": "39.2804",
+        })
+
+    def test_submission_query_budget(self):
+        for name, model in (("new_visit", NewVisit), ("new_followup", FollowUp)):
+            # First of the day also creates the daily sheet and its submission row
+            self.assertEqual(self.post(name).status_code, 302)
+            # session + user, form: company + contact (customer joined) + 2 FK checks,
+            # daily sheet, then one transaction (4 savepoint statements): insert + 3 rollup updates
+            with self.assertNumQueries(15):
+                self.assertEqual(self.post(name).status_code, 302)
+
+            row = model.objects.latest("pk")
+            self.assertEqual((row.contact_number, row.designation), ("0712345678", "Engineer"))
+            self.assertEqual(row.added_by, self.user)
+            self.assertEqual(row.geocode_status, "pending")
+
+        self.assertEqual(DailyVisitForm.objects.get().submission.user, self.user)
+        self.assertEqual(DailyFollowUp.objects.get().submission.user, self.user)
+        self.assertEqual(rollups.totals(self.user, "visit")["visit_count"], 2)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(
+            designation="Contractor", company_name="Acme", location="Dar es Salaam", email="acme@example.com"
+        )
+        self.contact = CustomerContact.objects.create(
+            customer=self.customer, contact_name="Asha", contact_detail="0712345678"
+        )
+
+    def item(self, key, kind="visit", **overrides):
+        fields = {
+            "company_name": self.customer.pk, "contact_person": self.contact.pk,
+            "meeting_purpose": "Intro", "meeting_outcome": "Good", "item_discussed": "Sheets",
+            "is_order_quoted": True, "order_amount": "300", "latitude": -6.8161, "longitude": 39.2804,
+            "is_payment_collected": True, "payment_amount": "120",
+        }
+        fields.update(overrides)
+        return {"key": key, "kind": kind, "fields": fields}
+
+    def upload(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse("sync_batch"), {"items": items}, content_type="application/json")
+
+    def test_batch_is_saved_with_rollups_and_is_idempotent(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        items = [
+            self.item("a"), self.item("b"), dict(self.item("c", kind="followup"), date=yesterday.isoformat()),
+            self.item("d", is_order_quoted=True, order_amount=""),
+        ]
+        results = self.upload(items).json()["results"]
+
+        self.assertEqual([r["status"] for r in results], ["created", "created", "created", "invalid"])
+        self.assertIn("order_amount", results[3]["errors"])
+        visit = NewVisit.objects.get(pk=results[0]["id"])
+        self.assertEqual((visit.client_key, visit.designation, visit.added_by), ("a", "Contractor", self.user))
+        self.assertEqual(visit.daily_form.date, timezone.localdate())
+        self.assertEqual(FollowUp.objects.get().daily_followup.date, yesterday)
+        self.assertEqual(DailyVisitForm.objects.get().submission.user, self.user)
+
+        # Same rollups as two signal-driven saves would have produced
+        self.assertEqual(rollups.totals(self.user, "visit")["order_amount"], Decimal("600.00"))
+        self.assertEqual(rollups.totals(self.user, "followup")["payment_amount"], Decimal("120.00"))
+        self.assertEqual(
+            rollups.diff(rollups.compute(NewVisit, FollowUp), rollups.stored(DailySalesRollup)), []
+        )
+
+        # Re-sending after a dropped connection creates nothing new
+        again = self.upload(items[:3]).json()["results"]
+        self.assertEqual([r["status"] for r in again], ["duplicate"] * 3)
+        self.assertEqual([r["id"] for r in again], [r["id"] for r in results[:3]])
+        self.assertEqual(NewVisit.objects.count(), 2)
+
+    def test_past_dated_items_land_on_their_day(self):
+        day = timezone.localdate() - timedelta(days=3)
+        result = self.upload([dict(self.item("old"), date=day.isoformat())]).json()["results"][0]
+
+        visit = NewVisit.objects.get(pk=result["id"])
+        self.assertEqual(timezone.localdate(visit.created_at), day)
+        self.assertEqual(visit.daily_form.date, day)
+        row = DailySalesRollup.objects.get(user=self.user, kind="visit")
+        self.assertEqual((row.date, row.visit_count, row.order_amount), (day, 1, Decimal("300.00")))
+        self.assertEqual(rollups.totals(self.user, "visit", date=timezone.localdate())["visit_count"], 0)
+        self.assertEqual(
+            rollups.diff(rollups.compute(NewVisit, FollowUp), rollups.stored(DailySalesRollup)), []
+        )
+
+    def test_dashboard_is_invalidated(self):
+        self.client.get(reverse("index"))
+        self.upload([self.item("a")])
+        self.assertEqual(self.client.get(reverse("index")).context["total_order_quoted_new_visits"], 1)
+
+    def test_malformed_requests(self):
+        bad = self.client.post(reverse("sync_batch"), "not json", content_type="application/json")
+        self.assertEqual(bad.status_code, 400)
+        results = self.upload([{"key": "", "kind": "memo", "fields": []}, self.item("x", kind="visit")]).json()["results"]
+        self.assertEqual(set(results[0]["errors"]), {"key", "kind", "fields"})
+        self.assertEqual(results[1]["status"], "created")
+        future = dict(self.item("y"), date=(timezone.localdate() + timedelta(days=1)).isoformat())
+        self.assertIn("date", self.upload([future]).json()["results"][0]["errors"])
+
+
+class CustomerIndexTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()  # new version: the index reloads from this test's data
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        for i, name in enumerate(["Acme Steel Ltd", "Steelworks Co", "Ángel Hardware", "Zebra Tiles"]):
+            Customer.objects.create(designation="Owner", company_name=name, location="Dar", email=f"c{i}@example.com")
+
+    def names(self, query):
+        return [hit["name"] for hit in customer_index.search(query)]
+
+    def test_prefix_and_word_matches(self):
+        self.assertEqual(self.names("steel"), ["Steelworks Co", "Acme Steel Ltd"])  # whole-name first
+        self.assertEqual(self.names("angel h"), ["Ángel Hardware"])
+        self.assertEqual(self.names("  ZEB"), ["Zebra Tiles"])
+        self.assertEqual(self.names("x"), [])
+        self.assertEqual(self.names("!!"), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.names("a")  # loaded
+        with self.captureOnCommitCallbacks(execute=True):
+            new = Customer.objects.create(designation="Owner", company_name="Steel Masters", location="Dar", email="n@example.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.filter(company_name="Zebra Tiles").get().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            new.company_name = "Iron Masters"
+            new.save()
+
+        with self.assertNumQueries(0):  # served from memory, no reload
+            self.assertEqual(self.names("masters"), ["Iron Masters"])
+            self.assertEqual(self.names("steel"), ["Steelworks Co", "Acme Steel Ltd"])
+            self.assertEqual(self.names("zebra"), [])
+        self.assertGreaterEqual(customer_index.index_stats()["upserts"], 2)
+
+    def test_endpoint_and_form_widget(self):
+        response = self.client.get(reverse("customer_autocomplete"), {"q": "acm"})
+        self.assertEqual(response.json()["results"][0]["name"], "Acme Steel Ltd")
+
+        html = self.client.get(reverse("new_visit")).content.decode()
+        self.assertIn("data-customer-search", html)
+        self.assertNotIn("Zebra Tiles", html)  # no longer one <option> per customer
+
+    def test_search_cost_does_not_grow_with_customers(self):
+        index = customer_index._Index()
+        index.load(((pk, f"Company {pk:05d} Hardware") for pk in range(60000)), version=1)
+        started = time.perf_counter()
+        for _ in range(200):
+            hits = index.search("company 4", 20)
+        per_search = (time.perf_counter() - started) / 200
+        self.assertEqual(hits[0]["name"], "Company 40000 Hardware")
+        self.assertLess(per_search, 0.02)
+
+
+class ContactLookupTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        contact_cache.reset_stats()
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(
+            designation="Engineer", company_name="Acme", location="Dar", email="acme@example.com"
+        )
+        CustomerContact.objects.create(customer=self.customer, contact_name="Zuberi", contact_detail="0755000111")
+        CustomerContact.objects.create(customer=self.customer, contact_name="Asha", contact_detail="0712345678")
+        self.url = reverse("customer_contacts", args=[self.customer.pk])
+
+    def test_one_response_with_conditional_revalidation(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.json(), {
+            "customer": {"id": self.customer.pk, "name": "Acme", "designation": "Engineer"},
+            "contacts": [
+                {"id": first.json()["contacts"][0]["id"], "name": "Asha", "contact_number": "0712345678"},
+                {"id": first.json()["contacts"][1]["id"], "name": "Zuberi", "contact_number": "0755000111"},
+            ],
+        })
+        etag = first["ETag"]
+        self.assertIn("Last-Modified", first)
+
+        with self.assertNumQueries(2):  # session + user only
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.assertNumQueries(2):  # server-side cache hit
+            self.assertEqual(self.client.get(self.url).json(), first.json())
+        self.assertEqual(contact_cache.cache_stats()["hits"], 1)
+
+    def test_contact_and_customer_changes_invalidate(self):
+        etag = self.client.get(self.url)["ETag"]
+        time.sleep(0.001)
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomerContact.objects.create(customer=self.customer, contact_name="Baraka", contact_detail="0788000222")
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()["contacts"]), 3)
+
+        etag = changed["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.designation = "Owner"
+            self.customer.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.json()["customer"]["designation"], "Owner")
+
+    def test_unknown_customer(self):
+        self.assertEqual(self.client.get(reverse("customer_contacts", args=[999999])).status_code, 404)
+
+
+class DirectorySyncTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        self.url = reverse("directory_changes")
+        self.acme = Customer.objects.create(
+            designation="Engineer", company_name="Acme", location="Dar", email="acme@example.com"
+        )
+        self.asha = CustomerContact.objects.create(customer=self.acme, contact_name="Asha", contact_detail="0712")
+
+    def pull(self, token="", **params):
+        response = self.client.get(self.url, {"since": token, **params})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+        return lines[:-1], lines[-1]
+
+    def test_first_sync_then_deltas_with_tombstones(self):
+        records, trailer = self.pull()
+        self.assertEqual([(r["type"], r["id"]) for r in records], [("customer", self.acme.pk), ("contact", self.asha.pk)])
+        self.assertEqual(records[1]["data"], {"customer_id": self.acme.pk, "contact_name": "Asha", "contact_detail": "0712"})
+        self.assertFalse(trailer["more"])
+
+        # Nothing new: empty page, same token
+        records, again = self.pull(trailer["token"])
+        self.assertEqual((records, again["token"]), ([], trailer["token"]))
+
+        self.acme.location = "Mwanza"
+        self.acme.save()
+        self.acme.save()  # repeated change: one line
+        asha_id = self.asha.pk
+        self.asha.delete()
+        records, trailer = self.pull(trailer["token"])
+        self.assertEqual(records, [
+            {"seq": records[0]["seq"], "type": "customer", "id": self.acme.pk, "data": {
+                "company_name": "Acme", "designation": "Engineer", "location": "Mwanza", "email": "acme@example.com",
+            }},
+            {"seq": records[1]["seq"], "type": "contact", "id": asha_id, "deleted": True},
+        ])
+        self.assertEqual(trailer["token"], str(records[1]["seq"]))
+
+        # A fresh client isn't sent tombstones
+        records, _ = self.pull()
+        self.assertEqual([(r["type"], r["id"]) for r in records], [("customer", self.acme.pk)])
+
+    def test_paging_and_compaction(self):
+        for i in range(3):
+            Customer.objects.create(designation="Owner", company_name=f"C{i}", location="x", email=f"c{i}@example.com")
+        token, pages, seen = "", 0, []
+        while True:
+            with self.assertNumQueries(4):  # session, user, log page, one kind's rows
+                records, trailer = self.pull(token, limit=1)
+            seen += records
+            token, pages = trailer["token"], pages + 1
+            if not trailer["more"]:
+                break
+        self.assertEqual(len(seen), 5)
+
+        self.acme.save()
+        self.assertEqual(DirectoryChange.objects.filter(kind="customer", object_id=self.acme.pk).count(), 2)
+        call_command("compact_directory_changes", stdout=io.StringIO())
+        self.assertEqual(DirectoryChange.objects.filter(kind="customer", object_id=self.acme.pk).count(), 1)
+        self.assertEqual(len(self.pull()[0]), 5)
+
+    def test_failed_save_leaves_no_log_entry(self):
+        def explode(sender, **kwargs):
+            raise RuntimeError("receiver failed")
+
+        logged = DirectoryChange.objects.count()
+        for model, make in (
+            (Customer, lambda: Customer.objects.create(
+                designation="Owner", company_name="Beta", location="Dar", email="beta@example.com")),
+            (CustomerContact, lambda: CustomerContact.objects.create(
+                customer=self.acme, contact_name="Juma", contact_detail="0713")),
+        ):
+            post_save.connect(explode, sender=model)
+            try:
+                with self.assertRaises(RuntimeError):
+                    make()
+            finally:
+                post_save.disconnect(explode, sender=model)
+        self.assertFalse(Customer.objects.filter(company_name="Beta").exists())
+        self.assertFalse(CustomerContact.objects.filter(contact_name="Juma").exists())
+        self.assertEqual(DirectoryChange.objects.count(), logged)
+
+    def test_bad_token(self):
+        self.assertEqual(self.client.get(self.url, {"since": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"since": "-1"}).status_code, 400)
+
+
+class CustomerSearchTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        self.acme = Customer.objects.create(
+            designation="Engineer", company_name="Acme Steel", location="Mwanza", email="info@steelworks.example"
+        )
+        self.other = Customer.objects.create(
+            designation="Owner", company_name="Baraka Hardware", location="Geita", email="baraka@example.com"
+        )
+        CustomerContact.objects.create(customer=self.other, contact_name="Acme Liaison", contact_detail="0712345678")
+
+    def names(self, query):
+        return [c.company_name for c in customer_search.search(query)[0:20]]
+
+    def test_ranked_prefix_search_over_all_columns(self):
+        self.assertTrue(customer_search.available())
+        # Company-name hit ranks above a contact-name hit
+        self.assertEqual(self.names("acm"), ["Acme Steel", "Baraka Hardware"])
+        self.assertEqual(self.names("0712"), ["Baraka Hardware"])
+        self.assertEqual(self.names("mwanza steel"), ["Acme Steel"])
+        self.assertEqual(self.names('acme" (*'), ["Acme Steel", "Baraka Hardware"])  # no FTS syntax leaks through
+        self.assertEqual(customer_search.search("!!"), [])
+
+    def test_signals_keep_the_index_current(self):
+        self.acme.company_name = "Zenith Steel"
+        self.acme.save()
+        self.assertEqual(self.names("zenith"), ["Zenith Steel"])
+        self.assertEqual(self.names("acme"), ["Baraka Hardware"])
+
+        self.other.contacts.all().delete()
+        self.assertEqual(self.names("liaison"), [])
+        self.acme.delete()
+        self.assertEqual(self.names("steel"), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM customer_search")
+        call_command("rebuild_customer_search", stdout=io.StringIO())
+        self.assertEqual(self.names("geita"), ["Baraka Hardware"])
+
+    def test_customer_list_is_paginated(self):
+        Customer.objects.bulk_create([
+            Customer(designation="Owner", company_name=f"Steel {i:02}", location="x", email=f"s{i}@example.com")
+            for i in range(60)
+        ])
+        call_command("rebuild_customer_search", stdout=io.StringIO())
+
+        page = self.client.get(reverse("customer_list")).context["customers"]
+        self.assertEqual((page.paginator.count, len(page)), (62, 50))
+        self.assertEqual(page[0].company_name, "Acme Steel")
+
+        with self.assertNumQueries(5):  # session, user, count, page ids, customers
+            page = self.client.get(reverse("customer_list"), {"q": "steel", "page": 2}).context["customers"]
+        self.assertEqual((page.paginator.count, len(page)), (61, 11))
+
+
+class CustomerDuplicateTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="rep@example.com", password="x")
+        self.client.force_login(self.user)
+        self.abc = Customer.objects.create(designation="Owner", company_name="ABC Ltd", location="Dar", email="a@x.com")
+        self.acme = Customer.objects.create(
+            designation="Owner", company_name="Acme Steel", location="Mwanza", email="acme@x.com"
+        )
+
+    def post(self, company_name, **extra):
+        return self.client.post(reverse("add_customer"), {
+            "designation": "Owner", "company_name": company_name, "location": "Geita", "email": "new@x.com",
+            "contacts-TOTAL_FORMS": "0", "contacts-INITIAL_FORMS": "0", **extra,
+        })
+
+    def test_company_key(self):
+        self.assertEqual(self.abc.name_key, "abc")
+        for name in ("A.B.C. Limited", "abc company ltd", "The ABC Co. Ltd"):
+            self.assertEqual(company_key(name), "abc")
+        self.assertEqual(company_key("Smith & Sons (T) Ltd"), "smithsons")
+
+    def test_exact_key_is_rejected(self):
+        response = self.post("A.B.C. Limited")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("already registered", str(response.context["customer_form"].errors["company_name"]))
+        self.assertFalse(Customer.objects.filter(company_name="A.B.C. Limited").exists())
+
+    def test_update_checks_other_customers_only(self):
+        def update(customer, company_name):
+            return self.client.post(reverse("update_customer", args=[customer.pk]), {
+                "designation": "Owner", "company_name": company_name, "location": "Arusha",
+                "email": customer.email, "contacts-TOTAL_FORMS": "0", "contacts-INITIAL_FORMS": "0",
+            })
+
+        # Saving a customer under its own name (or a variant of it) is fine
+        self.assertEqual(update(self.abc, "ABC Ltd").status_code, 302)
+        self.assertEqual(update(self.abc, "A.B.C. Limited").status_code, 302)
+        self.abc.refresh_from_db()
+        self.assertEqual((self.abc.company_name, self.abc.location), ("A.B.C. Limited", "Arusha"))
+
+        # Taking another customer's key is not
+        response = update(self.acme, "ABC Company")
+        self.assertIn("already registered", str(response.context["customer_form"].errors["company_name"]))
+
+        # Rows that shared a key before the check existed can still be edited
+        legacy = Customer.objects.create(designation="Owner", company_name="ABC Co", location="Dar", email="l@x.com")
+        self.assertEqual(legacy.name_key, self.abc.name_key)
+        self.assertEqual(update(legacy, "ABC Co").status_code, 302)
+
+    def test_near_duplicate_is_flagged_on_create(self):
+        self.assertEqual([(c, round(s, 2)) for c, s in customer_duplicates.likely_duplicates("Acme Steels")],
+                         [(self.acme, 0.93)])
+        response = self.post("Acme Steels")
+        self.assertEqual(response.context["customer_form"].similar_customers, [self.acme])
+        self.assertFalse(Customer.objects.filter(company_name="Acme Steels").exists())
+
+        # Confirmed as a different company
+        self.assertEqual(self.post("Acme Steels", allow_similar="on").status_code, 302)
+        self.assertTrue(Customer.objects.filter(company_name="Acme Steels").exists())
+        self.assertEqual(self.post("Zenith Cement", email="zenith@x.com").status_code, 302)
+
+    def test_find_duplicate_customers(self):
+        rows = [(1, "acmesteel"), (2, "acmesteels"), (3, "abc"), (4, "abc"), (5, "zenithcement"), (6, "acmesteel")]
+        self.assertEqual(customer_duplicates.find_duplicates(rows), [[1, 2, 6], [3, 4]])
+        self.assertEqual(customer_duplicates.find_duplicates(rows, 1.01), [[1, 6], [3, 4]])
+
+        Customer.objects.create(designation="Owner", company_name="A.B.C. Limited", location="x", email="b@x.com")
+        out = io.StringIO()
+        call_command("find_duplicate_customers", stdout=out)
+        self.assertIn(f"#{self.abc.pk} ABC Ltd | ", out.getvalue())
+        self.assertIn("1 groups of likely duplicates in 3 customers.", out.getvalue())
 
-# Create your tests here.
@@ -20,6 +20,7 @@ urlpatterns = [
     ),
     path('profile/', views.profile_view, name='profile'),
     path("daily-followups/pdf/", views.export_followups_pdf, name="export_followups_pdf"),
+    path("daily-followups/export.<str:fmt>", views.export_followups_data, name="export_followups_data"),
      path('change-password/', views.change_password, name='change_password'),
     path("get-contacts/<int:company_id>/", views.get_contacts, name="get_contacts"),
     path("get-contact-details/<int:contact_id>/", views.get_contact_details, name="get_contact_details"),
@@ -27,5 +28,18 @@ urlpatterns = [
     path("submission/<int:pk>/", views.daily_form_detail, name="submission_detail"),
      path('new_followup/', views.new_followup, name='new_followup'),
      path("all-visits/pdf/", views.export_visits_pdf, name="export_visits_pdf"),
+    path("all-visits/export.<str:fmt>", views.export_visits_data, name="export_visits_data"),
      path('all_visits/', views.all_visit_list, name='all_visit_list'),# You can replace 'index' with a home view too
+    path("geocode-stats/", views.geocode_cache_stats, name="geocode_cache_stats"),
+    path("dashboard-cache-stats/", views.dashboard_cache_stats, name="dashboard_cache_stats"),
+    path("pdf-cache-stats/", views.pdf_cache_stats, name="pdf_cache_stats"),
+    path("customer-index-stats/", views.customer_index_stats, name="customer_index_stats"),
+    path("team-dashboard/", views.team_dashboard, name="team_dashboard"),
+    path("export-jobs/<str:kind>/", views.create_export_job, name="create_export_job"),
+    path("export-jobs/<int:pk>/status/", views.export_job_status, name="export_job_status"),
+    path("export-jobs/<int:pk>/download/", views.export_job_download, name="export_job_download"),
+    path("sync/", views.sync_batch, name="sync_batch"),
+    path("customers/search/", views.customer_autocomplete, name="customer_autocomplete"),
+    path("customers/<int:customer_id>/contacts/", views.customer_contacts, name="customer_contacts"),
+    path("directory/changes/", views.directory_changes, name="directory_changes"),
 ]
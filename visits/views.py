@@ -21,26 +21,8 @@ from django.contrib.auth.decorators import login_required
 from django.utils.timezone import localdate
 from django.http import JsonResponse
 from .forms import NewVisitForm
-from .models import DailyVisitForm, FormSubmission, CustomerContact
-
-
-# -------------------------------
-# Helper: Get or create daily form
-# -------------------------------
-def get_or_create_daily_form(user, date=None):
-    if date is None:
-        date = localdate()
-
-    daily_form, created = DailyVisitForm.objects.get_or_create(
-        user=user,
-        date=date
-    )
-
-    # 🔑 Ensure a FormSubmission is created for tracking status
-    if created and not hasattr(daily_form, "submission"):
-        FormSubmission.objects.create(daily_form=daily_form, user=user)
-
-    return daily_form
+from .models import CustomerContact
+from . import ingest
 
 
 # -------------------------------
@@ -51,22 +33,8 @@ def new_visit(request):
     if request.method == "POST":
         form = NewVisitForm(request.POST)
         if form.is_valid():
-            visit = form.save(commit=False)
-            visit.added_by = request.user
-
-            # 🔗 Always attach today's DailyVisitForm
-            visit.daily_form = get_or_create_daily_form(request.user)
-
-            # ✅ Auto-fill contact number + designation from selected contact
-            if visit.contact_person:
-                try:
-                    contact = CustomerContact.objects.get(id=visit.contact_person.id)
-                    visit.contact_number = contact.contact_detail          # phone
-                    visit.designation = contact.customer.designation       # designation from Customer
-                except CustomerContact.DoesNotExist:
-                    pass
-
-            visit.save()
+            # 🔗 Attached to today's DailyVisitForm, contact details filled in (visits/ingest.py)
+            visit = ingest.save_submission(form.save(commit=False), request.user)
             print(">>> VISIT SAVED:", visit.id, visit.company_name, visit.contact_person)  # debug
             return redirect("select_vist")  # success redirect
         else:
@@ -114,31 +82,8 @@ from django.contrib.auth.decorators import login_required
 from django.utils.timezone import localdate
 from django.http import JsonResponse
 from .forms import FollowUpForm   # ✅ you must create a form like NewVisitForm
-from .models import (
-    DailyFollowUp,
-    FollowUp,
-    FollowUpSubmission,
-    CustomerContact,
-)
-
-
-# -------------------------------
-# Helper: Get or create daily followup form
-# -------------------------------
-def get_or_create_daily_followup(user, date=None):
-    if date is None:
-        date = localdate()
-
-    daily_followup, created = DailyFollowUp.objects.get_or_create(
-        user=user,
-        date=date
-    )
-
-    # 🔑 Ensure a FollowUpSubmission is created for tracking status
-    if created and not hasattr(daily_followup, "submission"):
-        FollowUpSubmission.objects.create(daily_followup=daily_followup, user=user)
-
-    return daily_followup
+from .models import CustomerContact
+from . import ingest
 
 
 # -------------------------------
@@ -149,22 +94,8 @@ def new_followup(request):
     if request.method == "POST":
         form = FollowUpForm(request.POST)
         if form.is_valid():
-            followup = form.save(commit=False)
-            followup.added_by = request.user
-
-            # 🔗 Always attach today's DailyFollowUp
-            followup.daily_followup = get_or_create_daily_followup(request.user)
-
-            # ✅ Auto-fill contact number + designation from selected contact
-            if followup.contact_person:
-                try:
-                    contact = CustomerContact.objects.get(id=followup.contact_person.id)
-                    followup.contact_number = contact.contact_detail          # phone
-                    followup.designation = contact.customer.designation       # designation from Customer
-                except CustomerContact.DoesNotExist:
-                    pass
-
-            followup.save()
+            # 🔗 Attached to today's DailyFollowUp, contact details filled in (visits/ingest.py)
+            followup = ingest.save_submission(form.save(commit=False), request.user)
             print(">>> FOLLOWUP SAVED:", followup.id, followup.company_name, followup.contact_person)  # debug
             return redirect("select_vist")  # success redirect (create URL)
         else:
@@ -361,61 +292,23 @@ def daily_forms_list(request):
         {"forms": forms, "today": today}
     )
 
-import requests
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from .models import DailyVisitForm
+from .enrichment import enrich, paginate, LocationEnricher, ContactSnapshotEnricher
 
-
-def get_location_name(lat, lon):
-    """Reverse geocode coordinates using OpenStreetMap Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "format": "json",
-            "zoom": 10,
-            "addressdetails": 1
-        }
-        headers = {
-            "User-Agent": "my_visits_app_ando_2025"  # custom identifier
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "address" in data:
-                addr = data["address"]
-                return {
-                    "place_name": data.get("display_name", "Unknown"),
-                    "region": addr.get("state", ""),
-                    "zone": addr.get("county", ""),
-                    "nation": addr.get("country", "")
-                }
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
-    except Exception as e:
-        print(f"Reverse geocode error: {e}")
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
+# Run on the rendered rows only (after pagination)
+VISIT_ENRICHERS = [LocationEnricher(), ContactSnapshotEnricher()]
+FOLLOWUP_ENRICHERS = [LocationEnricher(), ContactSnapshotEnricher()]
 
 
 @login_required
 def daily_form_detail(request, pk):
     form = get_object_or_404(DailyVisitForm, pk=pk, user=request.user)
-    visits = form.visits.all()
-
-    # Add location info for each visit
-    for v in visits:
-        if v.latitude and v.longitude:
-            loc = get_location_name(v.latitude, v.longitude)
-            v.place_name = loc["place_name"]
-            v.region = loc["region"]
-            v.zone = loc["zone"]
-            v.nation = loc["nation"]
-        else:
-            v.place_name = "Not Available"
-            v.region = ""
-            v.zone = ""
-            v.nation = ""
+    visits = enrich(
+        form.visits.select_related("company_name", "contact_person__customer"),
+        VISIT_ENRICHERS,
+    )
 
     return render(
         request,
@@ -448,61 +341,18 @@ def daily_followups_list(request):
 
 
 
-import requests
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from .models import DailyFollowUp
 
 
-def get_location_name(lat, lon):
-    """Reverse geocode coordinates using OpenStreetMap Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "format": "json",
-            "zoom": 10,
-            "addressdetails": 1
-        }
-        headers = {
-            "User-Agent": "my_followup_app_ando_2025"  # custom identifier
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "address" in data:
-                addr = data["address"]
-                return {
-                    "place_name": data.get("display_name", "Unknown"),
-                    "region": addr.get("state", ""),
-                    "zone": addr.get("county", ""),
-                    "nation": addr.get("country", "")
-                }
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
-    except Exception as e:
-        print(f"Reverse geocode error: {e}")
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
-
-
 @login_required
 def daily_followup_detail(request, pk):
     form = get_object_or_404(DailyFollowUp, pk=pk, user=request.user)
-    followups = form.followups.all()  # ✅ related_name from model
-
-    # Add location info for each followup
-    for f in followups:
-        if f.latitude and f.longitude:
-            loc = get_location_name(f.latitude, f.longitude)
-            f.place_name = loc["place_name"]
-            f.region = loc["region"]
-            f.zone = loc["zone"]
-            f.nation = loc["nation"]
-        else:
-            f.place_name = "Not Available"
-            f.region = ""
-            f.zone = ""
-            f.nation = ""
+    followups = enrich(
+        form.followups.select_related("company_name", "contact_person__customer"),  # ✅ related_name from model
+        FOLLOWUP_ENRICHERS,
+    )
 
     return render(
         request,
@@ -512,44 +362,12 @@ def daily_followup_detail(request, pk):
 
 
 
-import requests
 from django.core.paginator import Paginator
 from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.db.models import Sum, Count   # ✅ add this
 from .models import NewVisit
-
-
-def get_location_name(lat, lon):
-    """Reverse geocode coordinates using OpenStreetMap Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "format": "json",
-            "zoom": 10,
-            "addressdetails": 1,
-        }
-        headers = {
-            "User-Agent": "my_visits_app_ando_2025"
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "address" in data:
-                addr = data["address"]
-                return {
-                    "place_name": data.get("display_name", "Unknown"),
-                    "region": addr.get("state", ""),
-                    "zone": addr.get("county", ""),
-                    "nation": addr.get("country", ""),
-                }
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
-    except Exception as e:
-        print(f"Reverse geocode error: {e}")
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
+from . import rollups
 
 
 @login_required
@@ -557,41 +375,22 @@ def all_visit_list(request):
     created_date = request.GET.get("created_date")
     visits_qs = (
         NewVisit.objects.filter(daily_form__user=request.user)
+        .select_related("company_name", "contact_person__customer")
         .order_by("-created_at")
     )
 
     # Filter if created_date provided
-    if created_date:
-        parsed_date = parse_date(created_date)
-        if parsed_date:
-            visits_qs = visits_qs.filter(created_at__date=parsed_date)
-
-    # ✅ Calculate totals for quoted orders
-    totals = visits_qs.filter(is_order_quoted=True).aggregate(
-        total_amount=Sum("order_amount"),
-        total_count=Count("id")
-    )
-    total_order_amount = totals["total_amount"] or 0
-    total_quoted_count = totals["total_count"] or 0
-
-    # Enrich each visit with location info
-    for v in visits_qs:
-        if v.latitude and v.longitude:
-            loc = get_location_name(v.latitude, v.longitude)
-            v.place_name = loc["place_name"]
-            v.region = loc["region"]
-            v.zone = loc["zone"]
-            v.nation = loc["nation"]
-        else:
-            v.place_name = "Not Available"
-            v.region = ""
-            v.zone = ""
-            v.nation = ""
+    parsed_date = parse_date(created_date) if created_date else None
+    if parsed_date:
+        visits_qs = visits_qs.filter(created_at__date=parsed_date)
+
+    # ✅ Totals for quoted orders, read from the daily rollups
+    totals = rollups.totals(request.user, "visit", date=parsed_date)
+    total_order_amount = totals["order_amount"]
+    total_quoted_count = totals["quoted_count"]
 
-    # Pagination (20 visits per page)
-    paginator = Paginator(visits_qs, 20)
-    page_number = request.GET.get("page")
-    visits = paginator.get_page(page_number)
+    # Pagination (20 visits per page), then enrich just that page
+    visits = paginate(request, visits_qs, 20, VISIT_ENRICHERS)
 
     return render(
         request,
@@ -606,146 +405,29 @@ def all_visit_list(request):
 
 
 
-import io
-import requests
-from decimal import Decimal
 from django.http import HttpResponse
-from django.template.loader import render_to_string
-from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count
-from .models import NewVisit
-from xhtml2pdf import pisa
-
-
-def get_location_name(lat, lon):
-    """Reverse geocode coordinates using OpenStreetMap Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {"lat": lat, "lon": lon, "format": "json", "zoom": 10, "addressdetails": 1}
-        headers = {"User-Agent": "my_visits_app_pdf_2025"}
-        r = requests.get(url, params=params, headers=headers, timeout=10)
-        if r.status_code == 200:
-            data = r.json()
-            addr = data.get("address", {})
-            return {
-                "place_name": data.get("display_name", "Unknown"),
-                "region": addr.get("state", ""),
-                "zone": addr.get("county", ""),
-                "nation": addr.get("country", ""),
-            }
-    except Exception:
-        pass
-    return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
+from . import exports
 
 
 @login_required
 def export_visits_pdf(request):
     """Export visits to PDF with totals and location info (Windows-friendly)."""
-    created_date = request.GET.get("created_date")
-    visits_qs = NewVisit.objects.filter(daily_form__user=request.user).order_by("-created_at")
-
-    # Filter by date
-    if created_date:
-        parsed_date = parse_date(created_date)
-        if parsed_date:
-            visits_qs = visits_qs.filter(created_at__date=parsed_date)
-
-    # Totals for quoted orders
-    totals = visits_qs.filter(is_order_quoted=True).aggregate(
-        total_amount=Sum("order_amount"),
-        total_count=Count("id"),
-    )
-    total_quoted_count = totals.get("total_count") or 0
-
-    # Handle None total_amount gracefully
-    if totals.get("total_amount") is None:
-        def to_decimal(x):
-            try:
-                return Decimal(str(x or "0").replace(",", ""))
-            except Exception:
-                return Decimal("0")
-
-        total_order_amount = sum(
-            (to_decimal(v.order_amount) for v in visits_qs.filter(is_order_quoted=True)),
-            Decimal("0"),
-        )
-    else:
-        total_order_amount = totals["total_amount"]
-
-    # Add location info per record
-    for v in visits_qs:
-        if v.latitude and v.longitude:
-            loc = get_location_name(v.latitude, v.longitude)
-            v.place_name = loc["place_name"]
-            v.region = loc["region"]
-            v.zone = loc["zone"]
-            v.nation = loc["nation"]
-        else:
-            v.place_name = "Not Available"
-            v.region = v.zone = v.nation = ""
-
-    # Render HTML template
-    html = render_to_string(
-        "manager/visits_pdf.html",
-        {
-            "visits": visits_qs,
-            "created_date": created_date,
-            "total_order_amount": total_order_amount,
-            "total_quoted_count": total_quoted_count,
-        },
-    )
-
-    # Convert HTML → PDF with xhtml2pdf (pisa)
-    result = io.BytesIO()
-    pisa_status = pisa.CreatePDF(
-        html,
-        dest=result,
-        encoding="utf-8"
-    )
-
-    if pisa_status.err:
+    try:
+        return exports.serve_pdf(request, "visits", request.GET)
+    except (exports.RenderBusy, exports.RenderTimeout) as exc:
+        return exports.overloaded_response(exc)
+    except exports.ExportError:
         return HttpResponse("Error generating PDF", status=500)
 
-    filename = f'visits{"_" + created_date if created_date else ""}.pdf'
-    response = HttpResponse(result.getvalue(), content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    response["X-Content-Type-Options"] = "nosniff"
-    response["Cache-Control"] = "no-store"
-    return response
-
 
 
-import requests
 from django.core.paginator import Paginator
 from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.db.models import Sum, Count, Q
 from .models import FollowUp
-
-
-def get_location_name(lat, lon):
-    """Reverse geocode coordinates using OpenStreetMap Nominatim API."""
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {"lat": lat, "lon": lon, "format": "json", "zoom": 10, "addressdetails": 1}
-        headers = {"User-Agent": "my_visits_app_ando_2025"}
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if "address" in data:
-                addr = data["address"]
-                return {
-                    "place_name": data.get("display_name", "Unknown"),
-                    "region": addr.get("state", ""),
-                    "zone": addr.get("county", ""),
-                    "nation": addr.get("country", ""),
-                }
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
-    except Exception as e:
-        print(f"Reverse geocode error: {e}")
-        return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
+from . import rollups
 
 
 @login_required
@@ -754,42 +436,19 @@ def daily_followup_listing(request):
 
     followups_qs = FollowUp.objects.filter(added_by=request.user)
 
-    if created_date:
-        parsed_date = parse_date(created_date)
-        if parsed_date:
-            followups_qs = followups_qs.filter(created_at__date=parsed_date)
+    parsed_date = parse_date(created_date) if created_date else None
+    if parsed_date:
+        followups_qs = followups_qs.filter(created_at__date=parsed_date)
 
     followups_qs = followups_qs.select_related(
-        'company_name', 'contact_person', 'daily_followup'
+        'company_name', 'contact_person__customer', 'daily_followup'
     ).order_by("-created_at")
 
-    # ✅ Extended Totals
-    totals = followups_qs.aggregate(
-        total_order_amount=Sum("order_amount"),
-        total_payment_collected=Sum("payment_amount"),
-        total_followups=Count("id"),
-        count_order_quoted=Count("id", filter=Q(is_order_quoted=True)),
-        count_payment_collected=Count("id", filter=Q(is_payment_collected=True)),
-    )
+    # ✅ Extended Totals, read from the daily rollups
+    totals = rollups.totals(request.user, "followup", date=parsed_date)
 
-    # ✅ Add location info to each followup
-    for f in followups_qs:
-        if f.latitude and f.longitude:
-            loc = get_location_name(f.latitude, f.longitude)
-            f.place_name = loc["place_name"]
-            f.region = loc["region"]
-            f.zone = loc["zone"]
-            f.nation = loc["nation"]
-        else:
-            f.place_name = None
-            f.region = ""
-            f.zone = ""
-            f.nation = ""
-
-    # ✅ Pagination
-    paginator = Paginator(followups_qs, 20)
-    page_number = request.GET.get("page")
-    followups = paginator.get_page(page_number)
+    # ✅ Pagination, then enrich just that page
+    followups = paginate(request, followups_qs, 20, FOLLOWUP_ENRICHERS)
 
     return render(
         request,
@@ -797,99 +456,30 @@ def daily_followup_listing(request):
         {
             "followups": followups,
             "created_date": created_date,
-            "total_order_amount": totals["total_order_amount"] or 0,
-            "total_payment_collected": totals["total_payment_collected"] or 0,
-            "total_followups": totals["total_followups"] or 0,
-            "count_order_quoted": totals["count_order_quoted"] or 0,
-            "count_payment_collected": totals["count_payment_collected"] or 0,
+            "total_order_amount": totals["order_amount"],
+            "total_payment_collected": totals["payment_amount"],
+            "total_followups": totals["visit_count"],
+            "count_order_quoted": totals["quoted_count"],
+            "count_payment_collected": totals["payment_count"],
         },
     )
 
 
 
-import io
-import requests
-from decimal import Decimal
 from django.http import HttpResponse
-from django.template.loader import render_to_string
-from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, Q
-from xhtml2pdf import pisa
-from .models import FollowUp
+from . import exports
 
-def get_location_name(lat, lon):
-    try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {"lat": lat, "lon": lon, "format": "json", "zoom": 10, "addressdetails": 1}
-        headers = {"User-Agent": "my_followups_pdf_2025"}
-        r = requests.get(url, params=params, headers=headers, timeout=10)
-        if r.status_code == 200:
-            data = r.json()
-            addr = data.get("address", {})
-            return {
-                "place_name": data.get("display_name", "Unknown"),
-                "region": addr.get("state", ""),
-                "zone": addr.get("county", ""),
-                "nation": addr.get("country", ""),
-            }
-    except Exception:
-        pass
-    return {"place_name": "Unknown", "region": "", "zone": "", "nation": ""}
 
 @login_required
 def export_followups_pdf(request):
-    created_date = request.GET.get("created_date")
-    followups_qs = FollowUp.objects.filter(added_by=request.user).order_by("-created_at")
-
-    if created_date:
-        parsed_date = parse_date(created_date)
-        if parsed_date:
-            followups_qs = followups_qs.filter(created_at__date=parsed_date)
-
-    totals = followups_qs.aggregate(
-        total_order_amount=Sum("order_amount"),
-        total_payment_collected=Sum("payment_amount"),
-        total_followups=Count("id"),
-        count_order_quoted=Count("id", filter=Q(is_order_quoted=True)),
-        count_payment_collected=Count("id", filter=Q(is_payment_collected=True)),
-    )
-
-    # Add location data
-    for f in followups_qs:
-        if f.latitude and f.longitude:
-            loc = get_location_name(f.latitude, f.longitude)
-            f.place_name = loc["place_name"]
-            f.region = loc["region"]
-            f.zone = loc["zone"]
-            f.nation = loc["nation"]
-        else:
-            f.place_name = "Not Available"
-            f.region = f.zone = f.nation = ""
-
-    # Render HTML
-    html = render_to_string("manager/followups_pdf.html", {
-        "followups": followups_qs,
-        "created_date": created_date,
-        "total_order_amount": totals["total_order_amount"] or 0,
-        "total_payment_collected": totals["total_payment_collected"] or 0,
-        "total_followups": totals["total_followups"] or 0,
-        "count_order_quoted": totals["count_order_quoted"] or 0,
-        "count_payment_collected": totals["count_payment_collected"] or 0,
-    })
-
-    # Convert to PDF
-    result = io.BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=result, encoding="utf-8")
-
-    if pisa_status.err:
+    try:
+        return exports.serve_pdf(request, "followups", request.GET)
+    except (exports.RenderBusy, exports.RenderTimeout) as exc:
+        return exports.overloaded_response(exc)
+    except exports.ExportError:
         return HttpResponse("PDF generation failed", status=500)
 
-    filename = f'followups{"_" + created_date if created_date else ""}.pdf'
-    response = HttpResponse(result.getvalue(), content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
-
 
 
 from django.contrib.auth import authenticate, update_session_auth_hash
@@ -930,32 +520,25 @@ from .models import NewVisit, FollowUp
 import json
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum
 from .models import NewVisit, FollowUp
 from customer.models import *
+from . import dashboard
 
 @login_required
 def index(request):
     user = request.user
 
-    # NewVisit stats
-    total_new_visits = Customer.objects.all().count()
-    total_order_quoted_new_visits = NewVisit.objects.filter(added_by=user, is_order_quoted=True).count()
-    total_order_amount_new_visits = NewVisit.objects.filter(
-        added_by=user, is_order_quoted=True
-    ).aggregate(total=Sum('order_amount'))['total'] or 0
-
-    # FollowUp stats
-    total_followups = FollowUp.objects.filter(added_by=user).count()
-    total_order_quoted_followups = FollowUp.objects.filter(added_by=user, is_order_quoted=True).count()
-    total_order_amount_followups = FollowUp.objects.filter(
-        added_by=user, is_order_quoted=True
-    ).aggregate(total=Sum('order_amount'))['total'] or 0
-
-    total_payment_collected_count = FollowUp.objects.filter(added_by=user, is_payment_collected=True).count()
-    total_payment_collected_amount = FollowUp.objects.filter(
-        added_by=user, is_payment_collected=True
-    ).aggregate(total=Sum('payment_amount'))['total'] or 0
+    # Visit + follow-up stats from the daily rollups, cached per user
+    stats = dashboard.user_stats(user)
+    total_new_visits = dashboard.customer_count()
+    total_order_quoted_new_visits = stats['visit_quoted_count']
+    total_order_amount_new_visits = stats['visit_quoted_amount']
+
+    total_followups = stats['followup_total']
+    total_order_quoted_followups = stats['followup_quoted_count']
+    total_order_amount_followups = stats['followup_quoted_amount']
+    total_payment_collected_count = stats['paid_count']
+    total_payment_collected_amount = stats['paid_amount']
 
     # JSON serialize data for charts
     doughnut_data = json.dumps([total_new_visits, total_order_quoted_new_visits])
@@ -992,3 +575,368 @@ def profile_view(request):
     user = request.user  # The logged-in user
     return render(request, 'manager/profile.html', {'user': user})
 
+
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from .geocoding import cache_stats
+from . import contact_cache, customer_index, dashboard, pdf_cache, render_pool
+
+
+# -------------------------------
+# Geocode cache hit / miss counters (per process)
+# -------------------------------
+@staff_member_required
+def geocode_cache_stats(request):
+    return JsonResponse(cache_stats())
+
+
+# -------------------------------
+# Dashboard cache hit / miss counters (per process)
+# -------------------------------
+@staff_member_required
+def dashboard_cache_stats(request):
+    stats = dashboard.cache_stats()
+    stats["contacts"] = contact_cache.cache_stats()
+    return JsonResponse(stats)
+
+
+# -------------------------------
+# Customer typeahead index counters (per process)
+# -------------------------------
+@staff_member_required
+def customer_index_stats(request):
+    return JsonResponse(customer_index.index_stats())
+
+
+# -------------------------------
+# Generated PDF cache counters (per process) and disk usage,
+# plus the render pool's counters
+# -------------------------------
+@staff_member_required
+def pdf_cache_stats(request):
+    stats = pdf_cache.cache_stats()
+    stats["render_pool"] = render_pool.pool_stats()
+    return JsonResponse(stats)
+
+
+
+import json
+from urllib.parse import urlencode
+from django.core.exceptions import PermissionDenied
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import Http404
+from django.shortcuts import render
+from .models import CustomUser, NewVisit
+from . import rollups
+
+
+# -------------------------------
+# Team dashboard (zone → branch → rep → day), read from the rollup cube
+# -------------------------------
+TEAM_WIDE_POSITIONS = ["Head of Sales", "Admin"]
+NO_VALUE = "-"  # ?zone=- / ?branch=- selects reps with none set
+TEAM_PERIODS = {"month": 12, "week": 12}  # periods shown in the series
+
+
+def _user_field_q(field, value, prefix="user__"):
+    if value == NO_VALUE:
+        return Q(**{f"{prefix}{field}__isnull": True}) | Q(**{f"{prefix}{field}": ""})
+    return Q(**{f"{prefix}{field}": value})
+
+
+@login_required
+def team_dashboard(request):
+    user = request.user
+    team_wide = user.is_superuser or user.position in TEAM_WIDE_POSITIONS
+    if team_wide:
+        zone = request.GET.get("zone")
+    elif user.position == "Zonal Sales Executive":
+        zone = user.zone or NO_VALUE  # locked to their own zone
+    else:
+        raise PermissionDenied
+
+    branch = request.GET.get("branch") if zone else None
+    rep = request.GET.get("rep") if branch else None
+    period = "week" if request.GET.get("period") == "week" else "month"
+    starts = rollups.recent_starts(period, TEAM_PERIODS[period])
+    since = starts[0]
+
+    # Scope + breadcrumb for the current drill level
+    scope = Q()
+    params = {"period": period}
+    crumbs = [("All zones", urlencode(params))]
+    if zone:
+        scope &= _user_field_q("zone", zone)
+        params["zone"] = zone
+        crumbs.append((zone if zone != NO_VALUE else "No zone", urlencode(params)))
+        if not team_wide:
+            crumbs = crumbs[1:]
+    if branch:
+        scope &= _user_field_q("branch", branch)
+        params["branch"] = branch
+        crumbs.append((branch if branch != NO_VALUE else "No branch", urlencode(params)))
+
+    rep_user = None
+    if rep:
+        rep_scope = Q(pk=rep) if rep.isdigit() else Q(pk__in=[])
+        if zone:
+            rep_scope &= _user_field_q("zone", zone, prefix="")
+        rep_scope &= _user_field_q("branch", branch, prefix="")
+        rep_user = CustomUser.objects.filter(rep_scope).first()
+        if rep_user is None:
+            raise Http404("No such rep in this branch")
+        scope &= Q(user=rep_user)
+        params["rep"] = rep_user.pk
+        crumbs.append((rep_user.get_full_name() or rep_user.email, urlencode(params)))
+
+    # Next level down: one row per zone / branch / rep, or per day for a rep
+    if rep_user:
+        level = "Day"
+        rows = rollups.rep_days(rep_user.pk, since)
+        for row in rows:
+            row["label"] = row["date"]
+            row["query"] = None
+    elif branch:
+        level = "Rep"
+        rows = rollups.team_breakdown(
+            scope, period, since, ["user", "user__first_name", "user__last_name", "user__email"]
+        )
+        for row in rows:
+            name = f'{row["user__first_name"] or ""} {row["user__last_name"] or ""}'.strip()
+            row["label"] = name or row["user__email"]
+            row["query"] = urlencode(dict(params, rep=row["user"]))
+    else:
+        field = "branch" if zone else "zone"
+        level = field.title()
+        rows = rollups.team_breakdown(scope, period, since, [f"user__{field}"])
+        for row in rows:
+            value = row[f"user__{field}"] or NO_VALUE
+            row["label"] = value if value != NO_VALUE else f"No {field}"
+            row["query"] = urlencode(dict(params, **{field: value}))
+
+    line_names = dict(NewVisit.PRODUCTION_LINE_CHOICES)
+    lines = rollups.team_breakdown(scope, period, since, ["productionline"])
+    for row in lines:
+        row["label"] = line_names.get(row["productionline"], row["productionline"] or "Not set")
+
+    series = rollups.team_series(scope, period, starts)
+    date_format = "%d %b" if period == "week" else "%b %Y"
+
+    context = {
+        "period": period,
+        "level": level,
+        "crumbs": crumbs,
+        "rows": rows,
+        "lines": lines,
+        "since": since,
+        "other_period_query": urlencode(dict(params, period="month" if period == "week" else "week")),
+
+        # Chart data
+        "series_labels": json.dumps([s["start"].strftime(date_format) for s in series]),
+        "series_visits": json.dumps([s["new_visits"] for s in series]),
+        "series_followups": json.dumps([s["followups"] for s in series]),
+        "series_quoted_amount": json.dumps([float(s["quoted_amount"]) for s in series]),
+        "series_collected": json.dumps([float(s["collected"]) for s in series]),
+    }
+    return render(request, "manager/team_dashboard.html", context)
+
+
+
+from pathlib import Path
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+from customer.models import Customer
+from .models import ExportJob
+from . import export_jobs, exports
+
+
+# -------------------------------
+# Background PDF export jobs
+# -------------------------------
+@login_required
+@require_POST
+def create_export_job(request, kind):
+    if kind not in exports.EXPORTS:
+        raise Http404("Unknown export")
+    params = {k: request.POST[k] for k in exports.PARAMS[kind] if request.POST.get(k)}
+    if kind == "customer_detail":
+        if not params.get("customer_id", "").isdigit():
+            return JsonResponse({"error": "customer_id must be a customer number."}, status=400)
+        get_object_or_404(Customer, pk=params["customer_id"])
+
+    job = export_jobs.enqueue(request.user, kind, params)
+    return JsonResponse(export_jobs.describe(job), status=202)
+
+
+@login_required
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    return JsonResponse(export_jobs.describe(job))
+
+
+@login_required
+def export_job_download(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    if job.status == "expired":
+        return HttpResponse("This export has expired; please generate it again.", status=410)
+    if job.status != "done" or not Path(job.file_path).exists():
+        raise Http404("Export not ready")
+
+    response = FileResponse(
+        open(job.file_path, "rb"), as_attachment=True, filename=job.filename, content_type="application/pdf"
+    )
+    response["X-Content-Type-Options"] = "nosniff"
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from .models import NewVisit, FollowUp
+from . import exports
+
+
+# -------------------------------
+# Streaming CSV / NDJSON exports
+# -------------------------------
+def _data_export_scope(user):
+    """Rows a user may export: everyone's, their zone's, or their own."""
+    if user.is_superuser or user.position in TEAM_WIDE_POSITIONS:
+        return Q()
+    if user.position == "Zonal Sales Executive":
+        return _user_field_q("zone", user.zone or NO_VALUE, prefix="added_by__")
+    return Q(added_by=user)
+
+
+def _stream_export(request, model, columns, name, fmt):
+    if fmt not in exports.STREAM_FORMATS:
+        raise Http404("Unknown format")
+    stream, content_type = exports.STREAM_FORMATS[fmt]
+
+    queryset = exports.tabular_queryset(model, _data_export_scope(request.user), request.GET)
+    suffix = "_".join(
+        request.GET[k] for k in ("created_date", "date_from", "date_to", "zone", "branch") if request.GET.get(k)
+    )
+
+    response = StreamingHttpResponse(stream(queryset, columns), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{name}{"_" + suffix if suffix else ""}.{fmt}"'
+    response["X-Content-Type-Options"] = "nosniff"
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@login_required
+def export_visits_data(request, fmt):
+    return _stream_export(request, NewVisit, exports.VISIT_COLUMNS, "visits", fmt)
+
+
+@login_required
+def export_followups_data(request, fmt):
+    return _stream_export(request, FollowUp, exports.FOLLOWUP_COLUMNS, "followups", fmt)
+
+
+
+import json
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from . import sync
+
+
+# -------------------------------
+# Offline batch upload (visits/sync.py)
+# -------------------------------
+@login_required
+@require_POST
+def sync_batch(request):
+    try:
+        payload = json.loads(request.body or b"null")
+        if not isinstance(payload, dict):
+            raise sync.SyncError("Expected a JSON object with an 'items' list.")
+        results = sync.sync(request.user, payload.get("items"))
+    except (ValueError, sync.SyncError) as exc:  # JSONDecodeError is a ValueError
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"results": results})
+
+
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from . import customer_index
+
+
+# -------------------------------
+# AJAX: company typeahead (visits/customer_index.py)
+# -------------------------------
+AUTOCOMPLETE_MAX = 50
+
+
+@login_required
+def customer_autocomplete(request):
+    try:
+        limit = min(int(request.GET.get("limit", 20)), AUTOCOMPLETE_MAX)
+    except ValueError:
+        limit = 20
+    return JsonResponse({"results": customer_index.search(request.GET.get("q", ""), max(limit, 1))})
+
+
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from customer.models import Customer
+from . import contact_cache
+
+
+# -------------------------------
+# AJAX: a customer's contacts with phone + designation, in one response
+# -------------------------------
+@login_required
+def customer_contacts(request, customer_id):
+    version = contact_cache.version(customer_id)
+    etag = f'"contacts-{customer_id}-{version}"'
+    last_modified = version // 1_000_000_000  # ns -> s
+
+    # Unchanged since the browser's copy: answered without a query
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            response = JsonResponse(contact_cache.contacts(customer_id, version))
+        except Customer.DoesNotExist:
+            raise Http404("No Customer matches the given query.")
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"  # keep it, but revalidate every time
+    return response
+
+
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from . import directory_sync
+
+
+# -------------------------------
+# Offline directory: customer / contact changes since a token (visits/directory_sync.py)
+# -------------------------------
+@login_required
+@require_GET
+def directory_changes(request):
+    try:
+        since = directory_sync.parse_token(request.GET.get("since"))
+    except directory_sync.TokenError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    records, token, more = directory_sync.changes(since, directory_sync.page_size(request.GET.get("limit")))
+    response = HttpResponse(directory_sync.ndjson(records, token, more), content_type="application/x-ndjson")
+    response["Cache-Control"] = "no-store"
+    return response